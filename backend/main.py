@@ -5,8 +5,9 @@ Clean architecture with routers, services, and models separation
 import os
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 from datetime import datetime
 import uvicorn
 from dotenv import load_dotenv
@@ -20,6 +21,8 @@ from services.camera_service import CameraService
 from services.facial_recognition_service import FacialRecognitionService
 from services.purity_testing_service import PurityTestingService
 from services.gps_service import GPSService
+from services.metrics import REGISTRY, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from services.executors import ExecutorSaturated, get_executor_stats, run_in, shutdown_executors
 
 # Import routers
 from routers import appraiser, appraisal, camera, face, purity, gps
@@ -52,6 +55,15 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Blocking work runs on bounded executors (services/executors.py); a full queue is a 503
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc), "executor": exc.name},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 # ============================================================================
 # Initialize Services (Singleton Pattern)
 # ============================================================================
@@ -86,6 +98,7 @@ print()
 
 # Inject dependencies into routers
 appraiser.set_database(db)
+appraiser.set_face_gallery(facial_service.gallery)
 appraisal.set_database(db)
 camera.set_service(camera_service)
 face.set_service(facial_service)
@@ -121,21 +134,30 @@ async def root():
             "camera": "/api/camera",
             "face": "/api/face",
             "purity": "/api/purity",
-            "gps": "/api/gps"
+            "gps": "/api/gps",
+            "executors": "/api/executors",
+            "metrics": "/metrics"
         }
     }
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint"""
-    db_status = db.test_connection()
+    """Health check endpoint (status is "starting" while models are still loading)"""
+    db_status = await run_in("db", db.test_connection)
+    camera_available = await run_in("io", camera_service.check_camera_available)
+    ready = facial_service.model_slot.ready and purity_service.model_slot.ready
     
     return {
-        "status": "healthy",
+        "status": "healthy" if ready else "starting",
+        "ready": ready,
         "timestamp": datetime.now().isoformat(),
+        "models": {
+            "facial_recognition": facial_service.model_slot.state,
+            "purity_testing": purity_service.model_slot.state
+        },
         "services": {
             "database": "connected" if db_status else "disconnected",
-            "camera": "available" if camera_service.check_camera_available() else "unavailable",
+            "camera": "available" if camera_available else "unavailable",
             "facial_recognition": "available" if facial_service.is_available() else "unavailable",
             "purity_testing": "available" if purity_service.is_available() else "unavailable",
             "gps": "available" if gps_service.available else "unavailable"
@@ -145,7 +167,17 @@ async def health_check():
 @app.get("/api/statistics")
 async def get_statistics():
     """Get overall statistics"""
-    return db.get_statistics()
+    return await run_in("db", db.get_statistics)
+
+@app.get("/api/executors")
+async def executor_stats():
+    """Workers, running and queued calls, and rejections per executor"""
+    return get_executor_stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: purity, face and database stage latencies and counters"""
+    return Response(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
 
 # ============================================================================
 # Lifecycle Events
@@ -158,6 +190,10 @@ async def startup_event():
     print("  Application Starting...")
     print("="*70)
     
+    # Load models in the background so the server starts listening right away
+    facial_service.warmup()
+    purity_service.warmup()
+    
     # Initialize database tables
     db.init_database()
     print("✓ Database tables initialized")
@@ -184,6 +220,10 @@ async def shutdown_event():
     if purity_service.is_running:
         purity_service.stop()
         print("✓ Purity testing service stopped")
+    purity_service.shutdown()
+    facial_service.shutdown()
+    
+    shutdown_executors()
     
     # Close database connections
     db.close()
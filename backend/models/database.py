@@ -1,13 +1,23 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from datetime import datetime
 from typing import Optional, List, Dict, Any
 import json
 import os
 from dotenv import load_dotenv
 
+from services.metrics import REGISTRY, timed_calls
+
 load_dotenv()
 
+# Latency and failures of every Database method (get_connection is the connect time)
+DB_CALL_SECONDS = REGISTRY.histogram("db_call_seconds", "Database method latency in seconds", ["method"])
+DB_ERRORS = REGISTRY.counter("db_errors_total", "Database method calls that raised", ["method"])
+db_timed = timed_calls(DB_CALL_SECONDS, DB_ERRORS)
+
+# Appraiser columns returned to API callers; face_embedding (BYTEA, a memoryview) is not JSON-serializable
+APPRAISER_COLUMNS = "id, name, appraiser_id, image_data, face_encoding, face_model_version, created_at"
+
 class Database:
     def __init__(self):
         """Initialize Database connection (Supabase/PostgreSQL)"""
@@ -76,6 +86,7 @@ class Database:
         else:
             raise ValueError(f"Invalid DATABASE_URL format: {url}")
     
+    @db_timed
     def get_connection(self):
         """Get database connection with SSL support and helpful error handling"""
         try:
@@ -103,6 +114,7 @@ class Database:
             print(f"❌ Unexpected connection failed: {e}")
             raise e
     
+    @db_timed
     def init_database(self):
         """Initialize database tables"""
         conn = self.get_connection()
@@ -117,6 +129,8 @@ class Database:
                     appraiser_id TEXT UNIQUE NOT NULL,
                     image_data TEXT,
                     face_encoding TEXT,
+                    face_embedding BYTEA,
+                    face_model_version TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
@@ -130,7 +144,14 @@ class Database:
                 print("Added face_encoding column to appraisers table")
             except Exception as e:
                 print(f"Face encoding column already exists or error: {e}")
-            
+
+            # Binary float32 embeddings (replace the comma-separated face_encoding text)
+            cursor.execute('''
+                ALTER TABLE appraisers
+                ADD COLUMN IF NOT EXISTS face_embedding BYTEA,
+                ADD COLUMN IF NOT EXISTS face_model_version TEXT
+            ''')
+
             # Appraisals table
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS appraisals (
@@ -197,6 +218,7 @@ class Database:
             cursor.close()
             conn.close()
     
+    @db_timed
     def test_connection(self) -> bool:
         """Test database connection"""
         try:
@@ -208,8 +230,11 @@ class Database:
             return False
     
     # Appraiser operations
-    def insert_appraiser(self, name: str, appraiser_id: str, image_data: str, timestamp: str, face_encoding: str = None) -> int:
-        """Insert or update appraiser details"""
+    @db_timed
+    def insert_appraiser(self, name: str, appraiser_id: str, image_data: str, timestamp: str, face_encoding: str = None,
+                         face_embedding: bytes = None, face_model_version: str = None) -> int:
+        """Insert or update appraiser details (face_embedding: raw float32 bytes)"""
+        embedding = psycopg2.Binary(face_embedding) if face_embedding is not None else None
         conn = self.get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
@@ -222,19 +247,21 @@ class Database:
                 # Update existing appraiser
                 cursor.execute('''
                     UPDATE appraisers 
-                    SET name = %s, image_data = %s, face_encoding = %s
+                    SET name = %s, image_data = %s, face_encoding = %s,
+                        face_embedding = %s, face_model_version = %s
                     WHERE appraiser_id = %s
                     RETURNING id
-                ''', (name, image_data, face_encoding, appraiser_id))
+                ''', (name, image_data, face_encoding, embedding, face_model_version, appraiser_id))
                 result = cursor.fetchone()
                 appraiser_db_id = result['id']
             else:
                 # Insert new appraiser
                 cursor.execute('''
-                    INSERT INTO appraisers (name, appraiser_id, image_data, face_encoding)
-                    VALUES (%s, %s, %s, %s)
+                    INSERT INTO appraisers (name, appraiser_id, image_data, face_encoding,
+                                            face_embedding, face_model_version)
+                    VALUES (%s, %s, %s, %s, %s, %s)
                     RETURNING id
-                ''', (name, appraiser_id, image_data, face_encoding))
+                ''', (name, appraiser_id, image_data, face_encoding, embedding, face_model_version))
                 result = cursor.fetchone()
                 appraiser_db_id = result['id']
             
@@ -247,33 +274,175 @@ class Database:
             cursor.close()
             conn.close()
     
+    @db_timed
     def get_appraiser_by_id(self, appraiser_id: str) -> Optional[Dict[str, Any]]:
         """Get appraiser by appraiser_id"""
         conn = self.get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
-            cursor.execute("SELECT * FROM appraisers WHERE appraiser_id = %s", (appraiser_id,))
+            cursor.execute(f"SELECT {APPRAISER_COLUMNS} FROM appraisers WHERE appraiser_id = %s", (appraiser_id,))
             row = cursor.fetchone()
             return dict(row) if row else None
         finally:
             cursor.close()
             conn.close()
     
+    @db_timed
     def get_all_appraisers_with_face_encoding(self) -> List[Dict[str, Any]]:
         """Get all appraisers that have face encodings for recognition"""
         conn = self.get_connection()
         cursor = conn.cursor(cursor_factory=RealDictCursor)
         
         try:
-            cursor.execute("SELECT * FROM appraisers WHERE face_encoding IS NOT NULL")
+            cursor.execute(f'''
+                SELECT {APPRAISER_COLUMNS}
+                FROM appraisers WHERE face_embedding IS NOT NULL OR face_encoding IS NOT NULL
+            ''')
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         finally:
             cursor.close()
             conn.close()
-    
+
+    @db_timed
+    def get_face_encodings(self) -> List[Dict[str, Any]]:
+        """Face embeddings with just the columns needed for matching (no image data)
+
+        face_embedding comes back as a memoryview over the raw float32 bytes;
+        face_encoding is only set on rows not yet migrated off the text format.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute('''
+                SELECT id, appraiser_id, name, face_embedding, face_encoding, face_model_version, created_at
+                FROM appraisers WHERE face_embedding IS NOT NULL OR face_encoding IS NOT NULL
+            ''')
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            cursor.close()
+            conn.close()
+
+    @db_timed
+    def get_face_embedding(self, appraiser_id: str) -> Optional[Dict[str, Any]]:
+        """One appraiser's face embedding by appraiser_id (unique index lookup, no image data)"""
+        conn = self.get_connection()
+        cursor = conn.cursor(cursor_factory=RealDictCursor)
+
+        try:
+            cursor.execute('''
+                SELECT id, appraiser_id, name, face_embedding, face_encoding, face_model_version
+                FROM appraisers WHERE appraiser_id = %s
+            ''', (appraiser_id,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            cursor.close()
+            conn.close()
+
+    @db_timed
+    def clear_face_encoding(self, appraiser_id: str) -> bool:
+        """Remove an appraiser's face encoding; False if the appraiser does not exist"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute('''
+                UPDATE appraisers SET face_encoding = NULL, face_embedding = NULL, face_model_version = NULL
+                WHERE appraiser_id = %s
+            ''', (appraiser_id,))
+            updated = cursor.rowcount > 0
+            conn.commit()
+            return updated
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+            conn.close()
+
+    @db_timed
+    def count_text_face_encodings(self) -> int:
+        """Rows still holding only the comma-separated face_encoding text"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute("SELECT COUNT(*) FROM appraisers WHERE face_embedding IS NULL AND face_encoding IS NOT NULL")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+            conn.close()
+
+    @db_timed
+    def migrate_face_encodings(self, model_version: str = None, batch_size: int = 500,
+                               keep_text: bool = False) -> Dict[str, int]:
+        """Convert face_encoding text to float32 face_embedding bytes, one short transaction per batch
+
+        Safe to run while the app is serving: each batch locks only its own
+        rows (SKIP LOCKED), and a row re-registered in the meantime already
+        has face_embedding set and is left alone. Unparseable rows are
+        counted and skipped. Re-running continues where it stopped.
+        """
+        from services.face_gallery import encode_embedding, parse_embedding
+
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        stats = {"converted": 0, "failed": 0, "batches": 0, "bytes_before": 0, "bytes_after": 0}
+        last_id = 0
+
+        try:
+            while True:
+                cursor.execute('''
+                    SELECT id, face_encoding FROM appraisers
+                    WHERE id > %s AND face_embedding IS NULL AND face_encoding IS NOT NULL
+                    ORDER BY id LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                ''', (last_id, batch_size))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                values = []
+                for row_id, text in rows:
+                    try:
+                        vector = parse_embedding(text)
+                    except ValueError:
+                        vector = None
+                    if vector is None or not vector.size:
+                        stats["failed"] += 1
+                        continue
+                    blob = encode_embedding(vector)
+                    stats["bytes_before"] += len(text)
+                    stats["bytes_after"] += len(blob)
+                    values.append((row_id, psycopg2.Binary(blob), model_version))
+
+                if values:
+                    execute_values(cursor, f'''
+                        UPDATE appraisers AS a
+                        SET face_embedding = v.embedding,
+                            face_model_version = COALESCE(a.face_model_version, v.version)
+                            {"" if keep_text else ", face_encoding = NULL"}
+                        FROM (VALUES %s) AS v (id, embedding, version)
+                        WHERE a.id = v.id AND a.face_embedding IS NULL
+                    ''', values, template="(%s, %s::bytea, %s::text)")
+                    stats["converted"] += cursor.rowcount
+                conn.commit()
+                stats["batches"] += 1
+            return stats
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cursor.close()
+            conn.close()
+
     # Appraisal operations
+    @db_timed
     def create_appraisal(self, appraiser_id: int, appraiser_name: str, 
                         total_items: int, purity: str, testing_method: str) -> int:
         """Create a new appraisal record"""
@@ -298,6 +467,7 @@ class Database:
             cursor.close()
             conn.close()
     
+    @db_timed
     def get_appraisal_by_id(self, appraisal_id: int) -> Optional[Dict[str, Any]]:
         """Get complete appraisal details with all related data"""
         conn = self.get_connection()
@@ -314,7 +484,7 @@ class Database:
             appraisal = dict(appraisal_row)
             
             # Get appraiser details
-            cursor.execute("SELECT * FROM appraisers WHERE id = %s", (appraisal['appraiser_id'],))
+            cursor.execute(f"SELECT {APPRAISER_COLUMNS} FROM appraisers WHERE id = %s", (appraisal['appraiser_id'],))
             appraiser_row = cursor.fetchone()
             if appraiser_row:
                 appraisal['appraiser'] = dict(appraiser_row)
@@ -341,6 +511,7 @@ class Database:
             cursor.close()
             conn.close()
     
+    @db_timed
     def get_all_appraisals(self, skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all appraisal records with pagination"""
         conn = self.get_connection()
@@ -361,6 +532,7 @@ class Database:
             cursor.close()
             conn.close()
     
+    @db_timed
     def delete_appraisal(self, appraisal_id: int) -> bool:
         """Delete an appraisal and all related records"""
         conn = self.get_connection()
@@ -379,6 +551,7 @@ class Database:
             conn.close()
     
     # Jewellery item operations
+    @db_timed
     def insert_jewellery_item(self, appraisal_id: int, item_number: int, 
                              image_data: str, description: str,
                              weight: Optional[str] = None, 
@@ -407,6 +580,7 @@ class Database:
             conn.close()
     
     # RBI compliance operations
+    @db_timed
     def insert_rbi_compliance(self, appraisal_id: int, customer_photo: str,
                              id_proof: str, appraiser_with_jewellery: str) -> int:
         """Insert RBI compliance images"""
@@ -433,6 +607,7 @@ class Database:
             conn.close()
     
     # Purity test operations
+    @db_timed
     def insert_purity_test(self, appraisal_id: int, testing_method: str,
                           purity: str, remarks: Optional[str] = None) -> int:
         """Insert purity test results"""
@@ -459,6 +634,7 @@ class Database:
             conn.close()
     
     # Statistics
+    @db_timed
     def get_statistics(self) -> Dict[str, Any]:
         """Get appraisal statistics"""
         conn = self.get_connection()
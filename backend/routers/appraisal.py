@@ -3,6 +3,8 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
 
+from services.executors import run_in
+
 router = APIRouter(prefix="/api/appraisal", tags=["appraisal"])
 
 # ============================================================================
@@ -96,7 +98,7 @@ async def get_all_appraisals(skip: int = 0, limit: int = 100):
     if limit > 1000:
         raise HTTPException(status_code=400, detail="Limit cannot exceed 1000")
     
-    appraisals = db.get_all_appraisals(skip=skip, limit=limit)
+    appraisals = await run_in("db", db.get_all_appraisals, skip=skip, limit=limit)
     return {"total": len(appraisals), "appraisals": appraisals}
 
 @router.get("/{appraisal_id}", response_model=None)
@@ -108,7 +110,7 @@ async def get_appraisal_by_id(appraisal_id: int):
     
     Returns complete appraisal details including all related data
     """
-    appraisal = db.get_appraisal_by_id(appraisal_id)
+    appraisal = await run_in("db", db.get_appraisal_by_id, appraisal_id)
     if not appraisal:
         raise HTTPException(status_code=404, detail=f"Appraisal with ID {appraisal_id} not found")
     return appraisal
@@ -126,7 +128,7 @@ async def delete_appraisal(appraisal_id: int):
     
     Returns success message
     """
-    success = db.delete_appraisal(appraisal_id)
+    success = await run_in("db", db.delete_appraisal, appraisal_id)
     if not success:
         raise HTTPException(status_code=404, detail=f"Appraisal with ID {appraisal_id} not found")
     return {"success": True, "message": f"Appraisal {appraisal_id} deleted successfully"}
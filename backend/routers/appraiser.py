@@ -4,6 +4,8 @@ from pydantic import BaseModel
 from typing import Optional
 from datetime import datetime
 
+from services.executors import run_in
+
 router = APIRouter(prefix="/api/appraiser", tags=["appraiser"])
 
 # Pydantic models
@@ -20,21 +22,32 @@ def set_database(database):
     global db
     db = database
 
+# Face gallery to keep in sync when an appraiser is saved without a face encoding
+face_gallery = None
+
+def set_face_gallery(gallery):
+    global face_gallery
+    face_gallery = gallery
+
 @router.post("")
 async def create_appraiser(appraiser: AppraiserDetails):
     """Create a new appraiser"""
-    appraiser_db_id = db.insert_appraiser(
+    appraiser_db_id = await run_in(
+        "db", db.insert_appraiser,
         name=appraiser.name,
         appraiser_id=appraiser.id,
         image_data=appraiser.image,
         timestamp=appraiser.timestamp
     )
+    # Saving without an encoding clears any registered face
+    if face_gallery is not None:
+        face_gallery.remove(appraiser.id)
     return {"success": True, "id": appraiser_db_id, "message": "Appraiser saved"}
 
 @router.get("/{appraiser_id}")
 async def get_appraiser(appraiser_id: str):
     """Get appraiser by ID"""
-    appraiser = db.get_appraiser_by_id(appraiser_id)
+    appraiser = await run_in("db", db.get_appraiser_by_id, appraiser_id)
     if not appraiser:
         raise HTTPException(status_code=404, detail="Appraiser not found")
     return appraiser
@@ -2,6 +2,8 @@
 from fastapi import APIRouter, HTTPException
 from datetime import datetime
 
+from services.executors import run_in
+
 router = APIRouter(prefix="/api/camera", tags=["camera"])
 
 # Dependency injection
@@ -14,7 +16,7 @@ def set_service(service):
 @router.post("/check")
 async def check_camera():
     """Check if camera is available"""
-    available = camera_service.check_camera_available()
+    available = await run_in("io", camera_service.check_camera_available)
     return {
         "available": available,
         "message": "Camera is available" if available else "No camera found"
@@ -23,7 +25,7 @@ async def check_camera():
 @router.post("/capture")
 async def capture_image():
     """Capture a single image from camera"""
-    image_data = camera_service.capture_image()
+    image_data = await run_in("io", camera_service.capture_image)
     if image_data:
         return {
             "success": True,
@@ -35,7 +37,8 @@ async def capture_image():
 @router.post("/preview")
 async def show_camera_preview():
     """Show camera preview window and capture image"""
-    image_data = camera_service.show_camera_preview(
+    image_data = await run_in(
+        "io", camera_service.show_camera_preview,
         window_name="Gold Loan Appraisal - Camera"
     )
     if image_data:
@@ -55,7 +58,8 @@ async def show_camera_preview():
 @router.post("/live")
 async def show_live_feed(duration: int = 10):
     """Show live camera feed for specified duration"""
-    camera_service.show_camera_live(
+    await run_in(
+        "io", camera_service.show_camera_live,
         duration_seconds=duration,
         window_name="Gold Loan Appraisal - Live Feed"
     )
@@ -2,6 +2,8 @@
 from fastapi import APIRouter, Form, HTTPException
 import traceback
 
+from services.executors import ExecutorSaturated, run_in
+
 router = APIRouter(prefix="/api/face", tags=["facial-recognition"])
 
 # Dependency injection
@@ -19,8 +21,10 @@ async def register_face(
 ):
     """Register a new face for facial recognition"""
     try:
-        result = facial_service.register_face(name, appraiser_id, image)
+        result = await run_in("face", facial_service.register_face, name, appraiser_id, image)
         return result
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         print(f"Error in register_face endpoint: {e}")
         traceback.print_exc()
@@ -32,24 +36,41 @@ async def recognize_face(image: str = Form(...)):
     try:
         if facial_service is None:
             raise HTTPException(status_code=500, detail="Facial service not initialized")
-        result = facial_service.recognize_face(image)
+        result = await run_in("face", facial_service.recognize_face, image)
         return result
-    except HTTPException:
+    except (HTTPException, ExecutorSaturated):
         raise
     except Exception as e:
         print(f"Error in recognize_face endpoint: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/verify")
+async def verify_face(appraiser_id: str = Form(...), image: str = Form(...)):
+    """Verify a face against one claimed appraiser id (1:1)"""
+    try:
+        if facial_service is None:
+            raise HTTPException(status_code=500, detail="Facial service not initialized")
+        result = await run_in("face", facial_service.verify_face, appraiser_id, image)
+        if result.get("registered") is False:
+            raise HTTPException(status_code=404, detail=result["message"])
+        return result
+    except (HTTPException, ExecutorSaturated):
+        raise
+    except Exception as e:
+        print(f"Error in verify_face endpoint: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/appraisers")
 async def get_registered_appraisers():
     """Get list of registered appraisers"""
-    return {"appraisers": facial_service.get_registered_appraisers()}
+    return {"appraisers": await run_in("db", facial_service.get_registered_appraisers)}
 
 @router.post("/info")
 async def get_face_info(image: str = Form(...)):
     """Get face information from image"""
-    return facial_service.get_face_info(image)
+    return await run_in("face", facial_service.get_face_info, image)
 
 @router.post("/threshold")
 async def update_threshold(threshold: float = Form(...)):
@@ -64,3 +85,35 @@ async def get_face_service_status():
         "threshold": facial_service.threshold,
         "service": "FacialRecognitionService"
     }
+
+@router.post("/reload_models")
+async def reload_face_models(wait: bool = False):
+    """Reload the insightface models in the background and swap them in once validated"""
+    if wait:
+        return await run_in("io", facial_service.reload_models, True)
+    return facial_service.reload_models()
+
+@router.get("/reload_status")
+async def face_reload_status():
+    """Model generation, draining packs and the last reload outcome"""
+    return facial_service.get_reload_status()
+
+@router.delete("/appraisers/{appraiser_id}")
+async def delete_appraiser_face(appraiser_id: str):
+    """Delete an appraiser's face encoding"""
+    return await run_in("db", facial_service.delete_appraiser_face, appraiser_id)
+
+@router.get("/gallery")
+async def face_gallery_stats():
+    """In-memory embedding gallery size, memory and age"""
+    return facial_service.get_gallery_stats()
+
+@router.post("/gallery/reload")
+async def reload_face_gallery():
+    """Rebuild the embedding gallery from the database"""
+    try:
+        return await run_in("db", facial_service.reload_gallery)
+    except ExecutorSaturated:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -1,6 +1,8 @@
 """GPS Location API routes"""
 from fastapi import APIRouter
 
+from services.executors import run_in
+
 router = APIRouter(prefix="/api/gps", tags=["gps"])
 
 # Dependency injection
@@ -13,7 +15,7 @@ def set_service(service):
 @router.get("/location")
 async def api_gps_location():
     """Get current GPS location with map and address"""
-    result = gps_service.get_location()
+    result = await run_in("io", gps_service.get_location)
     if result.get("error"):
         return {
             "error": result["error"],
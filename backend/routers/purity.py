@@ -1,9 +1,15 @@
 """Purity Testing API routes"""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, File, UploadFile, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import json
 import os
 
+from services.executors import ExecutorSaturated, run_in
+
 router = APIRouter(prefix="/api/purity", tags=["purity-testing"])
 
 # Request models
@@ -14,6 +20,12 @@ class StartPurityRequest(BaseModel):
 class AnalyzeRequest(BaseModel):
     frame1: Optional[str] = None
     frame2: Optional[str] = None
+    session_id: Optional[str] = None
+    output: str = "json"  # "json" (annotated base64 frames) or "detections" (structured only)
+
+# Response formats for the JSON and binary analyze endpoints
+JSON_OUTPUTS = ("json", "detections")
+BINARY_OUTPUTS = ("detections", "jpeg")
 
 # Dependency injection
 purity_service = None
@@ -22,9 +34,20 @@ def set_service(service):
     global purity_service
     purity_service = service
 
+def _session_id(session_id: Optional[str]) -> str:
+    """Validate a client-supplied session id (None selects the default session)"""
+    try:
+        return purity_service.sessions.normalize_id(session_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.get("/status")
 async def purity_status():
     """Get purity testing service status"""
+    # Probing the camera indices blocks for up to a few seconds
+    return await run_in("io", _purity_status)
+
+def _purity_status():
     return {
         "available": purity_service.is_available(),
         "service": "PurityTestingService",
@@ -40,19 +63,27 @@ async def purity_status():
         "models_exist": {
             "model1": os.path.exists(purity_service.model1_path),
             "model2": os.path.exists(purity_service.model2_path)
-        }
+        },
+        "inference_backend": purity_service.backend_name
     }
 
+@router.get("/inference_stats")
+async def purity_inference_stats():
+    """Get micro-batching statistics per model and the motion-gate skip ratio"""
+    return purity_service.get_inference_stats()
+
 @router.get("/cameras/list")
 async def list_cameras():
     """Get detailed list of available cameras with their specifications"""
     try:
-        cameras = purity_service.get_camera_details()
+        cameras = await run_in("io", purity_service.get_camera_details)
         return {
             "success": True,
             "cameras": cameras,
             "count": len(cameras)
         }
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -68,39 +99,67 @@ async def purity_start(request: StartPurityRequest = None):
     """
     try:
         if request:
-            return purity_service.start(
+            return await run_in(
+                "io", purity_service.start,
                 camera1_index=request.camera1_index,
                 camera2_index=request.camera2_index
             )
         else:
-            return purity_service.start()
+            return await run_in("io", purity_service.start)
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/stop")
 async def purity_stop():
     """Stop purity testing cameras"""
-    return purity_service.stop()
+    return await run_in("io", purity_service.stop)
 
 @router.get("/detection_status")
-async def purity_detection_status():
-    """Get current detection status"""
-    return purity_service.get_detection_status()
+async def purity_detection_status(session_id: Optional[str] = None):
+    """Get current detection status for a session"""
+    return purity_service.get_detection_status(_session_id(session_id))
+
+@router.post("/session")
+async def purity_create_session():
+    """Issue a new detection session for a testing station"""
+    return {"session_id": purity_service.create_session()}
+
+@router.delete("/session/{session_id}")
+async def purity_end_session(session_id: str):
+    """Drop a station's detection state"""
+    return {"success": purity_service.end_session(_session_id(session_id))}
+
+@router.get("/sessions")
+async def purity_sessions():
+    """List active detection sessions"""
+    return purity_service.get_session_stats()
+
+@router.get("/feed_stats")
+async def purity_feed_stats():
+    """Get capture/encode rates and subscriber counts of the camera broadcast hub"""
+    return purity_service.get_feed_stats()
+
+@router.get("/pipeline_stats")
+async def purity_pipeline_stats():
+    """Get per-stage timing and queue drops of the annotated feed pipelines"""
+    return purity_service.get_pipeline_stats()
 
 @router.get("/video_feed1")
-async def purity_video_feed1():
-    """MJPEG stream from camera 1 with YOLO analysis"""
-    return purity_service.video_feed1()
+async def purity_video_feed1(annotated: bool = True):
+    """MJPEG stream from camera 1 with YOLO analysis (?annotated=false for the raw feed)"""
+    return purity_service.video_feed1(annotated)
 
 @router.get("/video_feed2")
-async def purity_video_feed2():
-    """MJPEG stream from camera 2 with YOLO analysis"""
-    return purity_service.video_feed2()
+async def purity_video_feed2(annotated: bool = True):
+    """MJPEG stream from camera 2 with YOLO analysis (?annotated=false for the raw feed)"""
+    return purity_service.video_feed2(annotated)
 
 @router.get("/cameras")
 async def purity_cameras():
     """Get list of available cameras"""
-    return {"available_cameras": purity_service.get_available_cameras()}
+    return {"available_cameras": await run_in("io", purity_service.get_available_cameras)}
 
 @router.get("/health")
 async def purity_health():
@@ -115,24 +174,27 @@ async def purity_health():
     }
 
 @router.post("/reset_status")
-async def purity_reset():
-    """Reset detection status"""
-    purity_service.reset_detection_status()
+async def purity_reset(session_id: Optional[str] = None):
+    """Reset detection status for a session"""
+    purity_service.reset_detection_status(_session_id(session_id))
     return {"success": True, "message": "Detection status reset"}
 
 @router.get("/validate_csv")
 async def purity_validate_csv():
     """Validate CSV task files"""
-    return purity_service.validate_csv_files()
+    return await run_in("io", purity_service.validate_csv_files)
 
 @router.post("/create_sample_csv")
 async def purity_create_sample():
     """Create sample CSV files for testing"""
-    return purity_service.create_sample_csv_files()
+    return await run_in("io", purity_service.create_sample_csv_files)
 
 @router.post("/analyze_frame")
-def analyze_frame(payload: dict):
+async def analyze_frame(payload: dict):
     """Analyze a single frame with YOLO (for testing)"""
+    return await run_in("purity", _analyze_frame, payload)
+
+def _analyze_frame(payload: dict):
     import base64
     import cv2
     import numpy as np
@@ -148,7 +210,8 @@ def analyze_frame(payload: dict):
         raise HTTPException(status_code=400, detail="Invalid image")
 
     # Use the YOLO analysis method
-    annotated = purity_service.run_yolo_analysis_on_frame(frame)
+    session_id = _session_id(payload.get("session_id"))
+    annotated = purity_service.run_yolo_analysis_on_frame(frame, session_id=session_id)
 
     _, buf = cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
     annotated_b64 = base64.b64encode(buf).decode()
@@ -156,26 +219,353 @@ def analyze_frame(payload: dict):
 
     return {
         "annotated_frame": annotated_url,
-        "detection_status": purity_service.get_detection_status()
+        "detection_status": purity_service.get_detection_status(session_id)
     }
 
 @router.post("/analyze")
-def analyze_dual_frames(request: AnalyzeRequest):
-    """Analyze dual frames sent from frontend"""
+async def analyze_dual_frames(request: AnalyzeRequest):
+    """Analyze dual frames sent from frontend
+    
+    output="detections" skips server-side drawing and JPEG encoding and
+    returns structured detections1/detections2 instead of annotated frames.
+    """
+    session_id = _session_id(request.session_id)
+    if request.output not in JSON_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"output must be one of {JSON_OUTPUTS}")
     try:
-        results = purity_service.analyze_frames(
+        results = await run_in(
+            "purity", purity_service.analyze_frames,
             frame1_b64=request.frame1,
-            frame2_b64=request.frame2
+            frame2_b64=request.frame2,
+            session_id=session_id,
+            output=request.output
         )
         return results
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _binary_analyze_response(results: dict, output: str):
+    """Build a detections-only JSON response or a raw JPEG response"""
+    if results.get("invalid_image"):
+        raise HTTPException(status_code=400, detail=results["error"])
+    if results.get("error"):
+        raise HTTPException(status_code=500, detail=results["error"])
+    
+    if output == "jpeg":
+        frame = results.get("annotated_frame1") or results.get("annotated_frame2")
+        if frame is None:
+            raise HTTPException(status_code=400, detail="Invalid image")
+        return Response(
+            content=frame,
+            media_type="image/jpeg",
+            headers={
+                "X-Detection-Status": json.dumps(results["detection_status"]),
+                "X-Rubbing-Detected": str(results["rubbing_detected"]).lower(),
+                "X-Acid-Detected": str(results["acid_detected"]).lower(),
+            }
+        )
+    
+    results.pop("annotated_frame1", None)
+    results.pop("annotated_frame2", None)
+    return results
+
+def _validate_output(output: str, frame_count: int):
+    if output not in BINARY_OUTPUTS:
+        raise HTTPException(status_code=400, detail=f"output must be one of {BINARY_OUTPUTS}")
+    if frame_count == 0:
+        raise HTTPException(status_code=400, detail="Missing frame")
+    if output == "jpeg" and frame_count != 1:
+        raise HTTPException(status_code=400, detail="output=jpeg requires exactly one frame")
+
+@router.post("/analyze/upload")
+async def analyze_uploaded_frames(
+    frame1: Optional[UploadFile] = File(None),
+    frame2: Optional[UploadFile] = File(None),
+    output: str = "detections",
+    session_id: Optional[str] = None
+):
+    """Analyze frames uploaded as multipart JPEG files (no base64)
+    
+    Query parameters:
+    - output: "detections" (structured detections, no drawing or encoding) or "jpeg" (annotated JPEG, single frame)
+    - session_id: detection session of the testing station
+    """
+    session_id = _session_id(session_id)
+    frame1_bytes = await frame1.read() if frame1 else None
+    frame2_bytes = await frame2.read() if frame2 else None
+    _validate_output(output, int(bool(frame1_bytes)) + int(bool(frame2_bytes)))
+    
+    results = await run_in(
+        "purity", purity_service.analyze_frame_bytes, frame1_bytes, frame2_bytes, output=output, session_id=session_id
+    )
+    return _binary_analyze_response(results, output)
+
+@router.post("/analyze/raw")
+async def analyze_raw_frame(request: Request, camera: int = 1, output: str = "detections",
+                            session_id: Optional[str] = None):
+    """Analyze a single frame sent as a raw image/jpeg request body
+    
+    Query parameters:
+    - camera: 1 (top view / rubbing) or 2 (side view / acid)
+    - output: "detections" (structured detections, no drawing or encoding) or "jpeg" (annotated JPEG)
+    - session_id: detection session of the testing station
+    """
+    session_id = _session_id(session_id)
+    if camera not in (1, 2):
+        raise HTTPException(status_code=400, detail="camera must be 1 or 2")
+    
+    body = await request.body()
+    _validate_output(output, int(bool(body)))
+    
+    frames = {"frame1_bytes": body} if camera == 1 else {"frame2_bytes": body}
+    results = await run_in(
+        "purity", purity_service.analyze_frame_bytes, output=output, session_id=session_id, **frames
+    )
+    return _binary_analyze_response(results, output)
+
+class _LatestFrameSlots:
+    """Per-camera latest-frame slots for a WebSocket station
+    
+    A frame that arrives before the previous one for the same camera was
+    analyzed replaces it, so the server always works on the freshest frame.
+    """
+    
+    def __init__(self):
+        self.frames = {1: None, 2: None}
+        self.ready = asyncio.Event()
+        self.received = 0
+        self.dropped = 0
+    
+    def put(self, camera: int, data):
+        if self.frames[camera] is not None:
+            self.dropped += 1
+        self.frames[camera] = data
+        self.received += 1
+        self.ready.set()
+    
+    def take(self) -> dict:
+        frames = self.frames
+        self.frames = {1: None, 2: None}
+        self.ready.clear()
+        return frames
+
+@router.websocket("/ws")
+async def purity_websocket(websocket: WebSocket, session_id: Optional[str] = None):
+    """Streaming purity analysis over one connection per station
+    
+    Connect with ?session_id=... to bind the socket to a detection session
+    (a new session is issued when omitted).
+    
+    Client -> server:
+    - binary message: 1 byte camera id (1 = top view, 2 = side view) followed by JPEG bytes
+    - text message: {"type": "reset"} to reset detection status
+    
+    Server -> client (JSON text):
+    - {"type": "status", ...} whenever the detection status message changes
+    - {"type": "result", ...} for every analyzed frame pair
+    
+    Frames that arrive while the previous pair is still being analyzed
+    replace the pending frame for that camera instead of queueing up.
+    """
+    issued_session = not session_id
+    try:
+        session_id = purity_service.sessions.normalize_id(session_id) if session_id else purity_service.create_session()
+    except ValueError:
+        await websocket.close(code=1008)
+        return
+    
+    await websocket.accept()
+    await websocket.send_json({"type": "session", "session_id": session_id})
+    slots = _LatestFrameSlots()
+    closed = asyncio.Event()
+    
+    async def receive_loop():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                
+                data = message.get("bytes")
+                if data:
+                    camera = data[0]
+                    if camera in (1, 2) and len(data) > 1:
+                        slots.put(camera, memoryview(data)[1:])
+                    continue
+                
+                text = message.get("text")
+                if text:
+                    try:
+                        control = json.loads(text)
+                    except ValueError:
+                        continue
+                    if isinstance(control, dict) and control.get("type") == "reset":
+                        await run_in_threadpool(purity_service.reset_detection_status, session_id)
+        finally:
+            closed.set()
+            slots.ready.set()
+    
+    receiver = asyncio.create_task(receive_loop())
+    last_message = None
+    seq = 0
+    
+    try:
+        while True:
+            await slots.ready.wait()
+            if closed.is_set():
+                break
+            
+            frames = slots.take()
+            started = asyncio.get_running_loop().time()
+            try:
+                results = await run_in(
+                    "purity", purity_service.analyze_frame_bytes, frames[1], frames[2],
+                    output="detections", session_id=session_id
+                )
+            except ExecutorSaturated:
+                # Drop this pair; the next frames to arrive are analyzed instead
+                slots.dropped += sum(data is not None for data in frames.values())
+                continue
+            seq += 1
+            
+            status = results.get("detection_status", {})
+            if status.get("message") != last_message:
+                last_message = status.get("message")
+                await websocket.send_json({"type": "status", "detection_status": status})
+            
+            await websocket.send_json({
+                "type": "result",
+                "seq": seq,
+                "cameras": [camera for camera, data in frames.items() if data is not None],
+                "rubbing_detected": results.get("rubbing_detected", False),
+                "acid_detected": results.get("acid_detected", False),
+                "phase": status.get("phase"),
+                "detections1": results.get("detections1"),
+                "detections2": results.get("detections2"),
+                "model1_status": results.get("model1_status"),
+                "model2_status": results.get("model2_status"),
+                "error": results.get("error"),
+                "latency_ms": round((asyncio.get_running_loop().time() - started) * 1000, 1),
+                "frames_received": slots.received,
+                "frames_dropped": slots.dropped
+            })
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+        if issued_session:
+            purity_service.end_session(session_id)
+
+@router.websocket("/stream/ws")
+async def purity_stream_websocket(websocket: WebSocket, frames: bool = True):
+    """Annotated server-camera stream pushed from the feed pipelines
+    
+    Server -> client, for every frame a pipeline publishes:
+    - {"type": "frame", "camera": 1|2, "seq": ..., "detections": {...}, "latency_ms": ...}
+    - binary message (unless ?frames=false): 1 byte camera id followed by the annotated JPEG
+    - {"type": "status", ...} whenever the detection status message changes
+    
+    Frames come at the pipeline's real throughput; a slow client skips
+    frames instead of queueing them.
+    """
+    await websocket.accept()
+    pipelines = {
+        camera: purity_service.pipelines.get(feed)
+        for camera, feed in ((1, "camera1"), (2, "camera2"))
+    }
+    pipelines = {camera: pipeline for camera, pipeline in pipelines.items() if pipeline is not None}
+    if not pipelines:
+        await websocket.send_json({"type": "error", "error": "Purity pipelines are not running"})
+        await websocket.close()
+        return
+    
+    session_id = purity_service.pipeline_session_id
+    await websocket.send_json({"type": "session", "session_id": session_id})
+    send_lock = asyncio.Lock()
+    last_message = {"message": None}
+    disconnected = asyncio.Event()
+    
+    async def forward(camera, pipeline):
+        last_seq = 0
+        skipped = 0
+        with pipeline.output.subscription():
+            while pipeline.running and not disconnected.is_set():
+                # A wait, not work: kept off the bounded executors so idle viewers never crowd out analysis
+                item = await run_in_threadpool(pipeline.output.wait_for, last_seq, 0.25)
+                if item is None:
+                    continue
+                seq, jpeg, meta = item
+                if last_seq and seq > last_seq + 1:
+                    skipped += seq - last_seq - 1
+                last_seq = seq
+                
+                status = purity_service.get_detection_status(session_id)
+                async with send_lock:
+                    if status.get("message") != last_message["message"]:
+                        last_message["message"] = status.get("message")
+                        await websocket.send_json({"type": "status", "detection_status": status})
+                    await websocket.send_json({
+                        "type": "frame",
+                        "camera": camera,
+                        "seq": seq,
+                        "frame_seq": meta["frame_seq"],
+                        "detections": meta["detections"],
+                        "latency_ms": meta["latency_ms"],
+                        "frames_skipped": skipped
+                    })
+                    if frames:
+                        await websocket.send_bytes(bytes([camera]) + jpeg)
+    
+    async def receive_loop():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+        finally:
+            disconnected.set()
+    
+    tasks = [asyncio.create_task(forward(camera, pipeline)) for camera, pipeline in pipelines.items()]
+    receiver = asyncio.create_task(receive_loop())
+    try:
+        # Ends on disconnect, or once every pipeline has stopped
+        forwarding = asyncio.gather(*tasks, return_exceptions=True)
+        await asyncio.wait([receiver, forwarding], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        receiver.cancel()
+        for task in tasks:
+            task.cancel()
+        if not disconnected.is_set():
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+@router.post("/reload_tasks")
+async def reload_tasks():
+    """Recompile task CSVs without reloading the models"""
+    return await run_in("io", purity_service.reload_task_rules)
+
+@router.get("/task_rules")
+async def task_rules():
+    """Compiled task rules and CSV watcher state"""
+    return purity_service.get_task_rule_stats()
+
 @router.post("/reload_models")
-async def reload_models():
-    """Force reload YOLO models"""
+async def reload_models(wait: bool = False):
+    """Reload YOLO models in the background and swap them in once validated"""
     try:
-        result = purity_service.reload_models()
-        return result
+        if wait:
+            return await run_in("io", purity_service.reload_models, True)
+        return purity_service.reload_models()
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/reload_status")
+async def reload_status():
+    """Model generation, draining sets and the last reload outcome"""
+    return purity_service.get_reload_status()
@@ -0,0 +1,410 @@
+"""
+ANN Index for Gold Loan Appraisal System
+Exact and approximate (IVF) inner-product search over normalized face embeddings
+"""
+
+import os
+import math
+import threading
+import importlib.util
+import numpy as np
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+FAISS_AVAILABLE = importlib.util.find_spec("faiss") is not None
+
+Match = Tuple[float, str]
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first"""
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.zeros(0, np.int64)
+    top = np.argpartition(-scores, k - 1)[:k] if k < scores.shape[0] else np.arange(scores.shape[0])
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    lengths = np.linalg.norm(vectors, axis=1, keepdims=True)
+    lengths[lengths == 0] = 1.0
+    return (vectors / lengths).astype(np.float32, copy=False)
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 32768) -> np.ndarray:
+    """Nearest centroid (max inner product) per row, in chunks to bound memory"""
+    out = np.empty(vectors.shape[0], np.int64)
+    for start in range(0, vectors.shape[0], chunk):
+        out[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iterations: int = 10, sample_size: Optional[int] = None,
+                    seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of the (normalized) vectors"""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    nlist = max(1, min(nlist, n))
+    sample_size = min(n, sample_size or 64 * nlist)
+    sample = vectors[np.sort(rng.choice(n, sample_size, replace=False))] if sample_size < n else vectors
+    centroids = sample[rng.choice(sample.shape[0], nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _assign(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        nonempty = counts > 0
+        sums = np.add.reduceat(sample[order], starts[nonempty], axis=0)
+        centroids[nonempty] = sums
+        empty = np.flatnonzero(~nonempty)
+        if empty.size:
+            centroids[empty] = sample[rng.choice(sample.shape[0], empty.size, replace=False)]
+        centroids = _normalize_rows(centroids)
+    return np.ascontiguousarray(centroids, dtype=np.float32)
+
+
+def default_nlist(count: int) -> int:
+    """Number of inverted lists for a gallery size (about sqrt(n), at least 1)"""
+    return max(1, int(math.sqrt(max(count, 1))))
+
+
+class FlatIndex:
+    """Exact search: one contiguous matrix, one matrix-vector product per query
+
+    Changes build a new (matrix, ids) pair and swap it in, so searches
+    never lock.
+    """
+
+    kind = "flat"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._data: Tuple[np.ndarray, Tuple[str, ...], Dict[str, int]] = (np.zeros((0, dim), np.float32), (), {})
+        self._lock = threading.Lock()
+
+    @classmethod
+    def build(cls, ids: Sequence[str], vectors: np.ndarray) -> "FlatIndex":
+        index = cls(vectors.shape[1])
+        ids = tuple(ids)
+        index._data = (np.ascontiguousarray(vectors, dtype=np.float32), ids, {i: row for row, i in enumerate(ids)})
+        return index
+
+    def __len__(self) -> int:
+        return len(self._data[1])
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._data[2]
+
+    @property
+    def nbytes(self) -> int:
+        return int(self._data[0].nbytes)
+
+    def add(self, item_id: str, vector: np.ndarray):
+        with self._lock:
+            matrix, ids, rows = self._data
+            row = rows.get(item_id)
+            if row is not None:
+                matrix = matrix.copy()
+                matrix[row] = vector
+                self._data = (matrix, ids, rows)
+            else:
+                matrix = np.vstack([matrix, vector[None, :]])
+                self._data = (matrix, ids + (item_id,), {**rows, item_id: len(ids)})
+
+    def remove(self, item_id: str):
+        with self._lock:
+            matrix, ids, rows = self._data
+            row = rows.get(item_id)
+            if row is None:
+                return
+            ids = ids[:row] + ids[row + 1:]
+            self._data = (np.delete(matrix, row, axis=0), ids, {i: r for r, i in enumerate(ids)})
+
+    def search(self, query: np.ndarray, k: int = 1) -> List[Match]:
+        matrix, ids, _ = self._data
+        if not ids:
+            return []
+        scores = matrix @ query
+        return [(float(scores[i]), ids[i]) for i in _top_k(scores, k)]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"kind": self.kind, "size": len(self), "dimensions": self.dim, "memory_bytes": self.nbytes}
+
+
+class IVFIndex:
+    """Inverted-file index in pure NumPy
+
+    Vectors are bucketed by their nearest k-means centroid; a query scans
+    only the ``nprobe`` buckets whose centroids are closest to it, so
+    latency scales with n * nprobe / nlist instead of n. Inserts go to the
+    nearest existing bucket (no retraining). Each bucket is replaced as a
+    whole on change, so searches never lock.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, centroids: np.ndarray, nprobe: Optional[int] = None):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.dim = self.centroids.shape[1]
+        self.nlist = self.centroids.shape[0]
+        self.nprobe = max(1, min(nprobe or max(1, self.nlist // 16), self.nlist))
+        empty = np.zeros((0, self.dim), np.float32)
+        self._lists: List[Tuple[np.ndarray, Tuple[str, ...]]] = [(empty, ()) for _ in range(self.nlist)]
+        self._where: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+              iterations: int = 10, seed: int = 0) -> "IVFIndex":
+        """Fit centroids on ``vectors`` (nothing is added)"""
+        nlist = nlist or default_nlist(vectors.shape[0])
+        return cls(train_centroids(vectors, nlist, iterations=iterations, seed=seed), nprobe)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._where
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.centroids.nbytes + sum(vectors.nbytes for vectors, _ in self._lists))
+
+    def add_batch(self, ids: Sequence[str], vectors: np.ndarray):
+        """Bulk insert (ids must not already be present)"""
+        assign = _assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=self.nlist)
+        with self._lock:
+            start = 0
+            for list_no in np.flatnonzero(counts):
+                rows = order[start:start + counts[list_no]]
+                start += counts[list_no]
+                old_vectors, old_ids = self._lists[list_no]
+                new_ids = tuple(ids[r] for r in rows)
+                self._lists[list_no] = (np.vstack([old_vectors, vectors[rows]]), old_ids + new_ids)
+                for item_id in new_ids:
+                    self._where[item_id] = int(list_no)
+
+    def add(self, item_id: str, vector: np.ndarray):
+        with self._lock:
+            if item_id in self._where:
+                self._remove(item_id)
+            list_no = int(np.argmax(self.centroids @ vector))
+            vectors, ids = self._lists[list_no]
+            self._lists[list_no] = (np.vstack([vectors, vector[None, :]]), ids + (item_id,))
+            self._where[item_id] = list_no
+
+    def remove(self, item_id: str):
+        with self._lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id: str):
+        list_no = self._where.pop(item_id, None)
+        if list_no is None:
+            return
+        vectors, ids = self._lists[list_no]
+        row = ids.index(item_id)
+        self._lists[list_no] = (np.delete(vectors, row, axis=0), ids[:row] + ids[row + 1:])
+
+    def search(self, query: np.ndarray, k: int = 1, nprobe: Optional[int] = None) -> List[Match]:
+        probes = _top_k(self.centroids @ query, nprobe or self.nprobe)
+        buckets = [self._lists[p] for p in probes]
+        buckets = [(vectors, ids) for vectors, ids in buckets if ids]
+        if not buckets:
+            return []
+        scores = np.concatenate([vectors @ query for vectors, _ in buckets])
+        ids = [item_id for _, bucket_ids in buckets for item_id in bucket_ids]
+        return [(float(scores[i]), ids[i]) for i in _top_k(scores, k)]
+
+    def save(self, path: str, **extra: np.ndarray):
+        """Write centroids, buckets and any extra arrays to ``path`` (.npz)"""
+        lists = list(self._lists)
+        sizes = np.array([len(ids) for _, ids in lists], np.int64)
+        vectors = np.vstack([v for v, _ in lists]) if len(lists) else np.zeros((0, self.dim), np.float32)
+        ids = np.array([item_id for _, bucket_ids in lists for item_id in bucket_ids], dtype=str)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, kind=np.array(self.kind), centroids=self.centroids, nprobe=np.array(self.nprobe),
+                 sizes=sizes, vectors=vectors, ids=ids, **extra)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["IVFIndex", Dict[str, np.ndarray]]:
+        with np.load(path, allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        index = cls(arrays.pop("centroids"), int(arrays.pop("nprobe")))
+        sizes, vectors, ids = arrays.pop("sizes"), arrays.pop("vectors"), arrays.pop("ids").tolist()
+        arrays.pop("kind", None)
+        offset = 0
+        for list_no, size in enumerate(sizes):
+            bucket_ids = tuple(ids[offset:offset + size])
+            index._lists[list_no] = (vectors[offset:offset + size].copy(), bucket_ids)
+            for item_id in bucket_ids:
+                index._where[item_id] = list_no
+            offset += size
+        return index, arrays
+
+    def get_stats(self) -> Dict[str, Any]:
+        sizes = [len(ids) for _, ids in self._lists]
+        return {
+            "kind": self.kind,
+            "size": len(self),
+            "dimensions": self.dim,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "largest_list": max(sizes) if sizes else 0,
+            "memory_bytes": self.nbytes,
+        }
+
+
+class FaissIVFIndex:
+    """faiss IndexIVFFlat (inner product) with string ids, used when faiss-cpu is installed"""
+
+    kind = "faiss"
+
+    def __init__(self, index, nprobe: Optional[int] = None):
+        self.index = index
+        self.dim = index.d
+        self.nlist = index.nlist
+        self.index.nprobe = max(1, min(nprobe or max(1, self.nlist // 16), self.nlist))
+        self._ids: Dict[str, int] = {}
+        self._names: Dict[int, str] = {}
+        self._next_id = 0
+        # faiss allows concurrent searches but not searches concurrent with writes
+        self._lock = threading.Lock()
+
+    @property
+    def nprobe(self) -> int:
+        return self.index.nprobe
+
+    @nprobe.setter
+    def nprobe(self, value: int):
+        self.index.nprobe = max(1, min(value, self.nlist))
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: Optional[int] = None, nprobe: Optional[int] = None,
+              iterations: int = 10, seed: int = 0) -> "FaissIVFIndex":
+        import faiss
+        nlist = max(1, min(nlist or default_nlist(vectors.shape[0]), vectors.shape[0]))
+        quantizer = faiss.IndexFlatIP(vectors.shape[1])
+        index = faiss.IndexIVFFlat(quantizer, vectors.shape[1], nlist, faiss.METRIC_INNER_PRODUCT)
+        index.cp.niter = iterations
+        index.cp.seed = seed
+        index.train(np.ascontiguousarray(vectors, dtype=np.float32))
+        wrapper = cls(index, nprobe)
+        wrapper._quantizer = quantizer  # keep the Python object alive with the index
+        return wrapper
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._ids
+
+    @property
+    def nbytes(self) -> int:
+        return int(len(self) * self.dim * 4 + self.nlist * self.dim * 4)
+
+    def _assign_ids(self, ids: Iterable[str]) -> np.ndarray:
+        numbers = []
+        for item_id in ids:
+            number = self._next_id
+            self._next_id += 1
+            self._ids[item_id] = number
+            self._names[number] = item_id
+            numbers.append(number)
+        return np.array(numbers, np.int64)
+
+    def add_batch(self, ids: Sequence[str], vectors: np.ndarray):
+        with self._lock:
+            self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), self._assign_ids(ids))
+
+    def add(self, item_id: str, vector: np.ndarray):
+        with self._lock:
+            if item_id in self._ids:
+                self._remove(item_id)
+            self.index.add_with_ids(np.ascontiguousarray(vector[None, :], dtype=np.float32), self._assign_ids([item_id]))
+
+    def remove(self, item_id: str):
+        with self._lock:
+            self._remove(item_id)
+
+    def _remove(self, item_id: str):
+        number = self._ids.pop(item_id, None)
+        if number is not None:
+            del self._names[number]
+            self.index.remove_ids(np.array([number], np.int64))
+
+    def search(self, query: np.ndarray, k: int = 1, nprobe: Optional[int] = None) -> List[Match]:
+        with self._lock:
+            if nprobe:
+                previous, self.index.nprobe = self.index.nprobe, nprobe
+            try:
+                scores, numbers = self.index.search(np.ascontiguousarray(query[None, :], dtype=np.float32), k)
+            finally:
+                if nprobe:
+                    self.index.nprobe = previous
+        return [(float(s), self._names[int(n)]) for s, n in zip(scores[0], numbers[0]) if n >= 0]
+
+    def save(self, path: str, **extra: np.ndarray):
+        import faiss
+        with self._lock:
+            faiss.write_index(self.index, path + ".tmp")
+            names = sorted(self._ids.items(), key=lambda item: item[1])
+            np.savez(path + ".ids.tmp.npz", ids=np.array([n for n, _ in names], dtype=str),
+                     numbers=np.array([i for _, i in names], np.int64), **extra)
+        os.replace(path + ".tmp", path)
+        os.replace(path + ".ids.tmp.npz", path + ".ids.npz")
+
+    @classmethod
+    def load(cls, path: str) -> Tuple["FaissIVFIndex", Dict[str, np.ndarray]]:
+        import faiss
+        index = faiss.read_index(path)
+        wrapper = cls(index, index.nprobe)
+        with np.load(path + ".ids.npz", allow_pickle=False) as data:
+            arrays = {name: data[name] for name in data.files}
+        for item_id, number in zip(arrays.pop("ids").tolist(), arrays.pop("numbers").tolist()):
+            wrapper._ids[item_id] = number
+            wrapper._names[number] = item_id
+        wrapper._next_id = max(wrapper._names, default=-1) + 1
+        return wrapper, arrays
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "size": len(self),
+            "dimensions": self.dim,
+            "nlist": self.nlist,
+            "nprobe": self.nprobe,
+            "memory_bytes": self.nbytes,
+        }
+
+
+ANN_BACKENDS = {"ivf": IVFIndex, "faiss": FaissIVFIndex}
+
+
+def resolve_backend(name: str) -> Optional[str]:
+    """ivf | faiss | auto (faiss when installed) -> backend name, None for none/flat"""
+    name = (name or "none").strip().lower()
+    if name in ("", "none", "flat", "off"):
+        return None
+    if name == "auto":
+        return "faiss" if FAISS_AVAILABLE else "ivf"
+    if name == "faiss" and not FAISS_AVAILABLE:
+        print("⚠️ faiss not installed, using the NumPy IVF index (pip install faiss-cpu)")
+        return "ivf"
+    if name not in ANN_BACKENDS:
+        raise ValueError(f"Unknown ANN index '{name}' (expected none, ivf, faiss or auto)")
+    return name
+
+
+def index_path(base_path: str, backend: str) -> str:
+    return f"{base_path}.{backend}.npz" if backend == "ivf" else f"{base_path}.{backend}"
+
+
+def build_index(backend: str, ids: Sequence[str], vectors: np.ndarray, nlist: Optional[int] = None,
+                nprobe: Optional[int] = None):
+    """Train an ANN index on ``vectors`` and add them all"""
+    index = ANN_BACKENDS[backend].train(vectors, nlist=nlist, nprobe=nprobe)
+    index.add_batch(list(ids), vectors)
+    return index
@@ -0,0 +1,122 @@
+"""
+Box Operations for Gold Loan Appraisal System
+Vectorized IoU and pair detection kernels for YOLO detections
+"""
+
+import numpy as np
+from typing import List, Sequence, Tuple
+
+EMPTY_BOXES = np.zeros((0, 4), dtype=np.float64)
+
+
+def _as_boxes(boxes) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=np.float64)
+    return boxes.reshape(-1, 4) if boxes.size else EMPTY_BOXES
+
+
+def pairwise_iou(boxes1, boxes2) -> np.ndarray:
+    """IoU of every box in boxes1 (N x 4, xyxy) against every box in boxes2 (M x 4)
+
+    Returns an N x M matrix. A zero union gives an IoU of 0, matching the
+    scalar ``PurityTestingService.iou``.
+    """
+    a = _as_boxes(boxes1)[:, None, :]
+    b = _as_boxes(boxes2)[None, :, :]
+
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+
+    iou = np.zeros_like(inter)
+    np.divide(inter, union, out=iou, where=union != 0)
+    return iou
+
+
+def iou_pairs(boxes, indices1: Sequence[int], indices2: Sequence[int],
+              iou_threshold: float) -> List[Tuple[int, int]]:
+    """All (i, j) with i from indices1, j from indices2 and IoU above the threshold
+
+    Pairs come back in the same order as the nested ``for i: for j:`` loop.
+    """
+    if len(indices1) == 0 or len(indices2) == 0:
+        return []
+    boxes = _as_boxes(boxes)
+    indices1 = np.asarray(indices1, dtype=np.intp)
+    indices2 = np.asarray(indices2, dtype=np.intp)
+    rows, cols = np.nonzero(pairwise_iou(boxes[indices1], boxes[indices2]) > iou_threshold)
+    return list(zip(indices1[rows].tolist(), indices2[cols].tolist()))
+
+
+def class_pairs(boxes, class_ids, class1, class2, iou_threshold: float) -> List[Tuple[int, int]]:
+    """Overlapping (class1, class2) detection pairs in one frame"""
+    class_ids = np.asarray(class_ids)
+    return iou_pairs(boxes, np.flatnonzero(class_ids == class1), np.flatnonzero(class_ids == class2), iou_threshold)
+
+
+def batch_pairwise_iou(boxes1_list: Sequence, boxes2_list: Sequence) -> Tuple[np.ndarray, np.ndarray]:
+    """IoU matrices for several frames in one operation
+
+    Each frame's boxes are padded to the largest count in the batch.
+    Returns ``(iou, valid)``, both B x N x M; padded entries have
+    ``valid == False`` and an IoU of 0.
+    """
+    if len(boxes1_list) != len(boxes2_list):
+        raise ValueError("boxes1_list and boxes2_list must have the same length")
+
+    batch = len(boxes1_list)
+    boxes1 = [_as_boxes(b) for b in boxes1_list]
+    boxes2 = [_as_boxes(b) for b in boxes2_list]
+    n = max((len(b) for b in boxes1), default=0)
+    m = max((len(b) for b in boxes2), default=0)
+
+    padded1 = np.zeros((batch, n, 4), dtype=np.float64)
+    padded2 = np.zeros((batch, m, 4), dtype=np.float64)
+    valid1 = np.zeros((batch, n), dtype=bool)
+    valid2 = np.zeros((batch, m), dtype=bool)
+    for k, (b1, b2) in enumerate(zip(boxes1, boxes2)):
+        padded1[k, :len(b1)] = b1
+        padded2[k, :len(b2)] = b2
+        valid1[k, :len(b1)] = True
+        valid2[k, :len(b2)] = True
+
+    a = padded1[:, :, None, :]
+    b = padded2[:, None, :, :]
+    inter_w = np.clip(np.minimum(a[..., 2], b[..., 2]) - np.maximum(a[..., 0], b[..., 0]), 0, None)
+    inter_h = np.clip(np.minimum(a[..., 3], b[..., 3]) - np.maximum(a[..., 1], b[..., 1]), 0, None)
+    inter = inter_w * inter_h
+    area_a = (a[..., 2] - a[..., 0]) * (a[..., 3] - a[..., 1])
+    area_b = (b[..., 2] - b[..., 0]) * (b[..., 3] - b[..., 1])
+    union = area_a + area_b - inter
+
+    valid = valid1[:, :, None] & valid2[:, None, :]
+    iou = np.zeros_like(inter)
+    np.divide(inter, union, out=iou, where=valid & (union != 0))
+    return iou, valid
+
+
+def batch_class_pairs(boxes_list: Sequence, class_ids_list: Sequence, class1, class2,
+                      iou_threshold: float) -> List[List[Tuple[int, int]]]:
+    """Overlapping (class1, class2) pairs for several frames at once
+
+    Returns one pair list per frame, indexed into that frame's detections.
+    """
+    indices1, indices2 = [], []
+    for class_ids in class_ids_list:
+        class_ids = np.asarray(class_ids)
+        indices1.append(np.flatnonzero(class_ids == class1))
+        indices2.append(np.flatnonzero(class_ids == class2))
+
+    iou, valid = batch_pairwise_iou(
+        [_as_boxes(b)[i] for b, i in zip(boxes_list, indices1)],
+        [_as_boxes(b)[i] for b, i in zip(boxes_list, indices2)],
+    )
+
+    pairs: List[List[Tuple[int, int]]] = [[] for _ in boxes_list]
+    frames, rows, cols = np.nonzero(valid & (iou > iou_threshold))
+    for k, r, c in zip(frames.tolist(), rows.tolist(), cols.tolist()):
+        pairs[k].append((int(indices1[k][r]), int(indices2[k][c])))
+    return pairs
@@ -0,0 +1,260 @@
+"""
+Camera Hub for Gold Loan Appraisal System
+One capture thread per camera, broadcasting a single encoded frame to every subscriber
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+import cv2
+import numpy as np
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+class EncodedFrameSlot:
+    """Latest encoded JPEG with a sequence number subscribers wait on
+
+    Subscribers always take the newest frame, so a slow client skips
+    frames instead of stalling the publisher or the other clients.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jpeg: Optional[bytes] = None
+        self._meta: Any = None
+        self._seq = 0
+        self._closed = False
+        self._subscribers = 0
+        self._dropped = 0
+
+    def publish(self, jpeg: bytes, meta: Any = None):
+        with self._cond:
+            self._jpeg = jpeg
+            self._meta = meta
+            self._seq += 1
+            self._cond.notify_all()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    @property
+    def subscribers(self) -> int:
+        return self._subscribers
+
+    @contextmanager
+    def subscription(self):
+        """Count a subscriber for as long as the block runs"""
+        with self._cond:
+            self._subscribers += 1
+        try:
+            yield self
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def latest(self) -> Tuple[int, Optional[bytes], Any]:
+        """(sequence, encoded JPEG, metadata) of the newest frame"""
+        with self._cond:
+            return self._seq, self._jpeg, self._meta
+
+    def wait_for(self, after_seq: int, timeout: float = 1.0) -> Optional[Tuple[int, bytes, Any]]:
+        """Block until a frame newer than ``after_seq`` is published"""
+        with self._cond:
+            if self._seq <= after_seq and not self._closed:
+                self._cond.wait_for(lambda: self._seq > after_seq or self._closed, timeout=timeout)
+            if self._seq <= after_seq:
+                return None
+            return self._seq, self._jpeg, self._meta
+
+    def count_dropped(self, last_seq: int, seq: int):
+        """Record frames a subscriber skipped between two reads"""
+        if last_seq and seq > last_seq + 1:
+            with self._cond:
+                self._dropped += seq - last_seq - 1
+
+    def stream(self) -> Iterator[bytes]:
+        """multipart/x-mixed-replace parts for one subscriber"""
+        last_seq = 0
+        with self.subscription():
+            while not self._closed:
+                item = self.wait_for(last_seq)
+                if item is None:
+                    continue
+                seq, jpeg, _ = item
+                self.count_dropped(last_seq, seq)
+                last_seq = seq
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "subscribers": self._subscribers,
+                "frames_published": self._seq,
+                "frames_dropped_by_subscribers": self._dropped,
+            }
+
+
+class CameraBroadcaster:
+    """Reads one cv2.VideoCapture continuously and shares the latest frame
+
+    The capture thread keeps the device drained at its native rate, keeps
+    the newest raw frame for analysis and JPEG-encodes at most
+    ``encode_fps`` times per second into a shared EncodedFrameSlot.
+    """
+
+    def __init__(self, name: str, capture: cv2.VideoCapture, jpeg_quality: int = 75, encode_fps: float = 15.0):
+        self.name = name
+        self.capture = capture
+        self.jpeg_quality = jpeg_quality
+        self.encode_interval = 1.0 / encode_fps if encode_fps > 0 else 0.0
+        self.output = EncodedFrameSlot()
+
+        self._cond = threading.Condition()
+        self._frame: Optional[np.ndarray] = None
+        self._frame_seq = 0
+        self._frame_time = 0.0
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+        self._read_failures = 0
+        self._started_at = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"camera-hub-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop capturing (the capture itself is released by its owner)"""
+        self._halt()
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _halt(self):
+        self._running = False
+        self.output.close()
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _run(self):
+        last_encode = 0.0
+        while self._running:
+            try:
+                ret, frame = self.capture.read()
+            except Exception as e:
+                print(f"Error reading {self.name}: {e}")
+                ret, frame = False, None
+            if not ret:
+                self._read_failures += 1
+                if not self.capture.isOpened():
+                    print(f"⚠️ {self.name} closed, stopping broadcast")
+                    self._halt()
+                    break
+                time.sleep(0.01)
+                continue
+
+            now = time.monotonic()
+            with self._cond:
+                self._frame = frame
+                self._frame_seq += 1
+                self._frame_time = now
+                self._cond.notify_all()
+
+            if now - last_encode < self.encode_interval:
+                continue
+            last_encode = now
+
+            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+            if ret:
+                self.output.publish(buffer.tobytes())
+
+    def latest_frame(self) -> Tuple[int, Optional[np.ndarray]]:
+        """(sequence, raw BGR frame) of the newest capture"""
+        with self._cond:
+            return self._frame_seq, self._frame
+
+    def wait_for_frame(self, after_seq: int, timeout: float = 1.0) -> Optional[Tuple[int, np.ndarray, float]]:
+        """Block until a raw frame newer than ``after_seq`` is captured
+
+        Returns (sequence, frame, monotonic capture time). The frame is
+        shared with other readers, so copy it before drawing on it.
+        """
+        with self._cond:
+            if self._frame_seq <= after_seq and self._running:
+                self._cond.wait_for(lambda: self._frame_seq > after_seq or not self._running, timeout=timeout)
+            if self._frame_seq <= after_seq:
+                return None
+            return self._frame_seq, self._frame, self._frame_time
+
+    def stream(self) -> Iterator[bytes]:
+        """Raw MJPEG parts for one subscriber"""
+        return self.output.stream()
+
+    def get_stats(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        output = self.output.get_stats()
+        return {
+            "running": self._running,
+            "subscribers": output["subscribers"],
+            "frames_captured": self._frame_seq,
+            "frames_encoded": output["frames_published"],
+            "read_failures": self._read_failures,
+            "frames_dropped_by_subscribers": output["frames_dropped_by_subscribers"],
+            "capture_fps": round(self._frame_seq / elapsed, 1) if elapsed else 0.0,
+            "encode_fps": round(output["frames_published"] / elapsed, 1) if elapsed else 0.0,
+        }
+
+
+class CameraHub:
+    """Broadcasters by feed name; feeds sharing one capture share one broadcaster"""
+
+    def __init__(self, jpeg_quality: int = 75, encode_fps: float = 15.0):
+        self.jpeg_quality = jpeg_quality
+        self.encode_fps = encode_fps
+        self._feeds: Dict[str, CameraBroadcaster] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, feed: str, capture: cv2.VideoCapture) -> CameraBroadcaster:
+        """Start broadcasting a capture under a feed name"""
+        with self._lock:
+            broadcaster = next((b for b in self._feeds.values() if b.capture is capture), None)
+            if broadcaster is None:
+                broadcaster = CameraBroadcaster(feed, capture, self.jpeg_quality, self.encode_fps)
+                broadcaster.start()
+            self._feeds[feed] = broadcaster
+            return broadcaster
+
+    def get(self, feed: str) -> Optional[CameraBroadcaster]:
+        with self._lock:
+            return self._feeds.get(feed)
+
+    def stop_all(self):
+        """Stop every capture thread so the owner can release the devices"""
+        with self._lock:
+            broadcasters = {id(b): b for b in self._feeds.values()}.values()
+            self._feeds.clear()
+        for broadcaster in broadcasters:
+            broadcaster.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            feeds = dict(self._feeds)
+        return {
+            feed: {**b.get_stats(), "device": b.name, "shared": sum(x is b for x in feeds.values()) > 1}
+            for feed, b in feeds.items()
+        }
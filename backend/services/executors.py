@@ -0,0 +1,182 @@
+"""
+Executors for Gold Loan Appraisal System
+Named, bounded thread pools that keep blocking work (inference, decoding, database, devices) off the event loop
+"""
+
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+from services.metrics import REGISTRY
+
+# Workload classes: (default workers, default queue size)
+#   face   - insightface detection/embedding and image decoding
+#   purity - YOLO inference and frame decoding; None workers = PURITY_BATCH_MAX_SIZE, because
+#            these threads mostly wait on the micro-batcher, which needs that many frames in
+#            flight to fill a batch (the inference itself is serialized inside the scheduler)
+#   db     - psycopg2 queries
+#   io     - camera probes, GPS/HTTP lookups, file reads, blocking waits
+EXECUTOR_DEFAULTS = {
+    "face": (2, 16),
+    "purity": (None, 32),
+    "db": (8, 64),
+    "io": (8, 64),
+}
+
+EXECUTOR_QUEUE_WAIT = REGISTRY.histogram(
+    "executor_queue_wait_seconds", "Time a call waited for an executor thread", ["executor"])
+EXECUTOR_RUN_SECONDS = REGISTRY.histogram(
+    "executor_run_seconds", "Time a call ran on an executor thread", ["executor"])
+EXECUTOR_REJECTED = REGISTRY.counter(
+    "executor_rejected_total", "Calls rejected because the executor queue was full", ["executor"])
+
+
+class ExecutorSaturated(Exception):
+    """Raised instead of queueing when an executor's queue is full (served as 503)"""
+
+    def __init__(self, name: str, retry_after: int = 1):
+        super().__init__(f"{name} executor is saturated, try again shortly")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class BoundedExecutor:
+    """Thread pool with a hard cap on queued calls
+
+    ``run`` awaits ``func`` on one of ``workers`` threads. At most
+    ``queue_size`` further calls may wait for a thread; beyond that the
+    call fails fast with ExecutorSaturated, so overload turns into quick
+    503s instead of an ever-growing backlog of requests that will time
+    out anyway.
+    """
+
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = max(1, int(workers))
+        self.queue_size = max(0, int(queue_size))
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{name}-exec")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._wait = EXECUTOR_QUEUE_WAIT.labels(executor=name)
+        self._run = EXECUTOR_RUN_SECONDS.labels(executor=name)
+        self._rejections = EXECUTOR_REJECTED.labels(executor=name)
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            if self._queued + self._active >= self.workers + self.queue_size:
+                self._rejected += 1
+                self._rejections.inc()
+                raise ExecutorSaturated(self.name)
+            self._queued += 1
+
+        submitted = time.perf_counter()
+        context = contextvars.copy_context()
+        call = partial(func, *args, **kwargs)
+
+        def execute():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+            self._wait.observe(started - submitted)
+            try:
+                return context.run(call)
+            finally:
+                self._run.observe(time.perf_counter() - started)
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        future = self._pool.submit(execute)
+
+        def dequeue_if_cancelled(done):
+            # A call cancelled before it started never reaches execute()
+            if done.cancelled():
+                with self._lock:
+                    self._queued -= 1
+
+        future.add_done_callback(dequeue_if_cancelled)
+        return await asyncio.wrap_future(future)
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "active": self._active,
+                "queued": self._queued,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
+
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    """The executor for a workload class, created from EXECUTOR_<NAME>_WORKERS/_QUEUE on first use"""
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    if name not in EXECUTOR_DEFAULTS:
+        raise ValueError(f"Unknown executor '{name}' (expected one of {', '.join(EXECUTOR_DEFAULTS)})")
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None:
+            workers, queue_size = EXECUTOR_DEFAULTS[name]
+            if workers is None:
+                workers = max(2, int(os.getenv("PURITY_BATCH_MAX_SIZE", "8")))
+            prefix = f"EXECUTOR_{name.upper()}"
+            executor = _executors[name] = BoundedExecutor(
+                name,
+                workers=int(os.getenv(f"{prefix}_WORKERS") or workers),
+                queue_size=int(os.getenv(f"{prefix}_QUEUE") or queue_size),
+            )
+        return executor
+
+
+async def run_in(name: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run blocking ``func`` on the named executor and await its result"""
+    return await get_executor(name).run(func, *args, **kwargs)
+
+
+def shutdown_executors(wait: bool = False):
+    with _executors_lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+def get_executor_stats(name: Optional[str] = None) -> Dict[str, Any]:
+    if name is not None:
+        return get_executor(name).get_stats()
+    return {executor_name: get_executor(executor_name).get_stats() for executor_name in EXECUTOR_DEFAULTS}
+
+
+def _gauge(attribute: str) -> Callable[[], Dict[tuple, float]]:
+    return lambda: {(name, ): getattr(executor, attribute) for name, executor in list(_executors.items())}
+
+
+REGISTRY.gauge("executor_queued", "Calls waiting for an executor thread", _gauge("queued"), ["executor"])
+REGISTRY.gauge("executor_active", "Calls running on an executor thread", _gauge("active"), ["executor"])
@@ -0,0 +1,391 @@
+"""
+Face Gallery for Gold Loan Appraisal System
+Resident index of normalized appraiser face embeddings for one-shot 1:N matching
+"""
+
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.ann_index import ANN_BACKENDS, FlatIndex, build_index, index_path, resolve_backend
+
+
+# Stored embedding layout: raw little-endian float32, one vector per row
+EMBEDDING_DTYPE = np.dtype("<f4")
+
+
+def encode_embedding(embedding: np.ndarray) -> bytes:
+    """Embedding as raw little-endian float32 bytes for the face_embedding column"""
+    return np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).ravel().tobytes()
+
+
+def parse_embedding(encoding) -> Optional[np.ndarray]:
+    """Stored embedding (float32 bytes, or legacy comma-separated text) as a float32 vector
+
+    Bytes are wrapped with np.frombuffer, so no copy is made; the result is
+    read-only.
+    """
+    if encoding is None:
+        return None
+    if isinstance(encoding, np.ndarray):
+        return encoding.astype(np.float32, copy=False).ravel()
+    if isinstance(encoding, (bytes, bytearray, memoryview)):
+        if not len(encoding) or len(encoding) % EMBEDDING_DTYPE.itemsize:
+            return None
+        return np.frombuffer(encoding, dtype=EMBEDDING_DTYPE)
+    text = encoding.strip() if isinstance(encoding, str) else ""
+    if not text:
+        return None
+    return np.array(text.split(","), dtype=np.float32)
+
+
+def stored_embedding(row: Dict[str, Any]):
+    """A row's embedding column value: binary face_embedding, else the legacy face_encoding text"""
+    value = row.get("face_embedding")
+    return value if value is not None else row.get("face_encoding")
+
+
+def normalize(embedding: np.ndarray) -> Optional[np.ndarray]:
+    """L2-normalized float32 copy, or None for a zero/non-finite vector"""
+    vector = np.asarray(embedding, dtype=np.float32).ravel()
+    length = float(np.linalg.norm(vector))
+    if not np.isfinite(length) or length == 0.0:
+        return None
+    return vector / length
+
+
+def encoding_digest(encoding) -> str:
+    """Short content hash of a stored encoding, to detect changed rows without parsing them"""
+    data = encoding if isinstance(encoding, (bytes, bytearray, memoryview)) else str(encoding).encode()
+    return hashlib.blake2b(bytes(data), digest_size=8).hexdigest()
+
+
+class FaceGallery:
+    """Registered appraiser embeddings held in memory for matching
+
+    Rows are L2-normalized, so cosine similarity is an inner product.
+    Small galleries use an exact FlatIndex (one matrix-vector product per
+    query). Once a gallery reaches ``ann_min_size`` and an ANN backend is
+    configured, it uses an IVF index instead (NumPy, or faiss when
+    installed). The index is persisted to ``ann_path``; on the next load
+    only rows whose content changed are re-added, so training is skipped.
+
+    The gallery is loaded once from ``loader`` (rows with appraiser_id,
+    name, id and face_embedding/face_encoding) and kept current with ``upsert``/``remove``.
+    ``refresh_seconds`` > 0 reloads in the background once the gallery is
+    older than that, picking up rows written by other processes. Rows
+    tagged with a ``face_model_version`` other than ``model_version`` are
+    skipped: embeddings from different models are not comparable.
+
+    ``lookup`` serves 1:1 verification: one appraiser's embedding, fetched
+    by key with ``fetch_one`` and kept in an LRU cache of ``cache_size``
+    entries for ``cache_ttl_seconds``. ``upsert``/``remove`` update the
+    cache too, so it never outlives a change made through this gallery.
+    """
+
+    def __init__(self, loader: Callable[[], List[Dict[str, Any]]], refresh_seconds: float = 300.0,
+                 ann_backend: str = "none", ann_min_size: int = 20000, ann_path: str = "",
+                 ann_nprobe: Optional[int] = None, model_version: Optional[str] = None,
+                 fetch_one: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                 cache_size: int = 1024, cache_ttl_seconds: float = 300.0):
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        self.ann_backend = resolve_backend(ann_backend)
+        self.ann_min_size = ann_min_size
+        self.ann_path = ann_path
+        self.ann_nprobe = ann_nprobe
+        self.model_version = model_version
+        self.fetch_one = fetch_one
+        self.cache_size = max(1, int(cache_size))
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self._cache: "OrderedDict[str, Tuple[float, np.ndarray, Dict[str, Any]]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_hits = 0
+        self._cache_misses = 0
+        self._index = None
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._digests: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded_at = 0.0
+        self._loading = False
+        self._pending: List[Tuple[str, Any]] = []
+        self._skipped = 0
+        self._load_seconds = 0.0
+        self._last_load: Dict[str, Any] = {}
+
+    @property
+    def loaded(self) -> bool:
+        return self._index is not None
+
+    def __len__(self) -> int:
+        index = self._index
+        return len(index) if index is not None else 0
+
+    @staticmethod
+    def _meta_for(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {"appraiser_id": str(row["appraiser_id"]), "name": row.get("name"), "db_id": row.get("id")}
+
+    def _parse_rows(self, rows: List[Dict[str, Any]]) -> Tuple[List[str], np.ndarray, int]:
+        """(appraiser ids, normalized matrix, skipped count) for rows with a readable embedding"""
+        vectors, ids = [], []
+        skipped = 0
+        dim = None
+        for row in rows:
+            version = row.get("face_model_version")
+            if self.model_version and version and version != self.model_version:
+                skipped += 1
+                continue
+            try:
+                vector = parse_embedding(stored_embedding(row))
+                vector = normalize(vector) if vector is not None else None
+            except (TypeError, ValueError):
+                vector = None
+            if vector is None or (dim is not None and vector.shape[0] != dim):
+                skipped += 1
+                continue
+            dim = vector.shape[0]
+            vectors.append(vector)
+            ids.append(str(row["appraiser_id"]))
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), np.float32)
+        return ids, np.ascontiguousarray(matrix, dtype=np.float32), skipped
+
+    def load(self):
+        """(Re)build the gallery from the database"""
+        with self._load_lock:
+            started = time.perf_counter()
+            with self._lock:
+                self._loading = True
+                self._pending = []
+            try:
+                rows = self.loader()
+                meta = {str(row["appraiser_id"]): self._meta_for(row) for row in rows}
+                digests = {str(row["appraiser_id"]): encoding_digest(stored_embedding(row)) for row in rows}
+                backend = self.ann_backend if self.ann_backend and len(rows) >= self.ann_min_size else None
+                if backend:
+                    index, skipped, stats = self._load_ann(backend, rows, digests)
+                else:
+                    ids, matrix, skipped = self._parse_rows(rows)
+                    index = FlatIndex.build(ids, matrix) if ids else FlatIndex(0)
+                    stats = {"mode": "flat"}
+            except Exception:
+                with self._lock:
+                    self._loading = False
+                raise
+
+            with self._lock:
+                # Registrations/deletions made while the rows were being read
+                for op, args in self._pending:
+                    if op == "upsert":
+                        item_meta, vector = args
+                        if len(index) and index.dim != vector.shape[0]:
+                            skipped += 1
+                            continue
+                        if not len(index) and index.dim != vector.shape[0]:
+                            index = FlatIndex(vector.shape[0])
+                        index.add(item_meta["appraiser_id"], vector)
+                        meta[item_meta["appraiser_id"]] = item_meta
+                        digests[item_meta["appraiser_id"]] = ""
+                    else:
+                        index.remove(args)
+                        digests.pop(args, None)
+                self._pending = []
+                self._loading = False
+                self._index = index
+                self._meta = meta
+                self._digests = digests
+                self._loaded_at = time.monotonic()
+                self._skipped = skipped
+                self._load_seconds = time.perf_counter() - started
+                self._last_load = stats
+        if skipped:
+            print(f"⚠️ Face gallery: skipped {skipped} unreadable, mismatched or other-model embeddings")
+        print(f"✓ Face gallery loaded: {len(index)} embeddings ({index.kind}) in {self._load_seconds * 1000:.0f} ms")
+
+    def _load_ann(self, backend: str, rows: List[Dict[str, Any]], digests: Dict[str, str]):
+        """Persisted ANN index brought up to date with the rows, or a freshly trained one"""
+        path = index_path(self.ann_path, backend) if self.ann_path else ""
+        index, stored = None, {}
+        if path and os.path.exists(path):
+            try:
+                index, extra = ANN_BACKENDS[backend].load(path)
+                stored = dict(zip(extra["digest_ids"].tolist(), extra["digests"].tolist()))
+            except Exception as e:
+                print(f"⚠️ Face ANN index at {path} unreadable, rebuilding: {e}")
+                index = None
+
+        if index is not None:
+            stale = [item_id for item_id, digest in stored.items() if digests.get(item_id) != digest]
+            changed = [row for row in rows if stored.get(str(row["appraiser_id"])) != digests[str(row["appraiser_id"])]]
+            if len(stale) + len(changed) <= len(rows) // 2:
+                for item_id in stale:
+                    index.remove(item_id)
+                ids, matrix, skipped = self._parse_rows(changed)
+                if ids and matrix.shape[1] != index.dim:
+                    print(f"⚠️ Face ANN index dimension {index.dim} does not match embeddings, rebuilding")
+                else:
+                    if ids:
+                        index.add_batch(ids, matrix)
+                    if self.ann_nprobe:
+                        index.nprobe = self.ann_nprobe
+                    if stale or ids:
+                        self._save_index(index, path, digests)
+                    return index, skipped, {"mode": backend, "source": "file", "removed": len(stale), "added": len(ids)}
+
+        ids, matrix, skipped = self._parse_rows(rows)
+        if not ids:
+            # Nothing usable to train on
+            return FlatIndex(0), skipped, {"mode": "flat", "source": "empty"}
+        index = build_index(backend, ids, matrix, nprobe=self.ann_nprobe)
+        if path:
+            self._save_index(index, path, digests)
+        return index, skipped, {"mode": backend, "source": "trained", "added": len(ids)}
+
+    def _save_index(self, index, path: str, digests: Dict[str, str]):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        index.save(path, digest_ids=np.array(list(digests), dtype=str), digests=np.array(list(digests.values()), dtype=str))
+
+    def save(self):
+        """Persist the ANN index (no-op for a flat gallery)"""
+        index = self._index
+        if index is None or index.kind == "flat" or not self.ann_path:
+            return
+        with self._lock:
+            digests = dict(self._digests)
+        self._save_index(index, index_path(self.ann_path, index.kind), digests)
+
+    def ensure_loaded(self):
+        if self._index is None:
+            self.load()
+        elif self.refresh_seconds > 0 and time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._refresh_in_background()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._loading:
+                return
+            self._loaded_at = time.monotonic()  # one refresh per period, even if it fails
+
+        def refresh():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"⚠️ Face gallery refresh failed: {e}")
+
+        threading.Thread(target=refresh, name="face-gallery-refresh", daemon=True).start()
+
+    def upsert(self, appraiser_id: str, embedding: np.ndarray, name: Optional[str] = None,
+               db_id: Optional[int] = None):
+        """Add or replace one appraiser's embedding"""
+        vector = normalize(embedding)
+        if vector is None:
+            raise ValueError("Cannot index a zero or non-finite embedding")
+        meta = {"appraiser_id": str(appraiser_id), "name": name, "db_id": db_id}
+        with self._lock:
+            index = self._index
+            # Checked before queueing, so a rejected embedding never reaches the next load
+            if index is not None and len(index) and index.dim != vector.shape[0]:
+                raise ValueError(f"Embedding size {vector.shape[0]} does not match gallery size {index.dim}")
+            if self._loading:
+                self._pending.append(("upsert", (meta, vector)))
+            if index is not None:
+                if not len(index) and index.dim != vector.shape[0]:
+                    index = self._index = FlatIndex(vector.shape[0])
+                index.add(meta["appraiser_id"], vector)
+                self._meta = {**self._meta, meta["appraiser_id"]: meta}
+                self._digests[meta["appraiser_id"]] = ""  # re-checked against the database on the next load
+        self._cache_put(meta["appraiser_id"], vector, meta)
+
+    def remove(self, appraiser_id: str):
+        """Drop one appraiser from the gallery (no-op if absent)"""
+        appraiser_id = str(appraiser_id)
+        with self._lock:
+            if self._loading:
+                self._pending.append(("remove", appraiser_id))
+            if self._index is not None:
+                self._index.remove(appraiser_id)
+                self._digests.pop(appraiser_id, None)
+        with self._cache_lock:
+            self._cache.pop(appraiser_id, None)
+
+    def _cache_put(self, appraiser_id: str, vector: np.ndarray, meta: Dict[str, Any]):
+        with self._cache_lock:
+            self._cache[appraiser_id] = (time.monotonic(), vector, meta)
+            self._cache.move_to_end(appraiser_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def lookup(self, appraiser_id: str) -> Optional[Tuple[np.ndarray, Dict[str, Any]]]:
+        """(normalized embedding, appraiser) for one id, or None if it has no usable embedding
+
+        Misses are not cached, so an appraiser registered by another
+        process can verify right away.
+        """
+        appraiser_id = str(appraiser_id)
+        now = time.monotonic()
+        with self._cache_lock:
+            entry = self._cache.get(appraiser_id)
+            if entry is not None and (self.cache_ttl_seconds <= 0 or now - entry[0] < self.cache_ttl_seconds):
+                self._cache.move_to_end(appraiser_id)
+                self._cache_hits += 1
+                return entry[1], entry[2]
+            self._cache_misses += 1
+
+        row = self.fetch_one(appraiser_id) if self.fetch_one is not None else None
+        if not row:
+            return None
+        version = row.get("face_model_version")
+        if self.model_version and version and version != self.model_version:
+            return None
+        try:
+            vector = parse_embedding(stored_embedding(row))
+            vector = normalize(vector) if vector is not None else None
+        except (TypeError, ValueError):
+            vector = None
+        if vector is None:
+            return None
+        meta = self._meta_for(row)
+        self._cache_put(appraiser_id, vector, meta)
+        return vector, meta
+
+    def search(self, embedding: np.ndarray, k: int = 1) -> List[Tuple[float, Dict[str, Any]]]:
+        """Top-k (cosine similarity, appraiser) matches, best first"""
+        self.ensure_loaded()
+        index, meta = self._index, self._meta
+        if index is None or not len(index):
+            return []
+        query = normalize(embedding)
+        if query is None or query.shape[0] != index.dim:
+            return []
+        return [
+            (similarity, meta.get(item_id, {"appraiser_id": item_id, "name": None, "db_id": None}))
+            for similarity, item_id in index.search(query, k)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        index = self._index
+        return {
+            "loaded": index is not None,
+            "embeddings": len(index) if index is not None else 0,
+            "index": index.get_stats() if index is not None else None,
+            "ann_backend": self.ann_backend,
+            "ann_min_size": self.ann_min_size,
+            "skipped_rows": self._skipped,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if index is not None else None,
+            "last_load_ms": round(self._load_seconds * 1000, 1),
+            "last_load": self._last_load,
+            "refresh_seconds": self.refresh_seconds,
+            "verify_cache": {
+                "size": len(self._cache),
+                "max_size": self.cache_size,
+                "ttl_seconds": self.cache_ttl_seconds,
+                "hits": self._cache_hits,
+                "misses": self._cache_misses,
+            },
+        }
@@ -3,6 +3,9 @@ Facial Recognition Service for Gold Loan Appraisal System
 Handles face registration, recognition, and management
 """
 
+import os
+import time
+import importlib.util
 import base64
 import numpy as np
 import cv2
@@ -12,68 +15,160 @@ from numpy import dot
 from numpy.linalg import norm
 from datetime import datetime
 
-# Try to import insightface - make it optional for development
-try:
-    import insightface
-    from insightface.app import FaceAnalysis
-    FACE_RECOGNITION_AVAILABLE = True
-    print("✅ Face recognition libraries loaded successfully")
-except ImportError as e:
-    print(f"❌ Face recognition libraries not available: {e}")
-    print(f"   Full error details: {type(e).__name__}: {str(e)}")
+from services.metrics import REGISTRY
+from services.model_slot import ModelSlot
+from services.face_gallery import FaceGallery, encode_embedding
+
+# insightface (and onnxruntime) are imported when the models are first loaded,
+# so importing this module stays cheap; only check that the package is installed
+FACE_RECOGNITION_AVAILABLE = importlib.util.find_spec("insightface") is not None
+if FACE_RECOGNITION_AVAILABLE:
+    print("✅ Face recognition libraries found (loaded on first use)")
+else:
+    print("❌ Face recognition libraries not available")
     print("   Install with: pip install insightface onnxruntime")
-    FACE_RECOGNITION_AVAILABLE = False
-    # Mock classes for development
-    class FaceAnalysis:
-        def __init__(self, **kwargs):
-            pass
-        def prepare(self, **kwargs):
-            pass
-        def get(self, img):
-            return []
-except Exception as e:
-    print(f"❌ Unexpected error loading face recognition: {type(e).__name__}: {e}")
-    import traceback
-    traceback.print_exc()
-    FACE_RECOGNITION_AVAILABLE = False
-    class FaceAnalysis:
-        def __init__(self, **kwargs):
-            pass
-        def prepare(self, **kwargs):
-            pass
-        def get(self, img):
-            return []
+
+# Hot-path instrumentation exported on /metrics
+FACE_STAGES = ("decode", "detect", "embed", "match")
+FACE_STAGE_SECONDS = REGISTRY.histogram(
+    "face_stage_seconds", "Face recognition stage latency in seconds", ["stage"])
+FACE_REQUESTS = REGISTRY.counter(
+    "face_requests_total", "Face operations by outcome", ["operation", "outcome"])
 
 class FacialRecognitionService:
     """Service class for handling facial recognition operations"""
     
     def __init__(self, database):
         self.db = database
-        self.face_app = None
         self.available = FACE_RECOGNITION_AVAILABLE
+        # insightface pack, swapped blue/green on reload
+        self.model_slot = ModelSlot(
+            "face-models", release=self._release_face_app,
+            load=self._load_face_app, validate=self._validate_face_app
+        )
+        self.reference_image_path = os.getenv("FACE_REFERENCE_IMAGE", "")
+        # eager: load in __init__ | background: warmup() after startup | lazy: on first request
+        self.load_mode = os.getenv("MODEL_LOAD_MODE", "background").strip().lower()
         self.threshold = 0.5  # Similarity threshold for recognition
+        # Tag stored with each embedding; embeddings from another model are not matched against
+        self.model_version = os.getenv("FACE_MODEL_VERSION", "buffalo_l")
+        # Registered embeddings kept in memory; loaded on the first recognition
+        self.gallery = FaceGallery(
+            self.db.get_face_encodings,
+            refresh_seconds=float(os.getenv("FACE_GALLERY_REFRESH_SECONDS", "300")),
+            ann_backend=os.getenv("FACE_ANN_INDEX", "auto"),
+            ann_min_size=int(os.getenv("FACE_ANN_MIN_SIZE", "20000")),
+            ann_path=os.getenv("FACE_ANN_PATH", "data/face_ann_index"),
+            ann_nprobe=int(os.getenv("FACE_ANN_NPROBE", "0")) or None,
+            model_version=self.model_version,
+            fetch_one=self.db.get_face_embedding,
+            cache_size=int(os.getenv("FACE_VERIFY_CACHE_SIZE", "1024")),
+            cache_ttl_seconds=float(os.getenv("FACE_VERIFY_CACHE_TTL_SECONDS", "300"))
+        )
+        self._stage_seconds = {stage: FACE_STAGE_SECONDS.labels(stage=stage) for stage in FACE_STAGES}
         
-        # Initialize face recognition
-        self._initialize_face_recognition()
+        # Initialize face recognition (otherwise on warmup() or the first request)
+        if self.load_mode == "eager":
+            self._initialize_face_recognition()
+        self.model_slot.unload_when_idle(float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0")))
+    
+    @property
+    def face_app(self):
+        return self.model_slot.current
+    
+    @face_app.setter
+    def face_app(self, face_app):
+        self.model_slot.swap(face_app)
     
     def _initialize_face_recognition(self):
         """Initialize the face recognition model"""
+        if FACE_RECOGNITION_AVAILABLE:
+            self.model_slot.reload(wait=True)
+        else:
+            print("Face recognition not available")
+    
+    def warmup(self):
+        """Load the models in the background unless the service loads them lazily"""
+        if FACE_RECOGNITION_AVAILABLE and self.load_mode == "background" and self.model_slot.state == "unloaded":
+            print("🔄 Warming up face recognition models in the background...")
+            self.model_slot.reload()
+    
+    def _load_face_app(self):
         try:
-            if FACE_RECOGNITION_AVAILABLE:
-                self.face_app = FaceAnalysis(allowed_modules=['detection', 'recognition'])
-                self.face_app.prepare(ctx_id=0, det_size=(640, 640))
-                print("Face recognition initialized successfully")
-            else:
-                self.face_app = None
-                print("Face recognition not available - using mock implementation")
+            from insightface.app import FaceAnalysis
         except Exception as e:
-            print(f"Warning: Face recognition initialization failed: {e}")
-            self.face_app = None
-            self.available = False
+            print(f"❌ Face recognition libraries failed to import: {type(e).__name__}: {e}")
+            raise
+        face_app = FaceAnalysis(allowed_modules=['detection', 'recognition'])
+        face_app.prepare(ctx_id=0, det_size=(640, 640))
+        print("Face recognition initialized successfully")
+        return face_app
+    
+    def _release_face_app(self, face_app):
+        # onnxruntime sessions are freed with the last reference to the pack
+        models = getattr(face_app, "models", None)
+        if models is not None:
+            models.clear()
+    
+    def _validate_face_app(self, face_app):
+        """Warm up a freshly loaded pack; with a reference image, require one face and an embedding"""
+        if not self.reference_image_path:
+            self._detect_faces(np.full((640, 640, 3), 127, np.uint8), face_app)
+            return
+        img = cv2.imread(self.reference_image_path)
+        if img is None:
+            raise Exception(f"Reference image not readable: {self.reference_image_path}")
+        img = self.resize_image(img)
+        faces = self._detect_faces(img, face_app)
+        if len(faces) != 1:
+            raise Exception(f"Expected one face in the reference image, found {len(faces)}")
+        embedding = self._embed_face(img, faces[0], face_app).embedding
+        if embedding is None or not np.isfinite(embedding).all() or norm(embedding) == 0:
+            raise Exception("Recognition model returned an invalid embedding")
+    
+    def reload_models(self, wait: bool = False) -> Dict[str, Any]:
+        """Load and validate a new insightface pack in the background, then swap it in
+        
+        Requests keep using the current pack until the swap and the old one
+        is released when the last of them finishes.
+        """
+        if not FACE_RECOGNITION_AVAILABLE:
+            return {"success": False, "message": "Face recognition libraries not available"}
+        started = self.model_slot.reload(wait=wait)
+        return {
+            "success": started,
+            "message": "Reload started" if started else "Reload already in progress",
+            "reload": self.model_slot.get_stats()
+        }
+    
+    def get_gallery_stats(self) -> Dict[str, Any]:
+        """Size, memory and age of the in-memory embedding gallery"""
+        return self.gallery.get_stats()
+    
+    def reload_gallery(self) -> Dict[str, Any]:
+        """Rebuild the gallery from the database"""
+        self.gallery.load()
+        return {"success": True, **self.gallery.get_stats()}
+    
+    def get_reload_status(self) -> Dict[str, Any]:
+        """Model generation, in-flight leases and the outcome of the last reload"""
+        return {"available": self.is_available(), **self.model_slot.get_stats()}
+    
+    def shutdown(self):
+        """Stop the idle monitor, release the models and persist the ANN index"""
+        self.model_slot.stop()
+        try:
+            self.gallery.save()
+        except Exception as e:
+            print(f"⚠️ Could not save face ANN index: {e}")
     
     def is_available(self) -> bool:
         """Check if face recognition service is available"""
-        return self.available and self.face_app is not None
+        if not self.available:
+            return False
+        if self.model_slot.state in ("unloaded", "loading"):
+            return True  # loaded on first use
+        return self.face_app is not None
     
     def resize_image(self, image: np.ndarray, max_size: int = 640) -> np.ndarray:
         """Resize image while maintaining aspect ratio"""
@@ -94,14 +189,44 @@ class FacialRecognitionService:
             if ',' in base64_string:
                 base64_string = base64_string.split(',')[1]
             
-            image_bytes = base64.b64decode(base64_string)
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+            with self._stage_seconds["decode"].time():
+                image_bytes = base64.b64decode(base64_string)
+                nparr = np.frombuffer(image_bytes, np.uint8)
+                img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
             return img
         except Exception as e:
             print(f"Error converting base64 to image: {e}")
             return None
     
+    def _detect_faces(self, img: np.ndarray, face_app=None) -> list:
+        """Detect faces (boxes, landmarks, scores) without running the recognition model
+        
+        Mirrors FaceAnalysis.get() but stops after detection, so embeddings
+        are only computed for the faces that need one.
+        """
+        face_app = face_app or self.face_app
+        with self._stage_seconds["detect"].time():
+            det_model = getattr(face_app, "det_model", None)
+            if det_model is None:
+                return list(face_app.get(img))
+            bboxes, kpss = det_model.detect(img, max_num=0, metric='default')
+        from insightface.app.common import Face
+        return [
+            Face(bbox=bboxes[i, 0:4], kps=kpss[i] if kpss is not None else None, det_score=bboxes[i, 4])
+            for i in range(bboxes.shape[0])
+        ]
+    
+    def _embed_face(self, img: np.ndarray, face, face_app=None):
+        """Run the recognition model on one detected face"""
+        if getattr(face, "embedding", None) is not None:
+            return face
+        face_app = face_app or self.face_app
+        with self._stage_seconds["embed"].time():
+            for taskname, model in face_app.models.items():
+                if taskname != 'detection':
+                    model.get(img, face)
+        return face
+    
     def extract_face_embedding(self, image: np.ndarray) -> Dict[str, Any]:
         """Extract face embedding from image"""
         if not self.is_available():
@@ -110,16 +235,21 @@ class FacialRecognitionService:
         # Resize image for processing
         img = self.resize_image(image)
         
-        # Detect faces
-        faces = self.face_app.get(img)
-        
-        if len(faces) == 0:
-            raise Exception("No face detected in image")
-        if len(faces) > 1:
-            raise Exception("Multiple faces detected, please upload single face image")
-        
-        # Extract face embedding
-        embedding = faces[0].embedding
+        # Detection and embedding use the same pack, even if a reload swaps it meanwhile
+        with self.model_slot.lease() as face_app:
+            if face_app is None:
+                raise Exception("Face recognition models failed to load")
+            
+            # Detect faces
+            faces = self._detect_faces(img, face_app)
+            
+            if len(faces) == 0:
+                raise Exception("No face detected in image")
+            if len(faces) > 1:
+                raise Exception("Multiple faces detected, please upload single face image")
+            
+            # Extract face embedding
+            embedding = self._embed_face(img, faces[0], face_app).embedding
         
         return {
             "embedding": embedding,
@@ -131,6 +261,7 @@ class FacialRecognitionService:
         """Register a new face for an appraiser"""
         try:
             if not self.is_available():
+                FACE_REQUESTS.labels(operation="register", outcome="unavailable").inc()
                 return {
                     "success": False,
                     "message": "Face registration service is currently unavailable. Please try again later or contact support.",
@@ -147,18 +278,18 @@ class FacialRecognitionService:
             face_data = self.extract_face_embedding(img)
             embedding = face_data["embedding"]
             
-            # Convert embedding to string for database storage
-            embedding_str = ",".join(map(str, embedding.tolist()))
-            
-            # Store in database
+            # Store in database as raw float32 bytes (2 KB for 512 dims)
             appraiser_db_id = self.db.insert_appraiser(
                 name=name,
                 appraiser_id=appraiser_id,
                 image_data=image,
                 timestamp=datetime.now().isoformat(),
-                face_encoding=embedding_str
+                face_embedding=encode_embedding(embedding),
+                face_model_version=self.model_version
             )
+            self.gallery.upsert(appraiser_id, embedding, name=name, db_id=appraiser_db_id)
             
+            FACE_REQUESTS.labels(operation="register", outcome="success").inc()
             return {
                 "success": True,
                 "message": f"Face registered successfully for {name}",
@@ -168,6 +299,7 @@ class FacialRecognitionService:
             }
         
         except Exception as e:
+            FACE_REQUESTS.labels(operation="register", outcome="error").inc()
             print(f"Face registration error: {e}")
             traceback.print_exc()
             raise Exception(f"Face registration failed: {str(e)}")
@@ -176,6 +308,7 @@ class FacialRecognitionService:
         """Recognize an appraiser from face image"""
         try:
             if not self.is_available():
+                FACE_REQUESTS.labels(operation="recognize", outcome="unavailable").inc()
                 return {
                     "recognized": False,
                     "message": "Face recognition service is currently unavailable. Please try again later or contact support.",
@@ -192,40 +325,34 @@ class FacialRecognitionService:
             face_data = self.extract_face_embedding(img)
             query_embedding = face_data["embedding"]
             
-            # Get all registered appraisers with face encodings
-            known_appraisers = self.db.get_all_appraisers_with_face_encoding()
+            # Match against the resident gallery of registered embeddings
+            self.gallery.ensure_loaded()
+            match_started = time.perf_counter()
+            matches = self.gallery.search(query_embedding, k=1)
+            self._stage_seconds["match"].observe(time.perf_counter() - match_started)
             
-            max_sim = -1
             recognized_appraiser = None
-            
-            for appraiser in known_appraisers:
-                if not appraiser['face_encoding']:
-                    continue
-                
-                try:
-                    known_embedding = np.array(list(map(float, appraiser['face_encoding'].split(","))))
-                    sim = self.cosine_similarity(known_embedding, query_embedding)
-                    
-                    if sim > max_sim and sim > self.threshold:
-                        max_sim = sim
-                        recognized_appraiser = {
-                            "name": appraiser['name'],
-                            "appraiser_id": appraiser['appraiser_id'],
-                            "similarity": float(sim),
-                            "db_id": appraiser['id'],
-                            "image_data": appraiser.get('image_data', '')
-                        }
-                except Exception as e:
-                    print(f"Error processing appraiser {appraiser['name']}: {e}")
-                    continue
+            if matches and matches[0][0] > self.threshold:
+                sim, appraiser = matches[0]
+                # Only the matched appraiser's photo is fetched
+                record = self.db.get_appraiser_by_id(appraiser["appraiser_id"]) or {}
+                recognized_appraiser = {
+                    "name": record.get("name", appraiser["name"]),
+                    "appraiser_id": appraiser["appraiser_id"],
+                    "similarity": sim,
+                    "db_id": record.get("id", appraiser["db_id"]),
+                    "image_data": record.get("image_data") or ""
+                }
             
             if recognized_appraiser:
+                FACE_REQUESTS.labels(operation="recognize", outcome="recognized").inc()
                 return {
                     "recognized": True,
                     "appraiser": recognized_appraiser,
                     "bbox": face_data["bbox"]
                 }
             else:
+                FACE_REQUESTS.labels(operation="recognize", outcome="no_match").inc()
                 return {
                     "recognized": False,
                     "message": "No matching appraiser found",
@@ -233,20 +360,84 @@ class FacialRecognitionService:
                 }
         
         except Exception as e:
+            FACE_REQUESTS.labels(operation="recognize", outcome="error").inc()
             print(f"Face recognition error: {e}")
             traceback.print_exc()
             raise Exception(f"Face recognition failed: {str(e)}")
     
+    def verify_face(self, appraiser_id: str, image: str) -> Dict[str, Any]:
+        """Check a face against one claimed appraiser (1:1), independent of gallery size"""
+        try:
+            if not self.is_available():
+                FACE_REQUESTS.labels(operation="verify", outcome="unavailable").inc()
+                return {
+                    "verified": False,
+                    "message": "Face recognition service is currently unavailable. Please try again later or contact support.",
+                    "service_status": "offline",
+                    "error": "InsightFace library not loaded"
+                }
+
+            enrolled = self.gallery.lookup(appraiser_id)
+            if enrolled is None:
+                FACE_REQUESTS.labels(operation="verify", outcome="not_registered").inc()
+                return {
+                    "verified": False,
+                    "registered": False,
+                    "message": f"No face registered for appraiser {appraiser_id}"
+                }
+            enrolled_embedding, appraiser = enrolled
+
+            img = self.base64_to_cv2_image(image)
+            if img is None:
+                raise Exception("Invalid image format")
+            face_data = self.extract_face_embedding(img)
+
+            match_started = time.perf_counter()
+            query = face_data["embedding"]
+            similarity = 0.0
+            if query.shape[0] == enrolled_embedding.shape[0]:
+                similarity = float(np.dot(enrolled_embedding, query) / (norm(query) or 1.0))
+            self._stage_seconds["match"].observe(time.perf_counter() - match_started)
+
+            verified = similarity > self.threshold
+            FACE_REQUESTS.labels(operation="verify", outcome="verified" if verified else "rejected").inc()
+            result = {
+                "verified": verified,
+                "registered": True,
+                "similarity": similarity,
+                "threshold": self.threshold,
+                "bbox": face_data["bbox"]
+            }
+            if verified:
+                record = self.db.get_appraiser_by_id(appraiser["appraiser_id"]) or {}
+                result["appraiser"] = {
+                    "name": record.get("name", appraiser["name"]),
+                    "appraiser_id": appraiser["appraiser_id"],
+                    "similarity": similarity,
+                    "db_id": record.get("id", appraiser["db_id"]),
+                    "image_data": record.get("image_data") or ""
+                }
+            else:
+                result["message"] = "Face does not match the registered appraiser"
+            return result
+
+        except Exception as e:
+            FACE_REQUESTS.labels(operation="verify", outcome="error").inc()
+            print(f"Face verification error: {e}")
+            traceback.print_exc()
+            raise Exception(f"Face verification failed: {str(e)}")
+
     def get_registered_appraisers(self) -> List[Dict[str, Any]]:
         """Get list of all registered appraisers"""
         try:
-            appraisers = self.db.get_all_appraisers_with_face_encoding()
+            appraisers = self.db.get_face_encodings()
             return [
                 {
                     "name": appraiser['name'],
                     "appraiser_id": appraiser['appraiser_id'],
                     "created_at": appraiser['created_at'].isoformat() if appraiser['created_at'] else None,
-                    "has_face_encoding": bool(appraiser.get('face_encoding'))
+                    "has_face_encoding": bool(appraiser.get('face_embedding') or appraiser.get('face_encoding')),
+                    "face_model_version": appraiser.get('face_model_version')
                 }
                 for appraiser in appraisers
             ]
@@ -282,8 +473,11 @@ class FacialRecognitionService:
             # Resize image for processing
             img = self.resize_image(img)
             
-            # Detect faces
-            faces = self.face_app.get(img)
+            # Detect faces (no embeddings needed for face info)
+            with self.model_slot.lease() as face_app:
+                if face_app is None:
+                    raise Exception("Face recognition models failed to load")
+                faces = self._detect_faces(img, face_app)
             
             face_info = []
             for i, face in enumerate(faces):
@@ -294,10 +488,10 @@ class FacialRecognitionService:
                     "landmark": face.kps.tolist() if hasattr(face, 'kps') else None
                 }
                 
-                # Add age and gender if available
-                if hasattr(face, 'age'):
+                # Add age and gender if available (insightface Face returns None for unset attributes)
+                if getattr(face, 'age', None) is not None:
                     info["age"] = int(face.age)
-                if hasattr(face, 'gender'):
+                if getattr(face, 'gender', None) is not None:
                     info["gender"] = int(face.gender)
                 
                 face_info.append(info)
@@ -315,8 +509,13 @@ class FacialRecognitionService:
     def delete_appraiser_face(self, appraiser_id: str) -> Dict[str, Any]:
         """Delete face encoding for an appraiser"""
         try:
-            # This would require a database method to clear face encoding
-            # For now, we'll just return a placeholder response
+            if not self.db.clear_face_encoding(appraiser_id):
+                return {
+                    "success": False,
+                    "message": f"Appraiser {appraiser_id} not found",
+                    "appraiser_id": appraiser_id
+                }
+            self.gallery.remove(appraiser_id)
             return {
                 "success": True,
                 "message": f"Face encoding deleted for appraiser {appraiser_id}",
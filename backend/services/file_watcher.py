@@ -0,0 +1,149 @@
+"""
+File Watcher for Gold Loan Appraisal System
+Polls configuration files for content changes on a background thread
+"""
+
+import os
+import time
+import hashlib
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class _Entry:
+    __slots__ = ("stat", "hash", "changes", "failures", "last_change", "last_error")
+
+    def __init__(self, stat: Tuple[int, int], digest: str):
+        self.stat = stat
+        self.hash = digest
+        self.changes = 0
+        self.failures = 0
+        self.last_change: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+
+class FileWatcher:
+    """Calls ``on_change(path)`` when a watched file's content changes
+
+    Every ``interval`` seconds each file gets one os.stat; only when its
+    mtime or size moved is it hashed, and the callback only runs if the
+    hash differs, so touches and identical rewrites are ignored. The
+    callback returns False when it could not apply the new content (e.g.
+    a half-written file); the previous state stays in effect and the file
+    is retried after its next modification.
+    """
+
+    def __init__(self, paths: Callable[[], Iterable[str]], on_change: Callable[[str], bool],
+                 interval: float = 2.0, name: str = "file-watcher"):
+        self.paths = paths
+        self.on_change = on_change
+        self.interval = interval
+        self.name = name
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @staticmethod
+    def _stat(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self.check()  # baseline, without callbacks
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"⚠️ {self.name} check failed: {e}")
+
+    def check(self) -> List[str]:
+        """One polling pass; returns the paths whose new content was applied"""
+        applied = []
+        paths = list(self.paths())
+        with self._lock:
+            for stale in set(self._entries) - set(paths):
+                del self._entries[stale]
+        for path in paths:
+            stat = self._stat(path)
+            if stat is None:
+                continue
+            with self._lock:
+                entry = self._entries.get(path)
+            if entry is not None and entry.stat == stat:
+                continue
+
+            try:
+                digest = file_hash(path)
+            except OSError:
+                continue
+            if entry is None:
+                with self._lock:
+                    self._entries[path] = _Entry(stat, digest)
+                continue
+
+            entry.stat = stat
+            if digest == entry.hash:
+                continue
+
+            ok = False
+            try:
+                ok = bool(self.on_change(path))
+                entry.last_error = None if ok else "change not applied"
+            except Exception as e:
+                entry.last_error = str(e)
+            if ok:
+                entry.hash = digest
+                entry.changes += 1
+                entry.last_change = time.time()
+                applied.append(path)
+            else:
+                entry.failures += 1
+        return applied
+
+    def forget(self, path: str):
+        """Drop a file's baseline so its current content is taken as-is"""
+        with self._lock:
+            self._entries.pop(path, None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = dict(self._entries)
+        return {
+            "running": self._thread is not None,
+            "interval_seconds": self.interval,
+            "files": {
+                path: {
+                    "sha256": entry.hash[:16],
+                    "changes": entry.changes,
+                    "failures": entry.failures,
+                    "last_change": entry.last_change,
+                    "last_error": entry.last_error,
+                }
+                for path, entry in entries.items()
+            },
+        }
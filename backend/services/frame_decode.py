@@ -0,0 +1,130 @@
+"""
+Frame Decode for Gold Loan Appraisal System
+Reduced-resolution JPEG decoding matched to the YOLO input size
+"""
+
+import cv2
+import numpy as np
+from typing import NamedTuple, Optional, Tuple
+
+# Optional libjpeg-turbo bindings (pip install PyTurboJPEG)
+try:
+    from turbojpeg import TurboJPEG
+    _turbo = TurboJPEG()
+    TURBOJPEG_AVAILABLE = True
+except Exception:
+    _turbo = None
+    TURBOJPEG_AVAILABLE = False
+
+REDUCED_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+# Start-of-frame markers (baseline, progressive, lossless, arithmetic)
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class JpegInfo(NamedTuple):
+    width: int
+    height: int
+    has_exif: bool
+
+
+class DecodedFrame(NamedTuple):
+    """A decoded frame and the factors mapping its pixels back to the original"""
+    image: np.ndarray
+    scale_x: float
+    scale_y: float
+    original_size: Tuple[int, int]  # (width, height)
+
+    @property
+    def reduced(self) -> bool:
+        return self.scale_x != 1.0 or self.scale_y != 1.0
+
+
+def parse_jpeg_info(data: bytes) -> Optional[JpegInfo]:
+    """Frame size from the JPEG SOF header, without decoding any pixels"""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+
+    has_exif = False
+    i, n = 2, len(data)
+    while i + 4 <= n:
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker == 0xFF:  # fill byte
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:  # standalone markers
+            i += 2
+            continue
+        if marker in (0xD9, 0xDA):  # end of image / start of scan before any SOF
+            return None
+
+        length = (data[i + 2] << 8) | data[i + 3]
+        if marker == 0xE1 and data[i + 4:i + 8] == b"Exif":
+            has_exif = True
+        if marker in SOF_MARKERS:
+            if i + 9 > n:
+                return None
+            height = (data[i + 5] << 8) | data[i + 6]
+            width = (data[i + 7] << 8) | data[i + 8]
+            return JpegInfo(width, height, has_exif) if width and height else None
+        i += 2 + length
+    return None
+
+
+def choose_reduction(width: int, height: int, target_size: int) -> int:
+    """Largest DCT scale (1, 2, 4, 8) that keeps the long side at or above the model input"""
+    long_side = max(width, height)
+    for factor in (8, 4, 2):
+        if long_side / factor >= target_size:
+            return factor
+    return 1
+
+
+def decode_full(data: bytes) -> Optional[np.ndarray]:
+    """Plain full-resolution decode"""
+    if not data:
+        return None
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+
+def decode_frame(data: bytes, target_size: int) -> Optional[DecodedFrame]:
+    """Decode a frame at the smallest resolution the model can use
+
+    JPEGs are decoded with DCT-domain scaling (libjpeg-turbo when available,
+    else OpenCV's IMREAD_REDUCED_COLOR_*); other formats decode in full.
+    """
+    if not data:
+        return None
+
+    info = parse_jpeg_info(data)
+    factor = choose_reduction(info.width, info.height, target_size) if info else 1
+
+    image = None
+    if factor > 1 and _turbo is not None and not info.has_exif:
+        # TurboJPEG ignores EXIF orientation, so only use it when there is none
+        try:
+            image = _turbo.decode(data, scaling_factor=(1, factor))
+        except Exception:
+            image = None
+    if image is None:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), REDUCED_FLAGS[factor])
+    if image is None:
+        return None
+
+    h, w = image.shape[:2]
+    if info is None or factor == 1:
+        return DecodedFrame(image, 1.0, 1.0, (w, h))
+
+    # OpenCV applies EXIF rotation, which swaps the SOF width and height
+    orig_w, orig_h = info.width, info.height
+    if (w > h) != (orig_w > orig_h) and w != h:
+        orig_w, orig_h = orig_h, orig_w
+    return DecodedFrame(image, orig_w / w, orig_h / h, (orig_w, orig_h))
@@ -0,0 +1,443 @@
+"""
+Inference Backends for Gold Loan Appraisal System
+Pluggable CPU runtimes (PyTorch, ONNX Runtime, OpenVINO) for the purity YOLO models
+"""
+
+import os
+import ast
+import hashlib
+import threading
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Type
+
+from services.box_ops import pairwise_iou
+
+# Ultralytics defaults used by model.predict
+DEFAULT_IMGSZ = 320
+DEFAULT_CONF = 0.25
+DEFAULT_IOU = 0.7
+DEFAULT_MAX_DET = 300
+PRECISIONS = ("auto", "fp32", "int8")
+MAX_WH = 7680  # per-class box offset used for class-aware NMS
+LETTERBOX_COLOR = (114, 114, 114)
+STRIDE = 32
+
+
+class Detections(NamedTuple):
+    """Detections for one frame, in that frame's pixel coordinates"""
+    boxes: np.ndarray        # (N, 4) float32 xyxy
+    class_ids: np.ndarray    # (N,) int64
+    confidences: np.ndarray  # (N,) float32
+
+    @classmethod
+    def empty(cls) -> "Detections":
+        return cls(np.zeros((0, 4), np.float32), np.zeros(0, np.int64), np.zeros(0, np.float32))
+
+    def __len__(self) -> int:
+        return len(self.class_ids)
+
+
+class InferenceBackend:
+    """One loaded detection model behind a common predict interface"""
+
+    name = "base"
+    requires: List[str] = []
+
+    def __init__(self, weights_path: str, imgsz: int = DEFAULT_IMGSZ, conf: float = DEFAULT_CONF,
+                 iou: float = DEFAULT_IOU, intra_op_threads: int = 0, inter_op_threads: int = 0,
+                 precision: str = "auto"):
+        if precision not in PRECISIONS:
+            raise ValueError(f"precision must be one of {PRECISIONS}")
+        self.weights_path = weights_path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.iou = iou
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.precision = precision
+        self.names: Dict[int, str] = {}
+
+    @classmethod
+    def is_supported(cls) -> bool:
+        """Whether the runtime's Python packages are importable"""
+        import importlib.util
+        return all(importlib.util.find_spec(module) is not None for module in cls.requires)
+
+    def predict_batch(self, frames: List[np.ndarray], conf: Optional[float] = None) -> List[Detections]:
+        raise NotImplementedError
+
+    def describe(self) -> Dict[str, Any]:
+        return {"backend": self.name, "weights": self.weights_path, "imgsz": self.imgsz, "precision": "fp32"}
+
+    def close(self):
+        """Release runtime resources"""
+        pass
+
+
+# ============================================================================
+# Registry
+# ============================================================================
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {}
+
+
+def register_backend(name: str) -> Callable[[Type[InferenceBackend]], Type[InferenceBackend]]:
+    """Class decorator adding a backend to the registry under ``name``"""
+    def decorator(cls):
+        cls.name = name
+        BACKENDS[name] = cls
+        return cls
+    return decorator
+
+
+def get_backend_class(name: str) -> Type[InferenceBackend]:
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown inference backend '{name}'. Available: {sorted(BACKENDS)}")
+
+
+def create_backend(name: str, weights_path: str, **options) -> InferenceBackend:
+    """Instantiate and load a registered backend"""
+    return get_backend_class(name)(weights_path, **options)
+
+
+def supported_backends() -> List[str]:
+    return [name for name, cls in BACKENDS.items() if cls.is_supported()]
+
+
+# ============================================================================
+# ONNX export cache
+# ============================================================================
+
+_export_lock = threading.Lock()
+
+
+def file_digest(path: str, length: int = 16) -> str:
+    """Short SHA-256 of a file, used to key exported artifacts to their weights"""
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()[:length]
+
+
+def exported_onnx_path(weights_path: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    """Cache location of the ONNX export: next to the weights, keyed by their hash"""
+    stem, _ = os.path.splitext(weights_path)
+    return f"{stem}.{file_digest(weights_path)}.imgsz{imgsz}.onnx"
+
+
+def quantized_onnx_path(weights_path: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    """Location of the static INT8 variant produced by utils/quantize_purity_models.py"""
+    return exported_onnx_path(weights_path, imgsz)[:-len(".onnx")] + ".int8.onnx"
+
+
+def resolve_onnx_artifact(weights_path: str, imgsz: int = DEFAULT_IMGSZ, precision: str = "auto") -> Tuple[str, str]:
+    """Pick the ONNX file to serve and its precision
+
+    ``auto`` prefers the INT8 model when one has been quantized for the
+    current weights, ``int8`` requires it, ``fp32`` always uses the export.
+    """
+    if weights_path.endswith(".onnx"):
+        return weights_path, "int8" if weights_path.endswith(".int8.onnx") else "fp32"
+
+    if precision != "fp32":
+        int8_path = quantized_onnx_path(weights_path, imgsz)
+        if os.path.exists(int8_path):
+            return int8_path, "int8"
+        if precision == "int8":
+            raise FileNotFoundError(f"No INT8 model for {weights_path}; run utils/quantize_purity_models.py first")
+    return export_onnx(weights_path, imgsz), "fp32"
+
+
+def export_onnx(weights_path: str, imgsz: int = DEFAULT_IMGSZ) -> str:
+    """Export .pt weights to ONNX once and return the cached artifact path"""
+    target = exported_onnx_path(weights_path, imgsz)
+    if os.path.exists(target):
+        return target
+
+    with _export_lock:
+        if os.path.exists(target):
+            return target
+
+        print(f"  Exporting {weights_path} to ONNX (imgsz={imgsz})...")
+        _register_torch_safe_globals()
+        from ultralytics import YOLO
+        exported = YOLO(weights_path).export(format="onnx", imgsz=imgsz, dynamic=True, simplify=False)
+        os.replace(str(exported), target)
+        print(f"  ✓ Cached ONNX export: {target}")
+    return target
+
+
+# ============================================================================
+# NumPy pre/post-processing (mirrors ultralytics LetterBox + NMS)
+# ============================================================================
+
+def letterbox(frame: np.ndarray, shape, auto: bool) -> np.ndarray:
+    """Resize with unchanged aspect ratio and pad to ``shape`` (h, w)"""
+    h0, w0 = frame.shape[:2]
+    r = min(shape[0] / h0, shape[1] / w0)
+    new_unpad = int(round(w0 * r)), int(round(h0 * r))
+    dw, dh = shape[1] - new_unpad[0], shape[0] - new_unpad[1]
+    if auto:
+        dw, dh = np.mod(dw, STRIDE), np.mod(dh, STRIDE)
+    dw /= 2
+    dh /= 2
+
+    if (w0, h0) != new_unpad:
+        frame = cv2.resize(frame, new_unpad, interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(dh - 0.1)), int(round(dh + 0.1))
+    left, right = int(round(dw - 0.1)), int(round(dw + 0.1))
+    return cv2.copyMakeBorder(frame, top, bottom, left, right, cv2.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+
+
+def preprocess(frames: List[np.ndarray], imgsz: int) -> np.ndarray:
+    """Letterbox a batch of BGR frames into an NCHW float32 RGB tensor
+
+    Frames of identical shape get the minimal stride-aligned padding, like
+    ultralytics' rectangular inference; mixed shapes are padded square.
+    """
+    auto = all(f.shape == frames[0].shape for f in frames)
+    boxed = [letterbox(f, (imgsz, imgsz), auto) for f in frames]
+    batch = np.stack(boxed)[..., ::-1].transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch, dtype=np.float32) / 255.0
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float) -> np.ndarray:
+    """Greedy non-maximum suppression, returns kept indices in score order"""
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size:
+        i = order[0]
+        keep.append(i)
+        if order.size == 1:
+            break
+        ious = pairwise_iou(boxes[i:i + 1], boxes[order[1:]])[0]
+        order = order[1:][ious <= iou_threshold]
+    return np.asarray(keep, dtype=np.intp)
+
+
+def postprocess(output: np.ndarray, input_shape, frames: List[np.ndarray], conf: float,
+                iou: float = DEFAULT_IOU, max_det: int = DEFAULT_MAX_DET) -> List[Detections]:
+    """Decode raw YOLOv8 head output (B, 4 + nc, anchors) into per-frame detections"""
+    results = []
+    for k, frame in enumerate(frames):
+        pred = output[k].T  # (anchors, 4 + nc)
+        class_scores = pred[:, 4:]
+        class_ids = class_scores.argmax(axis=1)
+        scores = class_scores[np.arange(len(class_ids)), class_ids]
+
+        mask = scores > conf
+        if not mask.any():
+            results.append(Detections.empty())
+            continue
+        xywh, scores, class_ids = pred[mask, :4], scores[mask], class_ids[mask]
+
+        boxes = np.empty_like(xywh)
+        boxes[:, 0] = xywh[:, 0] - xywh[:, 2] / 2
+        boxes[:, 1] = xywh[:, 1] - xywh[:, 3] / 2
+        boxes[:, 2] = xywh[:, 0] + xywh[:, 2] / 2
+        boxes[:, 3] = xywh[:, 1] + xywh[:, 3] / 2
+
+        keep = nms(boxes + (class_ids * MAX_WH)[:, None], scores, iou)[:max_det]
+        boxes, scores, class_ids = boxes[keep], scores[keep], class_ids[keep]
+
+        # Undo letterbox: remove padding, rescale, clip to the original frame
+        h0, w0 = frame.shape[:2]
+        gain = min(input_shape[0] / h0, input_shape[1] / w0)
+        pad_x = round((input_shape[1] - w0 * gain) / 2 - 0.1)
+        pad_y = round((input_shape[0] - h0 * gain) / 2 - 0.1)
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - pad_x) / gain
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - pad_y) / gain
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w0)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h0)
+
+        results.append(Detections(boxes.astype(np.float32), class_ids.astype(np.int64), scores.astype(np.float32)))
+    return results
+
+
+def parse_names(value) -> Dict[int, str]:
+    """Class names from ultralytics ONNX metadata (a dict literal string)"""
+    if isinstance(value, dict):
+        return {int(k): str(v) for k, v in value.items()}
+    try:
+        return {int(k): str(v) for k, v in ast.literal_eval(value).items()}
+    except (ValueError, SyntaxError, AttributeError):
+        return {}
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+_safe_globals_registered = False
+
+
+def _register_torch_safe_globals():
+    """Allow YOLO checkpoints to unpickle on PyTorch versions defaulting to weights_only=True"""
+    global _safe_globals_registered
+    if _safe_globals_registered:
+        return
+    _safe_globals_registered = True
+
+    import torch
+    if not hasattr(torch.serialization, 'add_safe_globals'):
+        return
+
+    try:
+        import collections
+        import ultralytics.nn.tasks
+        import ultralytics.nn.modules.conv
+        import ultralytics.nn.modules.block
+        import ultralytics.nn.modules.head
+
+        # Common classes found in YOLOv8 models
+        safe_classes = [
+            ultralytics.nn.tasks.DetectionModel,
+            ultralytics.nn.modules.conv.Conv,
+            ultralytics.nn.modules.conv.Concat,
+            ultralytics.nn.modules.block.C2f,
+            ultralytics.nn.modules.block.Bottleneck,
+            ultralytics.nn.modules.block.DFL,
+            ultralytics.nn.modules.block.SPPF,
+            ultralytics.nn.modules.head.Detect,
+            torch.nn.Sequential,
+            torch.nn.ModuleList,
+            torch.nn.Conv2d,
+            torch.nn.BatchNorm2d,
+            torch.nn.SiLU,
+            torch.nn.MaxPool2d,
+            torch.nn.Upsample,
+            torch.nn.Identity,
+            torch.Size,
+            torch.device,
+            collections.OrderedDict,
+        ]
+
+        # Add storage types if available
+        for storage in ['FloatStorage', 'LongStorage', 'IntStorage', 'DoubleStorage', 'HalfStorage',
+                        'ByteStorage', 'CharStorage', 'ShortStorage', 'BoolStorage', 'UntypedStorage']:
+            if hasattr(torch, storage):
+                safe_classes.append(getattr(torch, storage))
+
+        torch.serialization.add_safe_globals(safe_classes)
+        print("✓ Added YOLO/Torch classes to safe globals")
+    except Exception as e:
+        print(f"⚠️ Failed to add safe globals: {e}")
+
+
+@register_backend("torch")
+class TorchBackend(InferenceBackend):
+    """Ultralytics YOLO on PyTorch (reference implementation)"""
+
+    requires = ["torch", "ultralytics"]
+
+    def __init__(self, weights_path: str, **options):
+        super().__init__(weights_path, **options)
+        import torch
+        _register_torch_safe_globals()
+        from ultralytics import YOLO
+
+        if self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+        self.model = YOLO(weights_path)
+        self.names = dict(self.model.model.names)
+
+    def predict_batch(self, frames: List[np.ndarray], conf: Optional[float] = None) -> List[Detections]:
+        results = self.model.predict(
+            frames, imgsz=self.imgsz, conf=self.conf if conf is None else conf,
+            iou=self.iou, verbose=False, half=False, device='cpu'
+        )
+        return [
+            Detections(
+                r.boxes.xyxy.cpu().numpy().astype(np.float32),
+                r.boxes.cls.cpu().numpy().astype(np.int64),
+                r.boxes.conf.cpu().numpy().astype(np.float32),
+            )
+            for r in results
+        ]
+
+    def close(self):
+        self.model = None
+
+
+class ExportedModelBackend(InferenceBackend):
+    """Shared letterbox/NMS pipeline for runtimes that execute the ONNX export"""
+
+    def __init__(self, weights_path: str, **options):
+        super().__init__(weights_path, **options)
+        self.onnx_path, self.loaded_precision = resolve_onnx_artifact(weights_path, self.imgsz, self.precision)
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_batch(self, frames: List[np.ndarray], conf: Optional[float] = None) -> List[Detections]:
+        if not frames:
+            return []
+        batch = preprocess(frames, self.imgsz)
+        output = self._run(batch)
+        return postprocess(output, batch.shape[2:], frames, self.conf if conf is None else conf, self.iou)
+
+    def describe(self) -> Dict[str, Any]:
+        return {**super().describe(), "artifact": self.onnx_path, "precision": self.loaded_precision}
+
+
+@register_backend("onnx")
+class OnnxRuntimeBackend(ExportedModelBackend):
+    """ONNX Runtime CPU session over the cached ONNX export"""
+
+    requires = ["onnxruntime"]
+
+    def __init__(self, weights_path: str, **options):
+        super().__init__(weights_path, **options)
+        import onnxruntime as ort
+
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        if self.intra_op_threads:
+            sess_options.intra_op_num_threads = self.intra_op_threads
+        if self.inter_op_threads:
+            sess_options.inter_op_num_threads = self.inter_op_threads
+
+        self.session = ort.InferenceSession(self.onnx_path, sess_options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.names = parse_names(self.session.get_modelmeta().custom_metadata_map.get("names", "{}"))
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def close(self):
+        self.session = None
+
+
+@register_backend("openvino")
+class OpenVINOBackend(ExportedModelBackend):
+    """OpenVINO CPU plugin compiled from the cached ONNX export"""
+
+    requires = ["openvino", "onnx"]
+
+    def __init__(self, weights_path: str, **options):
+        super().__init__(weights_path, **options)
+        import onnx
+        from openvino.runtime import Core
+
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if self.intra_op_threads:
+            config["INFERENCE_NUM_THREADS"] = str(self.intra_op_threads)
+        if self.inter_op_threads:
+            config["NUM_STREAMS"] = str(self.inter_op_threads)
+
+        core = Core()
+        self.compiled = core.compile_model(core.read_model(self.onnx_path), "CPU", config)
+        self.output = self.compiled.output(0)
+        metadata = {p.key: p.value for p in onnx.load(self.onnx_path, load_external_data=False).metadata_props}
+        self.names = parse_names(metadata.get("names", "{}"))
+
+    def _run(self, batch: np.ndarray) -> np.ndarray:
+        return self.compiled([batch])[self.output]
+
+    def close(self):
+        self.compiled = None
@@ -0,0 +1,196 @@
+"""
+Inference Scheduler for Gold Loan Appraisal System
+Collects single-frame predict calls from concurrent requests into micro-batches
+"""
+
+import time
+import queue
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+
+class _PendingFrame:
+    """A frame waiting for its slot in the next batch"""
+
+    __slots__ = ("frame", "result", "error", "done")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceScheduler:
+    """Dynamic micro-batcher in front of a single model
+
+    Callers block in ``predict`` while a worker thread gathers frames for up to
+    ``max_wait_ms`` (or until ``max_batch_size`` frames are queued), runs one
+    batched forward pass and hands every caller its own result. A caller
+    gives up after ``timeout_s`` or as soon as the scheduler is stopped.
+    """
+
+    def __init__(self, name: str, predict_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 5.0, timeout_s: float = 30.0,
+                 history_size: int = 256):
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_ms = max(0.0, float(max_wait_ms))
+        self.timeout_s = max(0.1, float(timeout_s))
+        self._predict_batch = predict_batch
+
+        self._queue: "queue.Queue[_PendingFrame]" = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        # Stats
+        self._stats_lock = threading.Lock()
+        self._history = deque(maxlen=history_size)
+        self._total_batches = 0
+        self._total_frames = 0
+        self._total_errors = 0
+
+    @property
+    def batching_enabled(self) -> bool:
+        return self.max_batch_size > 1
+
+    def predict(self, frame) -> Any:
+        """Run the model on one frame, sharing a forward pass with concurrent callers"""
+        if not self.batching_enabled:
+            return self._execute([_PendingFrame(frame)], inline=True)
+
+        pending = _PendingFrame(frame)
+        self._ensure_worker()
+        self._queue.put(pending)
+
+        deadline = time.monotonic() + self.timeout_s
+        while not pending.done.wait(timeout=0.5):
+            if self._stop_event.is_set() and not self._worker_alive():
+                # Queued after stop() drained the queue: nothing will run it
+                raise RuntimeError(f"{self.name}: scheduler stopped before the frame was run")
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"{self.name}: no result within {self.timeout_s:g}s")
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _worker_alive(self) -> bool:
+        worker = self._worker
+        return worker is not None and worker.is_alive()
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop_event.clear()
+                self._worker = threading.Thread(
+                    target=self._run, name=f"inference-scheduler-{self.name}", daemon=True
+                )
+                self._worker.start()
+
+    def _run(self):
+        """Worker loop: wait for a first frame, then fill the batch until full or timed out"""
+        while not self._stop_event.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.perf_counter() + self.max_wait_ms / 1000.0
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            self._execute(batch)
+
+    def _execute(self, batch: List[_PendingFrame], inline: bool = False) -> Any:
+        """Run one batched predict and distribute results to the waiting callers"""
+        start = time.perf_counter()
+        try:
+            results = self._predict_batch([p.frame for p in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(
+                    f"{self.name}: batch of {len(batch)} frames returned {len(results)} results"
+                )
+            for pending, result in zip(batch, results):
+                pending.result = result
+        except Exception as e:
+            with self._stats_lock:
+                self._total_errors += 1
+            if inline:
+                raise
+            for pending in batch:
+                pending.error = e
+        finally:
+            latency_ms = (time.perf_counter() - start) * 1000.0
+            self._record_batch(len(batch), latency_ms)
+            if not inline:
+                for pending in batch:
+                    pending.done.set()
+
+        return batch[0].result if inline else None
+
+    def _record_batch(self, size: int, latency_ms: float):
+        with self._stats_lock:
+            self._history.append((size, latency_ms))
+            self._total_batches += 1
+            self._total_frames += size
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Batch size and latency figures over the recent history window"""
+        with self._stats_lock:
+            history = list(self._history)
+            total_batches = self._total_batches
+            total_frames = self._total_frames
+            total_errors = self._total_errors
+
+        sizes = [s for s, _ in history]
+        latencies = sorted(l for _, l in history)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+
+        return {
+            "name": self.name,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms,
+            "total_batches": total_batches,
+            "total_frames": total_frames,
+            "total_errors": total_errors,
+            "queue_depth": self._queue.qsize(),
+            "avg_batch_size": round(sum(sizes) / len(sizes), 2) if sizes else None,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 2) if latencies else None,
+            "p50_latency_ms": percentile(0.50),
+            "p95_latency_ms": percentile(0.95),
+            "recent_batches": [
+                {"size": s, "latency_ms": round(l, 2)} for s, l in history[-20:]
+            ],
+        }
+
+    def stop(self):
+        """Stop the worker thread and fail the frames still queued"""
+        self._stop_event.set()
+        if self._worker is not None:
+            self._worker.join(timeout=2)
+        self._worker = None
+
+        error = RuntimeError(f"{self.name}: scheduler stopped before the frame was run")
+        while True:
+            try:
+                pending = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.error = error
+            pending.done.set()
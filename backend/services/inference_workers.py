@@ -0,0 +1,523 @@
+"""
+Inference Workers for Gold Loan Appraisal System
+Process pool hosting the purity YOLO models, fed through a shared-memory frame ring
+"""
+
+import os
+import sys
+import time
+import queue
+import itertools
+import threading
+import multiprocessing as mp
+import multiprocessing.connection
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from services.inference_backends import Detections, create_backend
+
+DEFAULT_SLOT_BYTES = 1920 * 1080 * 3
+
+
+# ============================================================================
+# CPU affinity
+# ============================================================================
+
+def _parse_cpu_list(spec: str) -> List[int]:
+    """'0-3,6' -> [0, 1, 2, 3, 6]"""
+    cores = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-", 1)
+            cores.extend(range(int(start), int(end) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+def parse_affinity(spec: Optional[str], processes: int, cpu_count: int) -> List[Optional[List[int]]]:
+    """Cores for each worker
+
+    - "none": no pinning
+    - "auto": split the machine's cores evenly between workers
+    - "0-3;4-7": explicit core list per worker (reused round-robin)
+    """
+    spec = (spec or "none").strip().lower()
+    if spec in ("", "none", "off"):
+        return [None] * processes
+    if spec == "auto":
+        per_worker = max(1, cpu_count // processes)
+        return [[(i * per_worker + k) % cpu_count for k in range(per_worker)] for i in range(processes)]
+    groups = [g for g in spec.split(";") if g.strip()]
+    return [_parse_cpu_list(groups[i % len(groups)]) for i in range(processes)]
+
+
+def _set_affinity(cores: Optional[List[int]]):
+    if not cores:
+        return
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+        else:
+            import psutil
+            psutil.Process().cpu_affinity(cores)
+    except Exception as e:
+        print(f"⚠️ Could not set CPU affinity {cores}: {e}")
+
+
+# ============================================================================
+# Worker process
+# ============================================================================
+
+def _worker_main(worker_id: int, backend_name: str, model_paths: Dict[str, str], options: Dict[str, Any],
+                 cores: Optional[List[int]], shm_name: str, slot_bytes: int, conn, max_batch_size: int):
+    """Load the models once, then serve batches of frame slots until a None sentinel"""
+    _set_affinity(cores)
+    if cores and not options.get("intra_op_threads"):
+        options = {**options, "intra_op_threads": len(cores)}
+
+    models, names, info, errors = {}, {}, {}, {}
+    for key, path in model_paths.items():
+        try:
+            models[key] = create_backend(backend_name, path, **options)
+            names[key] = models[key].names
+            info[key] = models[key].describe()
+        except Exception as e:
+            errors[key] = str(e)
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    conn.send(("ready", os.getpid(), names, info, errors))
+
+    stopping = False
+    try:
+        while not stopping:
+            task = conn.recv()
+            if task is None:
+                break
+
+            # Drain whatever else is queued so concurrent frames share a forward pass
+            batch = [task]
+            while len(batch) < max_batch_size and conn.poll(0):
+                task = conn.recv()
+                if task is None:
+                    stopping = True
+                    break
+                batch.append(task)
+
+            groups: Dict[Any, list] = {}
+            for task in batch:
+                groups.setdefault((task[1], task[2]), []).append(task)
+
+            for (key, conf), group in groups.items():
+                frames = []
+                try:
+                    model = models.get(key)
+                    if model is None:
+                        raise RuntimeError(errors.get(key, f"{key} not loaded"))
+                    for task_id, _, _, slot, shape, inline in group:
+                        if slot is None:
+                            frames.append(inline)
+                        else:
+                            frames.append(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes))
+                    detections = model.predict_batch(frames, conf=conf)
+                    conn.send(("results", [(task[0], tuple(det), None) for task, det in zip(group, detections)]))
+                except Exception as e:
+                    conn.send(("results", [(task[0], None, str(e)) for task in group]))
+                finally:
+                    del frames
+    except (EOFError, OSError):
+        pass  # parent went away
+    finally:
+        for model in models.values():
+            model.close()
+        try:
+            shm.close()
+        except BufferError:
+            pass
+
+
+@contextmanager
+def _without_main_reimport():
+    """Stop spawned children from re-running the parent's __main__ module
+
+    With ``python main.py`` the spawn start method would otherwise import
+    main.py in every worker, initializing the whole app (and another
+    worker pool) there. The worker target lives in this module, so
+    children do not need __main__ at all.
+    """
+    main = sys.modules.get("__main__")
+    if main is None:
+        yield
+        return
+
+    saved = {attr: main.__dict__[attr] for attr in ("__file__", "__spec__") if attr in main.__dict__}
+    main.__dict__.pop("__file__", None)
+    main.__spec__ = None
+    try:
+        yield
+    finally:
+        main.__dict__.pop("__spec__", None)
+        main.__dict__.update(saved)
+
+
+# ============================================================================
+# Pool
+# ============================================================================
+
+class WorkerModel:
+    """InferenceBackend-compatible handle for a model hosted by the worker pool"""
+
+    def __init__(self, pool: "InferenceWorkerPool", key: str):
+        self.pool = pool
+        self.key = key
+        self.names = pool.names.get(key, {})
+
+    def predict_batch(self, frames: List[np.ndarray], conf: Optional[float] = None) -> List[Detections]:
+        futures = [self.pool.submit(self.key, frame, conf) for frame in frames]
+        return [self.pool.wait(future) for future in futures]
+
+    def describe(self) -> Dict[str, Any]:
+        return {**self.pool.backend_info.get(self.key, {}), "workers": self.pool.processes}
+
+    def close(self):
+        pass
+
+
+class _Worker:
+    """Parent-side handle: process, its pipe and the requests it holds"""
+
+    def __init__(self, worker_id: int, proc, conn):
+        self.worker_id = worker_id
+        self.proc = proc
+        self.conn = conn
+        self.send_lock = threading.Lock()
+        self.in_flight = set()
+        self.ready = False
+        self.pid = None
+        self.models: List[str] = []
+
+
+class InferenceWorkerPool:
+    """Inference worker processes sharing a ring of preallocated frame slots
+
+    Frames are copied once into a shared-memory slot and only the slot
+    index travels over the worker's pipe; detections come back as small
+    tuples. Frames larger than a slot, or submitted when no slot frees up
+    within the timeout, are pickled with the task. Each worker has its
+    own pipe, so a crashed worker fails only its own in-flight requests
+    and is respawned without disturbing the others.
+    """
+
+    def __init__(self, backend_name: str, model_paths: Dict[str, str], backend_options: Dict[str, Any],
+                 processes: int = 2, affinity: str = "none", slots_per_worker: int = 4,
+                 slot_bytes: int = DEFAULT_SLOT_BYTES, max_batch_size: int = 8,
+                 timeout: float = 30.0, start_timeout: float = 300.0):
+        self.backend_name = backend_name
+        self.model_paths = dict(model_paths)
+        self.backend_options = dict(backend_options)
+        self.processes = max(1, processes)
+        self.affinity = parse_affinity(affinity, self.processes, os.cpu_count() or 1)
+        self.slot_count = self.processes * max(1, slots_per_worker)
+        self.slot_bytes = slot_bytes
+        self.max_batch_size = max(1, max_batch_size)
+        self.timeout = timeout
+        self.start_timeout = start_timeout
+
+        self.names: Dict[str, Dict[int, str]] = {}
+        self.errors: Dict[str, str] = {}
+        self.backend_info: Dict[str, Dict[str, Any]] = {}
+
+        self._ctx = mp.get_context("spawn")
+        self._shm = None
+        self._workers: Dict[int, _Worker] = {}
+        self._ready_cond = threading.Condition()
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        self._pending: Dict[int, tuple] = {}
+        # Timed-out requests whose worker may still be reading the frame: task id -> (slot, worker)
+        self._abandoned: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._collector = None
+        self._stopping = threading.Event()
+
+        self._completed = 0
+        self._failed = 0
+        self._timed_out = 0
+        self._inline = 0
+        self._restarts = 0
+        self._latencies = deque(maxlen=256)
+
+    # ---- lifecycle ----
+
+    def start(self):
+        """Spawn the workers and wait until each has loaded its models"""
+        self._shm = shared_memory.SharedMemory(create=True, size=self.slot_count * self.slot_bytes)
+        for slot in range(self.slot_count):
+            self._free_slots.put(slot)
+
+        for worker_id in range(self.processes):
+            self._spawn(worker_id)
+
+        self._collector = threading.Thread(target=self._collect, name="purity-worker-results", daemon=True)
+        self._collector.start()
+
+        deadline = time.monotonic() + self.start_timeout
+        with self._ready_cond:
+            while not all(w.ready for w in self._workers.values()):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not any(w.proc.is_alive() for w in self._workers.values()):
+                    break
+                self._ready_cond.wait(timeout=min(remaining, 1.0))
+
+        ready = sum(w.ready for w in self._workers.values())
+        print(f"✓ Inference worker pool: {ready}/{self.processes} workers ready, "
+              f"{self.slot_count} x {self.slot_bytes // 1024} KB frame slots")
+        if self.errors:
+            print(f"  ⚠️ Worker model errors: {self.errors}")
+
+    def _spawn(self, worker_id: int):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.backend_name, self.model_paths, self.backend_options, self.affinity[worker_id],
+                  self._shm.name, self.slot_bytes, child_conn, self.max_batch_size),
+            name=f"purity-worker-{worker_id}",
+            daemon=True,
+        )
+        with _without_main_reimport():
+            proc.start()
+        child_conn.close()  # so the parent sees EOF when the worker dies
+        with self._ready_cond:
+            self._workers[worker_id] = _Worker(worker_id, proc, parent_conn)
+
+    def stop(self):
+        """Stop the workers, fail pending requests and release the shared memory"""
+        if self._shm is None:
+            return
+        self._stopping.set()
+        for worker in list(self._workers.values()):
+            try:
+                with worker.send_lock:
+                    worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for worker in list(self._workers.values()):
+            worker.proc.join(timeout=5)
+            if worker.proc.is_alive():
+                worker.proc.terminate()
+        if self._collector:
+            self._collector.join(timeout=2)
+        for worker in self._workers.values():
+            worker.conn.close()
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._abandoned = {}
+        for future, _, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(RuntimeError("Inference worker pool stopped"))
+
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        print("✓ Inference worker pool stopped")
+
+    # ---- requests ----
+
+    def loaded_models(self) -> List[str]:
+        return [key for key in self.model_paths if key in self.names]
+
+    def model(self, key: str) -> WorkerModel:
+        return WorkerModel(self, key)
+
+    def submit(self, key: str, frame: np.ndarray, conf: Optional[float] = None) -> Future:
+        """Queue one frame for a model on the least busy worker; resolves to Detections"""
+        if self._shm is None:
+            raise RuntimeError("Inference worker pool not started")
+
+        frame = np.ascontiguousarray(frame)
+        slot = None
+        if frame.dtype == np.uint8 and frame.nbytes <= self.slot_bytes:
+            try:
+                slot = self._free_slots.get(timeout=self.timeout)
+            except queue.Empty:
+                slot = None
+        if slot is not None:
+            view = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf, offset=slot * self.slot_bytes)
+            view[...] = frame
+            del view
+
+        task_id = next(self._ids)
+        future = Future()
+        future.task_id = task_id
+        with self._lock:
+            candidates = [w for w in self._workers.values() if w.ready and w.proc.is_alive()]
+            if not candidates:
+                if slot is not None:
+                    self._free_slots.put(slot)
+                raise RuntimeError("No inference workers ready")
+            worker = min(candidates, key=lambda w: len(w.in_flight))
+            worker.in_flight.add(task_id)
+            self._pending[task_id] = (future, slot, time.perf_counter(), worker)
+            if slot is None:
+                self._inline += 1
+
+        try:
+            with worker.send_lock:
+                worker.conn.send((task_id, key, conf, slot, frame.shape, None if slot is not None else frame))
+        except (OSError, ValueError) as e:
+            self._fail(task_id, RuntimeError(f"Inference worker unavailable: {e}"))
+        return future
+
+    def wait(self, future: Future) -> Detections:
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            # The worker may still be reading the frame: keep its slot until it answers or dies
+            if self._finish(future.task_id, release=False) is not None:
+                with self._lock:
+                    self._timed_out += 1
+            raise TimeoutError(f"Inference worker did not answer within {self.timeout}s")
+
+    def predict(self, key: str, frame: np.ndarray, conf: Optional[float] = None) -> Detections:
+        return self.wait(self.submit(key, frame, conf))
+
+    def _finish(self, task_id: int, release: bool = True):
+        """Drop a pending request and free its slot (exactly once)
+
+        With ``release=False`` the request stays in its worker's in-flight
+        set and its slot stays reserved until ``_release_abandoned``.
+        """
+        with self._lock:
+            entry = self._pending.pop(task_id, None)
+            if entry is not None:
+                if release:
+                    entry[3].in_flight.discard(task_id)
+                else:
+                    self._abandoned[task_id] = (entry[1], entry[3])
+        if release and entry is not None and entry[1] is not None:
+            self._free_slots.put(entry[1])
+        return entry
+
+    def _release_abandoned(self, task_id: int):
+        """Free the slot of a timed-out request once its worker answered or exited"""
+        with self._lock:
+            entry = self._abandoned.pop(task_id, None)
+            if entry is not None:
+                entry[1].in_flight.discard(task_id)
+        if entry is not None and entry[0] is not None:
+            self._free_slots.put(entry[0])
+
+    def _fail(self, task_id: int, error: Exception):
+        entry = self._finish(task_id)
+        if entry is not None:
+            with self._lock:
+                self._failed += 1
+            entry[0].set_exception(error)
+
+    def _collect(self):
+        while not self._stopping.is_set():
+            with self._ready_cond:
+                by_conn = {w.conn: w for w in self._workers.values()}
+            try:
+                readable = mp.connection.wait(list(by_conn), timeout=1.0)
+            except OSError:
+                readable = []
+
+            for conn in readable:
+                worker = by_conn[conn]
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    self._worker_exited(worker)
+                    continue
+                self._handle(worker, message)
+
+            for worker in list(by_conn.values()):
+                if not worker.proc.is_alive() and worker.conn not in readable:
+                    self._worker_exited(worker)
+
+    def _handle(self, worker: _Worker, message):
+        if message[0] == "ready":
+            _, pid, names, info, errors = message
+            with self._ready_cond:
+                worker.pid = pid
+                worker.models = sorted(names)
+                worker.ready = True
+                self.names.update(names)
+                self.backend_info.update(info)
+                self.errors.update(errors)
+                self._ready_cond.notify_all()
+            return
+
+        for task_id, detections, error in message[1]:
+            entry = self._finish(task_id)
+            if entry is None:
+                self._release_abandoned(task_id)  # timed out; the worker is done with the slot now
+                continue
+            future, _, started, _ = entry
+            with self._lock:
+                self._latencies.append(time.perf_counter() - started)
+                if error is None:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+            if error is None:
+                future.set_result(Detections(*detections))
+            else:
+                future.set_exception(RuntimeError(error))
+
+    def _worker_exited(self, worker: _Worker):
+        """Fail the dead worker's requests and respawn it"""
+        with self._ready_cond:
+            if self._workers.get(worker.worker_id) is not worker:
+                return  # already handled
+            worker.ready = False
+        for task_id in list(worker.in_flight):
+            self._fail(task_id, RuntimeError(f"Inference worker {worker.worker_id} exited"))
+            self._release_abandoned(task_id)
+        worker.conn.close()
+        if self._stopping.is_set():
+            return
+
+        worker.proc.join(timeout=1)
+        print(f"⚠️ Inference worker {worker.worker_id} exited (code {worker.proc.exitcode}), restarting")
+        self._restarts += 1
+        self._spawn(worker.worker_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+            workers = list(self._workers.values())
+            stats = {
+                "processes": self.processes,
+                "ready_workers": sum(w.ready for w in workers),
+                "workers": [
+                    {
+                        "id": w.worker_id, "pid": w.pid, "models": w.models, "alive": w.proc.is_alive(),
+                        "in_flight": len(w.in_flight), "cpus": self.affinity[w.worker_id],
+                    }
+                    for w in sorted(workers, key=lambda w: w.worker_id)
+                ],
+                "slots": self.slot_count,
+                "free_slots": self._free_slots.qsize(),
+                "in_flight": len(self._pending),
+                "abandoned": len(self._abandoned),
+                "completed": self._completed,
+                "failed": self._failed,
+                "timed_out": self._timed_out,
+                "inline_frames": self._inline,
+                "restarts": self._restarts,
+            }
+        if latencies:
+            stats["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 2)
+            stats["p95_ms"] = round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2)
+        return stats
@@ -0,0 +1,243 @@
+"""
+Model Slot for Gold Loan Appraisal System
+Blue/green model reloads: load and validate in the background, swap one reference, drain the old set.
+Models can also be loaded lazily on first use and unloaded again after an idle period.
+"""
+
+import time
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+
+class _Generation:
+    __slots__ = ("number", "value", "leases", "retired", "loaded_at")
+
+    def __init__(self, number: int, value: Any):
+        self.number = number
+        self.value = value
+        self.leases = 0
+        self.retired = False
+        self.loaded_at = time.time()
+
+
+class ModelSlot:
+    """The live model set of a service behind a single reference
+
+    Requests take a ``lease()`` on the current generation and use that
+    value for their whole duration. ``reload()`` builds and validates the
+    next generation on a background thread while requests keep running on
+    the current one, then swaps it in with one assignment. A replaced
+    generation is passed to ``release`` as soon as its last lease ends,
+    so models are never closed under an in-flight request.
+
+    The slot starts "unloaded" holding ``empty``; the first lease loads
+    it (or ``reload()`` does so in the background as a warmup). With
+    ``unload_when_idle()`` the slot goes back to ``empty`` after a period
+    without leases and loads again on the next one.
+    """
+
+    STATES = ("unloaded", "loading", "ready", "failed")
+
+    def __init__(self, name: str, release: Callable[[Any], None], empty: Any = None,
+                 load: Optional[Callable[[], Any]] = None, validate: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.release = release
+        self.empty = empty
+        self.load = load
+        self.validate = validate
+        self.state = "unloaded"
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self._generation = _Generation(0, empty)
+        self._draining: List[_Generation] = []
+        self._reload_thread: Optional[threading.Thread] = None
+        self._reloads = 0
+        self._failures = 0
+        self._unloads = 0
+        self._last_reload: Optional[Dict[str, Any]] = None
+        self._idle_seconds = 0.0
+        self._idle_stop = threading.Event()
+        self._idle_thread: Optional[threading.Thread] = None
+
+    @property
+    def current(self) -> Any:
+        return self._generation.value
+
+    @property
+    def reloading(self) -> bool:
+        return self._reload_thread is not None
+
+    @property
+    def ready(self) -> bool:
+        """False only while models are being loaded"""
+        return self.state != "loading"
+
+    def ensure_loaded(self):
+        """Load synchronously if nothing is loaded yet (waits for a load already running)"""
+        if self.state == "unloaded" and self.load is not None:
+            self.reload(wait=True)
+        elif self.state == "loading":
+            self.wait_for_reload()
+
+    @contextmanager
+    def lease(self) -> Iterator[Any]:
+        """Pin the current generation until the block exits, loading it on first use"""
+        self.last_used = time.monotonic()
+        if self.state != "ready":
+            self.ensure_loaded()
+        with self._lock:
+            generation = self._generation
+            generation.leases += 1
+        try:
+            yield generation.value
+        finally:
+            with self._lock:
+                generation.leases -= 1
+                drained = generation.retired and generation.leases == 0
+                if drained:
+                    self._draining.remove(generation)
+            if drained:
+                self._release(generation)
+
+    def swap(self, value: Any, state: str = "ready") -> Any:
+        """Make ``value`` current; the previous value is released once drained"""
+        with self._lock:
+            old = self._generation
+            self._generation = _Generation(old.number + 1, value)
+            self.state = state
+            old.retired = True
+            drained = old.leases == 0
+            if not drained:
+                self._draining.append(old)
+        if drained:
+            self._release(old)
+        return old.value
+
+    def unload(self):
+        """Go back to ``empty``; the loaded models are released once drained"""
+        self.wait_for_reload()
+        if self.state != "unloaded":
+            self.swap(self.empty, state="unloaded")
+            self._unloads += 1
+
+    def _release(self, generation: _Generation):
+        if generation.value is None:
+            return
+        try:
+            self.release(generation.value)
+        except Exception as e:
+            print(f"⚠️ {self.name}: error releasing generation {generation.number}: {e}")
+
+    def reload(self, load: Optional[Callable[[], Any]] = None, validate: Optional[Callable[[Any], None]] = None,
+               wait: bool = False) -> bool:
+        """Load, validate and swap in a new value off the request path
+
+        ``load``/``validate`` default to the slot's own. ``validate`` raises
+        to reject the new value, which is then released and the current one
+        stays live. Returns False if a reload is already in progress.
+        """
+        load = load or self.load
+        validate = validate or self.validate
+        with self._lock:
+            if self._reload_thread is not None:
+                running = self._reload_thread
+            else:
+                running = None
+                thread = threading.Thread(
+                    target=self._run_reload, args=(load, validate), name=f"{self.name}-reload", daemon=True
+                )
+                # Started, then published, under the lock: any caller that sees
+                # the thread or the "loading" state can join it
+                thread.start()
+                self._reload_thread = thread
+                if self.state != "ready":
+                    self.state = "loading"
+        if running is not None:
+            if wait:
+                running.join()
+            return False
+        if wait:
+            thread.join()
+        return True
+
+    def _run_reload(self, load: Callable[[], Any], validate: Optional[Callable[[Any], None]]):
+        started = time.perf_counter()
+        value = None
+        result: Dict[str, Any] = {"started_at": time.time()}
+        try:
+            print(f"🔄 {self.name}: loading new models in the background...")
+            value = load()
+            result["load_seconds"] = round(time.perf_counter() - started, 3)
+            if validate is not None:
+                validated = time.perf_counter()
+                validate(value)
+                result["validate_seconds"] = round(time.perf_counter() - validated, 3)
+            self.swap(value)
+            result.update(success=True, generation=self._generation.number)
+            self._reloads += 1
+            print(f"✓ {self.name}: swapped in generation {self._generation.number}")
+        except Exception as e:
+            result.update(success=False, error=str(e))
+            self._failures += 1
+            if self.state == "loading":
+                self.state = "failed"
+            print(f"❌ {self.name}: reload rejected, keeping current models: {e}")
+            if value is not None:
+                self._release(_Generation(-1, value))
+        finally:
+            result["total_seconds"] = round(time.perf_counter() - started, 3)
+            with self._lock:
+                self._last_reload = result
+                self._reload_thread = None
+
+    def wait_for_reload(self, timeout: Optional[float] = None) -> bool:
+        """Block until an in-progress reload finishes; False on timeout"""
+        thread = self._reload_thread
+        if thread is not None:
+            thread.join(timeout)
+            return not thread.is_alive()
+        return True
+
+    def unload_when_idle(self, idle_seconds: float):
+        """Unload after ``idle_seconds`` without a lease (0 disables)"""
+        self._idle_seconds = idle_seconds
+        if idle_seconds <= 0 or self._idle_thread is not None:
+            return
+        self._idle_stop.clear()
+        self._idle_thread = threading.Thread(target=self._idle_loop, name=f"{self.name}-idle", daemon=True)
+        self._idle_thread.start()
+
+    def _idle_loop(self):
+        while not self._idle_stop.wait(min(30.0, max(0.05, self._idle_seconds / 4))):
+            with self._lock:
+                busy = self._generation.leases > 0 or bool(self._draining)
+            idle = time.monotonic() - self.last_used
+            if self.state == "ready" and not busy and idle >= self._idle_seconds:
+                print(f"💤 {self.name}: unloading after {idle:.0f}s without traffic")
+                self.unload()
+
+    def stop(self):
+        """Stop the idle monitor and release the loaded models"""
+        self._idle_stop.set()
+        if self._idle_thread is not None and self._idle_thread is not threading.current_thread():
+            self._idle_thread.join(timeout=2)
+        self._idle_thread = None
+        self.unload()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "idle_seconds": round(time.monotonic() - self.last_used, 1),
+                "idle_unload_seconds": self._idle_seconds,
+                "unloads": self._unloads,
+                "generation": self._generation.number,
+                "loaded_at": self._generation.loaded_at,
+                "active_leases": self._generation.leases,
+                "draining": [{"generation": g.number, "leases": g.leases} for g in self._draining],
+                "reloading": self._reload_thread is not None,
+                "reloads": self._reloads,
+                "failed_reloads": self._failures,
+                "last_reload": self._last_reload,
+            }
@@ -0,0 +1,121 @@
+"""
+Motion Gate for Gold Loan Appraisal System
+Skips YOLO inference when a camera's scene has not changed since the last detection
+"""
+
+import time
+import threading
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class MotionEntry:
+    """Last real inference for one (session, camera)
+
+    ``frame_shape`` is the shape of the frame the detections were computed
+    on: full and reduced decodes share a thumbnail size but not a
+    coordinate space.
+    """
+
+    __slots__ = ("model", "thumbnail", "frame_shape", "detections", "inferred_at", "reused")
+
+    def __init__(self, model, thumbnail: np.ndarray, detections, inferred_at: float,
+                 frame_shape: Optional[Tuple[int, ...]] = None):
+        self.model = model
+        self.thumbnail = thumbnail
+        self.frame_shape = frame_shape
+        self.detections = detections
+        self.inferred_at = inferred_at
+        self.reused = 0
+
+
+class MotionGate:
+    """Cheap change detector on a downscaled grayscale frame
+
+    Each new frame is compared with the thumbnail of the frame that was
+    last sent to the model (not the previous frame, so slow drift still
+    triggers inference). Below the threshold the cached detections are
+    reused, up to ``max_stale_frames`` times or ``max_stale_ms``.
+    Entries live in the caller's per-session dict, so they are dropped
+    together with the session.
+    """
+
+    def __init__(self, enabled: bool = True, threshold: float = 2.0, thumbnail_width: int = 64,
+                 max_stale_frames: int = 5, max_stale_ms: float = 500.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.enabled = enabled
+        self.clock = clock
+        self.threshold = threshold
+        self.thumbnail_width = thumbnail_width
+        self.max_stale_frames = max_stale_frames
+        self.max_stale_seconds = max_stale_ms / 1000.0
+
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def thumbnail(self, frame: np.ndarray) -> np.ndarray:
+        h, w = frame.shape[:2]
+        size = (self.thumbnail_width, max(1, round(h * self.thumbnail_width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+
+    def lookup(self, entries: Dict[Any, MotionEntry], key, model, thumbnail: np.ndarray,
+               frame_shape: Optional[Tuple[int, ...]] = None):
+        """Cached detections if the scene is unchanged, not stale and at the same frame size, else None"""
+        if not self.enabled:
+            return None
+
+        entry = entries.get(key)
+        if (entry is None or entry.model is not model or entry.thumbnail.shape != thumbnail.shape
+                or entry.frame_shape != frame_shape):
+            self._count(key, "inferred")
+            return None
+
+        if (entry.reused >= self.max_stale_frames or
+                self.clock() - entry.inferred_at >= self.max_stale_seconds):
+            self._count(key, "forced")
+            return None
+
+        delta = cv2.mean(cv2.absdiff(entry.thumbnail, thumbnail))[0]
+        if delta >= self.threshold:
+            self._count(key, "inferred")
+            return None
+
+        entry.reused += 1
+        self._count(key, "skipped")
+        return entry.detections
+
+    def store(self, entries: Dict[Any, MotionEntry], key, model, thumbnail: np.ndarray, detections,
+              frame_shape: Optional[Tuple[int, ...]] = None):
+        """Record a real inference as the new reference for this camera"""
+        if self.enabled:
+            entries[key] = MotionEntry(model, thumbnail, detections, self.clock(), frame_shape)
+
+    def _count(self, key, outcome: str):
+        with self._lock:
+            counters = self._counters.setdefault(str(key), {"inferred": 0, "forced": 0, "skipped": 0})
+            counters[outcome] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cameras = {}
+            for key, counters in self._counters.items():
+                total = sum(counters.values())
+                cameras[key] = {
+                    **counters,
+                    "frames": total,
+                    "skip_ratio": round(counters["skipped"] / total, 4) if total else 0.0,
+                }
+        skipped = sum(c["skipped"] for c in cameras.values())
+        frames = sum(c["frames"] for c in cameras.values())
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "max_stale_frames": self.max_stale_frames,
+            "max_stale_ms": self.max_stale_seconds * 1000.0,
+            "frames": frames,
+            "skipped": skipped,
+            "skip_ratio": round(skipped / frames, 4) if frames else 0.0,
+            "cameras": cameras,
+        }
@@ -0,0 +1,252 @@
+"""
+Purity Pipeline for Gold Loan Appraisal System
+Server-side capture -> inference -> annotate/encode stages for the camera feeds
+"""
+
+import time
+import threading
+from collections import deque
+import cv2
+import numpy as np
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.camera_hub import CameraBroadcaster, EncodedFrameSlot
+
+
+class DropOldestQueue:
+    """Bounded hand-off between two stages that never blocks the producer
+
+    When the consumer falls behind, the oldest waiting item is discarded,
+    so every stage always works on the newest frame available to it.
+    """
+
+    def __init__(self, maxsize: int = 1):
+        self._items = deque()
+        self._maxsize = max(1, maxsize)
+        self._cond = threading.Condition()
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if len(self._items) >= self._maxsize:
+                self._items.popleft()
+                self.dropped += 1
+            self._items.append(item)
+            self._cond.notify()
+
+    def get(self, timeout: float = 0.5):
+        """Next item, or None on timeout or once closed"""
+        with self._cond:
+            if not self._items and not self._closed:
+                self._cond.wait_for(lambda: self._items or self._closed, timeout=timeout)
+            if self._closed or not self._items:
+                return None
+            return self._items.popleft()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._items.clear()
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._items)
+
+
+class StageTimer:
+    """Busy time and throughput of one pipeline stage over a recent window"""
+
+    def __init__(self, window: int = 256):
+        self._lock = threading.Lock()
+        self._durations = deque(maxlen=window)
+        self.frames = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.started_at = time.monotonic()
+
+    def record(self, seconds: float, error: bool = False):
+        with self._lock:
+            self._durations.append(seconds)
+            self.frames += 1
+            self.busy_seconds += seconds
+            if error:
+                self.errors += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            durations = sorted(self._durations)
+            elapsed = time.monotonic() - self.started_at
+            frames, errors, busy = self.frames, self.errors, self.busy_seconds
+
+        def percentile(q: float) -> float:
+            if not durations:
+                return 0.0
+            return round(durations[min(len(durations) - 1, int(q * len(durations)))] * 1000, 2)
+
+        return {
+            "frames": frames,
+            "errors": errors,
+            "fps": round(frames / elapsed, 2) if elapsed else 0.0,
+            "mean_ms": round(sum(durations) / len(durations) * 1000, 2) if durations else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "utilization": round(busy / elapsed, 3) if elapsed else 0.0,
+        }
+
+
+class FeedPipeline:
+    """Annotated stream for one camera feed, one thread per stage
+
+    capture:   takes each new raw frame from the camera broadcaster
+    inference: detection, task pairing and timer update (``evaluate``)
+    encode:    draws the overlay (``draw``) and JPEG-encodes the frame
+
+    Stages are joined by DropOldestQueues, so while one frame is being
+    encoded the next is already being inferred and a third captured.
+    The output runs at the throughput of the slowest stage, never behind
+    the camera. ``evaluate`` returns (detections, summary) or None when
+    no model is loaded, in which case the raw frame is published.
+
+    Frames are only inferred and encoded while the output has subscribers
+    (MJPEG viewers or WebSocket clients); otherwise capture drops them, so
+    an unwatched pipeline does not compete with analyze calls for the model.
+    """
+
+    STAGES = ("capture", "inference", "encode")
+
+    def __init__(self, name: str, broadcaster: CameraBroadcaster,
+                 evaluate: Callable[[np.ndarray], Optional[Tuple[Any, Dict[str, Any]]]],
+                 draw: Callable[[np.ndarray, Any, Dict[str, Any]], None],
+                 jpeg_quality: int = 75, queue_size: int = 1):
+        self.name = name
+        self.broadcaster = broadcaster
+        self.evaluate = evaluate
+        self.draw = draw
+        self.jpeg_quality = jpeg_quality
+        self.output = EncodedFrameSlot()
+
+        self._inference_queue = DropOldestQueue(queue_size)
+        self._encode_queue = DropOldestQueue(queue_size)
+        self._timers = {stage: StageTimer() for stage in self.STAGES}
+        self._latency = StageTimer()
+        self._camera_skipped = 0
+        self._idle_skipped = 0
+        self._running = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        for stage, target in zip(self.STAGES, (self._capture_loop, self._inference_loop, self._encode_loop)):
+            thread = threading.Thread(target=target, name=f"purity-pipeline-{self.name}-{stage}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✓ Purity pipeline started for {self.name}")
+
+    def stop(self):
+        self._running = False
+        self._inference_queue.close()
+        self._encode_queue.close()
+        self.output.close()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=2)
+        self._threads = []
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def _capture_loop(self):
+        last_seq = 0
+        while self._running:
+            item = self.broadcaster.wait_for_frame(last_seq, timeout=0.5)
+            if item is None:
+                if not self.broadcaster.running:
+                    print(f"⚠️ {self.name} capture ended, stopping pipeline")
+                    self._running = False
+                    self._inference_queue.close()
+                    self._encode_queue.close()
+                    self.output.close()
+                    break
+                continue
+            started = time.perf_counter()
+            seq, frame, captured_at = item
+            if last_seq and seq > last_seq + 1:
+                self._camera_skipped += seq - last_seq - 1
+            last_seq = seq
+            if self.output.subscribers == 0:
+                self._idle_skipped += 1
+                continue
+            self._inference_queue.put((seq, frame, captured_at))
+            self._timers["capture"].record(time.perf_counter() - started)
+
+    def _inference_loop(self):
+        while self._running:
+            item = self._inference_queue.get()
+            if item is None:
+                continue
+            seq, frame, captured_at = item
+            started = time.perf_counter()
+            try:
+                evaluated, error = self.evaluate(frame), None
+            except Exception as e:
+                print(f"Error in {self.name} pipeline inference: {e}")
+                evaluated, error = None, str(e)
+            self._timers["inference"].record(time.perf_counter() - started, error is not None)
+            self._encode_queue.put((seq, frame, captured_at, evaluated, error))
+
+    def _encode_loop(self):
+        while self._running:
+            item = self._encode_queue.get()
+            if item is None:
+                continue
+            seq, frame, captured_at, evaluated, error = item
+            started = time.perf_counter()
+            failed = False
+            summary = None
+            try:
+                # The raw frame is shared with the broadcaster and other pipelines
+                annotated = frame.copy()
+                if evaluated is not None:
+                    detections, summary = evaluated
+                    self.draw(annotated, detections, summary)
+                elif error:
+                    summary = {"error": error}
+                    cv2.putText(annotated, f"Error: {error[:50]}", (10, 30),
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                ret, buffer = cv2.imencode('.jpg', annotated, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                if ret:
+                    latency = time.monotonic() - captured_at
+                    self.output.publish(buffer.tobytes(), {
+                        "frame_seq": seq,
+                        "detections": summary,
+                        "latency_ms": round(latency * 1000, 1),
+                    })
+                    self._latency.record(latency)
+                else:
+                    failed = True
+            except Exception as e:
+                print(f"Error in {self.name} pipeline encode: {e}")
+                failed = True
+            self._timers["encode"].record(time.perf_counter() - started, failed)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stages = {stage: timer.get_stats() for stage, timer in self._timers.items()}
+        stages["inference"]["queue_dropped"] = self._inference_queue.dropped
+        stages["encode"]["queue_dropped"] = self._encode_queue.dropped
+        latency = self._latency.get_stats()
+        return {
+            "running": self._running,
+            "camera": self.broadcaster.name,
+            "stages": stages,
+            "camera_frames_skipped": self._camera_skipped,
+            "idle_frames_skipped": self._idle_skipped,
+            "output_fps": latency["fps"],
+            "latency_ms": {"mean": latency["mean_ms"], "p50": latency["p50_ms"], "p95": latency["p95_ms"]},
+            "bottleneck": max(self.STAGES, key=lambda s: stages[s]["mean_ms"]),
+            "output": self.output.get_stats(),
+        }
@@ -0,0 +1,142 @@
+"""
+Purity Session Store for Gold Loan Appraisal System
+Keeps detection timers and status separate for every testing station
+"""
+
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SESSION_ID = "default"
+MAX_SESSION_ID_LENGTH = 64
+
+# Appraisal phases in order; each runs only its own model and camera
+PURITY_PHASES = ("rubbing", "acid", "done")
+
+
+class PuritySession:
+    """Detection state for one testing station"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.lock = threading.RLock()
+        self.detection_status: Dict[str, Any] = {"message": "No detection yet", "timestamp": None}
+        self.detection_states: Dict[Any, Dict[str, Any]] = {}
+        self.motion_state: Dict[Any, Any] = {}  # per-camera MotionGate entries
+        self.phase = PURITY_PHASES[0]
+        self.created_at = time.time()
+        self.last_seen = time.monotonic()
+
+    def reset(self):
+        """Clear timers, fluctuation counters and the status message"""
+        with self.lock:
+            self.detection_status = {"message": "No detection yet", "timestamp": None}
+            self.detection_states.clear()
+            self.motion_state.clear()
+            self.phase = PURITY_PHASES[0]
+
+    def advance_phase(self, completed_phase: str) -> Optional[str]:
+        """Move past ``completed_phase`` if it is still current; returns the new phase"""
+        with self.lock:
+            if self.phase != completed_phase or self.phase == PURITY_PHASES[-1]:
+                return None
+            self.phase = PURITY_PHASES[PURITY_PHASES.index(self.phase) + 1]
+            return self.phase
+
+    def get_status(self) -> Dict[str, Any]:
+        with self.lock:
+            return self.detection_status.copy()
+
+
+class PuritySessionStore:
+    """Session-keyed store with LRU bound and idle TTL eviction
+
+    Sessions are kept in last-used order, so expired sessions are always at
+    the front and eviction only ever looks at the oldest entries.
+    """
+
+    def __init__(self, ttl_seconds: float = 900.0, max_sessions: int = 64):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max(1, int(max_sessions))
+        self._sessions: "OrderedDict[str, PuritySession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evicted = 0
+
+    @staticmethod
+    def normalize_id(session_id: Optional[str]) -> str:
+        """Validate a client-supplied session id (empty means the default session)"""
+        if not session_id:
+            return DEFAULT_SESSION_ID
+        session_id = str(session_id).strip()
+        if not session_id or len(session_id) > MAX_SESSION_ID_LENGTH:
+            raise ValueError(f"session_id must be 1-{MAX_SESSION_ID_LENGTH} characters")
+        return session_id
+
+    def create(self) -> PuritySession:
+        """Issue a new session with a server-generated id"""
+        return self.get(uuid.uuid4().hex)
+
+    def get(self, session_id: Optional[str] = None) -> PuritySession:
+        """Return the session for an id, creating it if needed"""
+        session_id = self.normalize_id(session_id)
+        now = time.monotonic()
+
+        with self._lock:
+            self._evict_expired(now)
+
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = PuritySession(session_id)
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self._evicted += 1
+            else:
+                self._sessions.move_to_end(session_id)
+
+            session.last_seen = now
+            return session
+
+    def peek(self, session_id: Optional[str] = None) -> Optional[PuritySession]:
+        """Return an existing session without creating or touching it"""
+        with self._lock:
+            return self._sessions.get(self.normalize_id(session_id))
+
+    def remove(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(self.normalize_id(session_id), None) is not None
+
+    def sessions(self) -> List[PuritySession]:
+        with self._lock:
+            return list(self._sessions.values())
+
+    def _evict_expired(self, now: float):
+        if self.ttl_seconds <= 0:
+            return
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_seen < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._evicted += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            return {
+                "active_sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "ttl_seconds": self.ttl_seconds,
+                "evicted_sessions": self._evicted,
+                "sessions": [
+                    {
+                        "session_id": s.session_id,
+                        "idle_seconds": round(now - s.last_seen, 1),
+                        "message": s.detection_status.get("message"),
+                    }
+                    for s in self._sessions.values()
+                ],
+            }
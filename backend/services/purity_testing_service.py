@@ -6,93 +6,53 @@ Converted from FastAPI to regular Python service
 import os
 import cv2
 import time
-import math
 import warnings
-import pandas as pd
 import numpy as np
 import base64
 from typing import Optional, Dict, List, Any, Tuple
 from datetime import datetime
 import threading
-import queue
+
+from services.inference_scheduler import InferenceScheduler
+from services.motion_gate import MotionGate
+from services.frame_decode import DecodedFrame, decode_frame, decode_full
+from services.inference_workers import InferenceWorkerPool
+from services.camera_hub import CameraHub
+from services.file_watcher import FileWatcher
+from services.model_slot import ModelSlot
+from services.metrics import REGISTRY
+from services.purity_pipeline import FeedPipeline
+from services.purity_session_store import PuritySession, PuritySessionStore
+from services.task_rules import TaskRuleTable, read_task_csv, write_task_csv
+from services.box_ops import pairwise_iou, iou_pairs
+from services.inference_backends import (
+    BACKENDS, Detections, InferenceBackend, create_backend, get_backend_class, supported_backends
+)
 
 # Suppress warnings
 warnings.filterwarnings("ignore")
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
-# Try to import YOLO - make it optional for development
-try:
-    from ultralytics import YOLO
-    import torch
-    
-    # Fix for newer PyTorch versions that default to weights_only=True
-    # This is required for loading YOLO models which use custom classes
-    try:
-        if hasattr(torch.serialization, 'add_safe_globals'):
-            import ultralytics.nn.tasks
-            import ultralytics.nn.modules.conv
-            import ultralytics.nn.modules.block
-            import ultralytics.nn.modules.head
-            import torch.nn.modules.container
-            import torch.nn.modules.conv
-            import torch.nn.modules.batchnorm
-            import torch.nn.modules.activation
-            import torch.nn.modules.pooling
-            import torch.nn.modules.upsampling
-            import torch.nn.modules.linear
-            import collections
-            
-            # Common classes found in YOLOv8 models
-            safe_classes = [
-                ultralytics.nn.tasks.DetectionModel,
-                ultralytics.nn.modules.conv.Conv,
-                ultralytics.nn.modules.conv.Concat,
-                ultralytics.nn.modules.block.C2f,
-                ultralytics.nn.modules.block.Bottleneck,
-                ultralytics.nn.modules.block.DFL,
-                ultralytics.nn.modules.block.SPPF,
-                ultralytics.nn.modules.head.Detect,
-                torch.nn.modules.container.Sequential,
-                torch.nn.modules.container.ModuleList,
-                torch.nn.modules.conv.Conv2d,
-                torch.nn.modules.batchnorm.BatchNorm2d,
-                torch.nn.modules.activation.SiLU,
-                torch.nn.modules.pooling.MaxPool2d,
-                torch.nn.modules.upsampling.Upsample,
-                torch.nn.modules.linear.Identity,
-                torch.Size,
-                torch.device,
-                collections.OrderedDict,
-            ]
-            
-            # Add storage types if available
-            for storage in ['FloatStorage', 'LongStorage', 'IntStorage', 'DoubleStorage', 'HalfStorage', 'ByteStorage', 'CharStorage', 'ShortStorage', 'BoolStorage', 'UntypedStorage']:
-                if hasattr(torch, storage):
-                    safe_classes.append(getattr(torch, storage))
-            
-            torch.serialization.add_safe_globals(safe_classes)
-            print("✓ Added comprehensive YOLO/Torch classes to safe globals")
-    except Exception as e:
-        print(f"⚠️ Failed to add safe globals: {e}")
+# Inference runtime for the YOLO models (torch, onnx or openvino)
+INFERENCE_BACKEND = os.getenv("PURITY_INFERENCE_BACKEND", "torch").strip().lower()
+YOLO_AVAILABLE = get_backend_class(INFERENCE_BACKEND).is_supported() if INFERENCE_BACKEND in BACKENDS else False
+if YOLO_AVAILABLE:
+    print(f"YOLO inference backend: {INFERENCE_BACKEND}")
+else:
+    print(f"YOLO inference backend '{INFERENCE_BACKEND}' not available (supported: {supported_backends()})")
+    print("Install with: pip install ultralytics (torch), onnxruntime (onnx) or openvino (openvino)")
 
-    YOLO_AVAILABLE = True
-    print("YOLO libraries loaded successfully")
-except ImportError as e:
-    print(f"YOLO libraries not available: {e}")
-    print("Install with: pip install ultralytics")
-    YOLO_AVAILABLE = False
-    # Mock class for development
-    class YOLO:
-        def __init__(self, model_path):
-            self.model_path = model_path
-            self.model = type('obj', (object,), {'names': {}})()
-        def predict(self, frame, **kwargs):
-            return [type('obj', (object,), {
-                'boxes': type('obj', (object,), {
-                    'xyxy': type('obj', (object,), {'cpu': lambda: type('obj', (object,), {'numpy': lambda: np.array([])})()})(),
-                    'cls': type('obj', (object,), {'cpu': lambda: type('obj', (object,), {'numpy': lambda: np.array([])})()})()
-                })()
-            })]
+# Hot-path instrumentation exported on /metrics
+PURITY_STAGES = ("decode", "inference", "pairing", "draw", "encode")
+PURITY_STAGE_SECONDS = REGISTRY.histogram(
+    "purity_stage_seconds", "Purity analysis stage latency in seconds", ["stage"])
+PURITY_ANALYZE_SECONDS = REGISTRY.histogram(
+    "purity_analyze_seconds", "Purity analyze call latency in seconds", ["output"])
+PURITY_FRAMES = REGISTRY.counter(
+    "purity_frames_total", "Purity frames by camera and outcome (analyzed, idle, no_model, error)",
+    ["camera", "outcome"])
+PURITY_TASKS_COMPLETED = REGISTRY.counter(
+    "purity_tasks_completed_total", "Purity tasks whose hold time and fluctuations were met", ["label"])
 
 class PurityTestingService:
     """Service class for handling purity testing operations"""
@@ -101,16 +61,41 @@ class PurityTestingService:
         self.db = database
         self.available = YOLO_AVAILABLE
         
-        # Detection status tracking
-        self.detection_status = {"message": "No detection yet", "timestamp": None}
-        self.detection_states = {}
+        # Detection status tracking, one session per testing station
+        self.sessions = PuritySessionStore(
+            ttl_seconds=float(os.getenv("PURITY_SESSION_TTL_SECONDS", "900")),
+            max_sessions=int(os.getenv("PURITY_MAX_SESSIONS", "64"))
+        )
         
-        # Models and cameras
-        self.model1 = None
-        self.model2 = None
+        # Models (swapped as one set on reload) and cameras
+        self.model_slot = ModelSlot(
+            "purity-models", release=self._release_model_set, empty=self._empty_model_set(),
+            load=self._load_model_set, validate=self._validate_model_set
+        )
+        # eager: load in __init__ | background: warmup() after startup | lazy: on first request
+        self.load_mode = os.getenv("MODEL_LOAD_MODE", "background").strip().lower()
         self.camera1 = None
         self.camera2 = None
         
+        # Capture threads broadcasting each camera to every MJPEG subscriber
+        self.camera_hub = CameraHub(
+            jpeg_quality=int(os.getenv("PURITY_FEED_JPEG_QUALITY", "75")),
+            encode_fps=float(os.getenv("PURITY_FEED_FPS", "15"))
+        )
+        
+        # Server-side capture -> inference -> encode pipelines for the annotated feeds
+        self.pipeline_enabled = os.getenv("PURITY_PIPELINE", "true").lower() in ("1", "true", "yes")
+        self.pipeline_queue_size = int(os.getenv("PURITY_PIPELINE_QUEUE_SIZE", "1"))
+        self.pipelines: Dict[str, FeedPipeline] = {}
+        self.pipeline_session_id: Optional[str] = None
+        
+        self._stage_seconds = {stage: PURITY_STAGE_SECONDS.labels(stage=stage) for stage in PURITY_STAGES}
+        REGISTRY.gauge("purity_sessions_active", "Active purity detection sessions",
+                       lambda: self.sessions.get_stats()["active_sessions"])
+        
+        # Time source for task hold timers (replaced by a virtual clock for deterministic replays)
+        self.clock = time.time
+        
         # Service state
         self.is_running = False
         self.current_task = None
@@ -121,151 +106,429 @@ class PurityTestingService:
         self.csv1_path = "data/task_sequence.csv"
         self.csv2_path = "data/task_sequence_main.csv"
         
-        # CSV Cache to avoid repeated disk reads
-        self._csv_cache = {}
+        # Inference backend options
+        self.backend_name = INFERENCE_BACKEND
+        self.backend_options = {
+            "imgsz": int(os.getenv("PURITY_IMGSZ", "320")),
+            "conf": float(os.getenv("PURITY_CONF", "0.25")),
+            "intra_op_threads": int(os.getenv("PURITY_INTRA_OP_THREADS", "0")),
+            "inter_op_threads": int(os.getenv("PURITY_INTER_OP_THREADS", "0")),
+            "precision": os.getenv("PURITY_ONNX_PRECISION", "auto").strip().lower(),
+        }
+        
+        # Optional pool of inference worker processes (0 = run models in this process)
+        self.worker_processes = int(os.getenv("PURITY_WORKER_PROCESSES", "0"))
+        self.worker_affinity = os.getenv("PURITY_WORKER_AFFINITY", "none")
+        
+        # Optional image used to validate and warm up reloaded models
+        self.reference_frame_path = os.getenv("PURITY_REFERENCE_FRAME", "")
+        
+        # Compiled task rules per (csv_path, model) to avoid repeated disk reads.
+        # Readers never lock; writers build a new dict and swap the reference.
+        self._rule_tables: Dict[Tuple[str, int], TaskRuleTable] = {}
+        self._rule_tables_lock = threading.Lock()
+        
+        # Reload task CSVs when their content changes, without touching the models
+        self._csv_watcher = FileWatcher(
+            lambda: (self.csv1_path, self.csv2_path), self._on_task_csv_changed,
+            interval=float(os.getenv("PURITY_CSV_WATCH_INTERVAL", "2")), name="purity-csv-watcher"
+        )
+        if os.getenv("PURITY_CSV_WATCH", "true").lower() in ("1", "true", "yes"):
+            self._csv_watcher.start()
+        
+        # Micro-batching: concurrent requests share one forward pass per model
+        batch_max_size = int(os.getenv("PURITY_BATCH_MAX_SIZE", "8"))
+        batch_max_wait_ms = float(os.getenv("PURITY_BATCH_MAX_WAIT_MS", "5"))
+        batch_timeout_s = float(os.getenv("PURITY_BATCH_TIMEOUT_S", "30"))
+        self._schedulers = {
+            "model1": InferenceScheduler(
+                "model1", lambda frames: self._predict_batch(self.model1, frames),
+                max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms, timeout_s=batch_timeout_s
+            ),
+            "model2": InferenceScheduler(
+                "model2", lambda frames: self._predict_batch(self.model2, frames),
+                max_batch_size=batch_max_size, max_wait_ms=batch_max_wait_ms, timeout_s=batch_timeout_s
+            ),
+        }
+        
+        # Run only the model and camera of the session's current phase (rubbing -> acid -> done)
+        self.phase_aware = os.getenv("PURITY_PHASE_AWARE", "true").lower() in ("1", "true", "yes")
+        self.phase_cameras = {"rubbing": 1, "acid": 2}
+        
+        # Decode uploads at reduced resolution when no annotated frame is returned
+        self.reduced_decode = os.getenv("PURITY_REDUCED_DECODE", "true").lower() in ("1", "true", "yes")
+        
+        # Skip inference on frames that have not changed since the last detection
+        self.motion_gate = MotionGate(
+            enabled=os.getenv("PURITY_MOTION_GATE", "true").lower() in ("1", "true", "yes"),
+            threshold=float(os.getenv("PURITY_MOTION_THRESHOLD", "2.0")),
+            max_stale_frames=int(os.getenv("PURITY_MOTION_MAX_STALE_FRAMES", "5")),
+            max_stale_ms=float(os.getenv("PURITY_MOTION_MAX_STALE_MS", "500"))
+        )
         
         # Threading for video processing
         self._stop_event = threading.Event()
         # self._video_threads = {}
         # self._frame_queues = {}
         
-        # Initialize if available
-        if self.available:
+        # Initialize if available (otherwise on warmup() or the first request)
+        if self.available and self.load_mode == "eager":
             self._initialize_models()
+        self.model_slot.unload_when_idle(float(os.getenv("MODEL_IDLE_UNLOAD_SECONDS", "0")))
+    
+    @staticmethod
+    def _empty_model_set() -> Dict[str, Any]:
+        return {"model1": None, "model2": None, "worker_pool": None}
+    
+    @property
+    def model1(self):
+        return self.model_slot.current["model1"]
+    
+    @model1.setter
+    def model1(self, model):
+        self.model_slot.swap({**self.model_slot.current, "model1": model})
+    
+    @property
+    def model2(self):
+        return self.model_slot.current["model2"]
+    
+    @model2.setter
+    def model2(self, model):
+        self.model_slot.swap({**self.model_slot.current, "model2": model})
+    
+    @property
+    def _worker_pool(self) -> Optional[InferenceWorkerPool]:
+        return self.model_slot.current["worker_pool"]
     
     def _initialize_models(self):
         """Initialize YOLO models"""
         print("\n🔄 Initializing YOLO models...")
-        model1_loaded = False
-        model2_loaded = False
-        
-        try:
-            # Load Model 1 (Rubbing Test)
-            if os.path.exists(self.model1_path):
-                print(f"  Loading Model 1: {self.model1_path}")
-                self.model1 = YOLO(self.model1_path)
-                print(f"  ✓ Model 1 loaded successfully")
-                print(f"    Class Names: {self.model1.model.names if hasattr(self.model1, 'model') else self.model1.names}")
-                model1_loaded = True
+        self.model_slot.reload(wait=True)
+    
+    def warmup(self):
+        """Load the models in the background unless the service loads them lazily"""
+        if self.available and self.load_mode == "background" and self.model_slot.state == "unloaded":
+            print("🔄 Warming up YOLO models in the background...")
+            self.model_slot.reload()
+    
+    def _load_model_set(self) -> Dict[str, Any]:
+        """Load both models (or a worker pool serving them) without touching the live set"""
+        models = self._load_worker_pool_set() if self.worker_processes > 0 else self._load_models()
+        loaded = {key: models[key] is not None for key in ("model1", "model2")}
+        if any(loaded.values()):
+            mode = ", workers" if models["worker_pool"] is not None else ""
+            print(f"\n✓ Purity Testing Service Ready (Model1: {loaded['model1']}, Model2: {loaded['model2']}{mode})")
+        else:
+            print(f"\n⚠️ No models loaded - service will show live feed only")
+        return models
+    
+    def _load_models(self) -> Dict[str, Any]:
+        models = self._empty_model_set()
+        for key, label, path in (("model1", "Model 1", self.model1_path), ("model2", "Model 2", self.model2_path)):
+            try:
+                if os.path.exists(path):
+                    print(f"  Loading {label}: {path}")
+                    model = self._load_model(path)
+                    print(f"  ✓ {label} loaded successfully ({self.backend_name}, {model.describe()['precision']})")
+                    print(f"    Class Names: {model.names}")
+                    models[key] = model
+                else:
+                    print(f"  ⚠️ {label} file not found: {path}")
+                    print(f"    Current directory: {os.getcwd()}")
+            except Exception as e:
+                print(f"  ❌ Error loading {label}: {e}")
+                import traceback
+                traceback.print_exc()
+        return models
+    
+    def _load_model(self, weights_path: str) -> InferenceBackend:
+        """Load weights with the configured inference backend"""
+        return create_backend(self.backend_name, weights_path, **self.backend_options)
+    
+    def _load_worker_pool_set(self) -> Dict[str, Any]:
+        """Load the models inside a pool of inference worker processes"""
+        models = self._empty_model_set()
+        model_paths = {}
+        for key, path in (("model1", self.model1_path), ("model2", self.model2_path)):
+            if os.path.exists(path):
+                model_paths[key] = path
             else:
-                print(f"  ⚠️ Model 1 file not found: {self.model1_path}")
-                print(f"    Current directory: {os.getcwd()}")
-                
-        except Exception as e:
-            print(f"  ❌ Error loading Model 1: {e}")
-            import traceback
-            traceback.print_exc()
-            self.model1 = None
+                print(f"  ⚠️ {key} file not found: {path}")
         
-        try:
-            # Load Model 2 (Acid Test)
-            if os.path.exists(self.model2_path):
-                print(f"  Loading Model 2: {self.model2_path}")
-                self.model2 = YOLO(self.model2_path)
-                print(f"  ✓ Model 2 loaded successfully")
-                print(f"    Class Names: {self.model2.model.names if hasattr(self.model2, 'model') else self.model2.names}")
-                model2_loaded = True
-            else:
-                print(f"  ⚠️ Model 2 file not found: {self.model2_path}")
-                print(f"    Current directory: {os.getcwd()}")
-                
-        except Exception as e:
-            print(f"  ❌ Error loading Model 2: {e}")
-            import traceback
-            traceback.print_exc()
-            self.model2 = None
+        if model_paths:
+            print(f"  Starting {self.worker_processes} inference worker(s) ({self.backend_name})")
+            pool = None
+            try:
+                pool = InferenceWorkerPool(
+                    self.backend_name, model_paths, self.backend_options,
+                    processes=self.worker_processes,
+                    affinity=self.worker_affinity,
+                    slot_bytes=int(float(os.getenv("PURITY_WORKER_SLOT_MB", "6")) * 1024 * 1024),
+                    max_batch_size=int(os.getenv("PURITY_BATCH_MAX_SIZE", "8")),
+                    timeout=float(os.getenv("PURITY_WORKER_TIMEOUT_SECONDS", "30"))
+                )
+                pool.start()
+            except Exception as e:
+                print(f"  ❌ Error starting inference workers: {e}")
+                if pool is not None:
+                    pool.stop()
+                return models
+            
+            models["worker_pool"] = pool
+            for key in pool.loaded_models():
+                models[key] = pool.model(key)
+        return models
+    
+    def _release_model_set(self, models: Dict[str, Any]):
+        """Close the models of a replaced set that the live set no longer uses"""
+        live = self.model_slot.current
+        released = set()
+        for key in ("model1", "model2"):
+            model = models.get(key)
+            if model is not None and model is not live.get(key):
+                released.add(id(model))
+                model.close()
+        pool = models.get("worker_pool")
+        if pool is not None and pool is not live.get("worker_pool"):
+            pool.stop()
+        if released:
+            with self._rule_tables_lock:
+                self._rule_tables = {key: table for key, table in self._rule_tables.items() if key[1] not in released}
+    
+    def _reference_frame(self) -> np.ndarray:
+        frame = None
+        if self.reference_frame_path:
+            frame = cv2.imread(self.reference_frame_path)
+            if frame is None:
+                print(f"⚠️ Reference frame not readable: {self.reference_frame_path}")
+        if frame is None:
+            frame = np.full((480, 640, 3), 127, np.uint8)
+        return frame
+    
+    def _validate_model_set(self, models: Dict[str, Any]):
+        """Warm up a freshly loaded set with one inference per model; raises to reject it"""
+        current = self.model_slot.current
+        for key, path in (("model1", self.model1_path), ("model2", self.model2_path)):
+            if models[key] is None and (current[key] is not None or os.path.exists(path)):
+                raise Exception(f"{key} failed to load")
+        frame = self._reference_frame()
+        for key in ("model1", "model2"):
+            model = models[key]
+            if model is None:
+                continue
+            started = time.perf_counter()
+            results = model.predict_batch([frame])
+            if len(results) != 1:
+                raise Exception(f"{key} returned {len(results)} results for one frame")
+            print(f"  ✓ {key} validated ({(time.perf_counter() - started) * 1000:.0f} ms, {len(results[0])} detections)")
+    
+    def reload_models(self, wait: bool = False) -> Dict[str, Any]:
+        """Load and validate a new model set in the background, then swap it in
         
-        # Service is available if at least one model loaded
-        if model1_loaded or model2_loaded:
-            print(f"\n✓ Purity Testing Service Ready (Model1: {model1_loaded}, Model2: {model2_loaded})")
-            self.available = True
-        else:
-            print(f"\n⚠️ No models loaded - service will show live feed only")
-            self.available = False
-    
-    def reload_models(self):
-        """Force reload of YOLO models"""
-        print("\n🔄 Force reloading YOLO models...")
-        self.model1 = None
-        self.model2 = None
-        self._csv_cache.clear()
-        self._initialize_models()
+        Requests keep running on the current models until the swap; the old
+        set is closed once the last request using it finishes. A set that
+        fails to load or validate is discarded.
+        """
+        started = self.model_slot.reload(wait=wait)
+        return {
+            "success": started,
+            "message": "Reload started" if started else "Reload already in progress",
+            "model1_loaded": self.model1 is not None,
+            "model2_loaded": self.model2 is not None,
+            "available": self.is_available(),
+            "reload": self.model_slot.get_stats()
+        }
+    
+    def get_reload_status(self) -> Dict[str, Any]:
+        """Model generation, in-flight leases and the outcome of the last reload"""
         return {
-            "success": True,
             "model1_loaded": self.model1 is not None,
             "model2_loaded": self.model2 is not None,
-            "available": self.is_available()
+            **self.model_slot.get_stats()
         }
     
+    @property
+    def detection_status(self) -> Dict[str, Any]:
+        """Detection status of the default session (single-station clients)"""
+        session = self.sessions.peek()
+        return session.detection_status if session else {"message": "No detection yet", "timestamp": None}
+    
+    @property
+    def detection_states(self) -> Dict[Any, Dict[str, Any]]:
+        """Detection timers of the default session (single-station clients)"""
+        session = self.sessions.peek()
+        return session.detection_states if session else {}
+    
     def is_available(self) -> bool:
         """Check if purity testing service is available"""
-        return self.available and (self.model1 is not None or self.model2 is not None)
+        if not self.available:
+            return False
+        if self.model_slot.state in ("unloaded", "loading"):
+            return True  # loaded on first use
+        return self.model1 is not None or self.model2 is not None
+    
+    def _predict_batch(self, model, frames: List[np.ndarray]) -> List[Detections]:
+        """Run one batched forward pass, returning one result per frame"""
+        if model is None:
+            raise Exception("Model not loaded")
+        return model.predict_batch(frames)
+    
+    def _predict(self, model, frame: np.ndarray) -> Detections:
+        """Predict a single frame through the model's micro-batching scheduler"""
+        with self._stage_seconds["inference"].time():
+            for key, scheduler in self._schedulers.items():
+                if model is getattr(self, key):
+                    return scheduler.predict(frame)
+            return self._predict_batch(model, [frame])[0]
+    
+    def _detect(self, model, frame: np.ndarray, camera_key: str, session: PuritySession) -> Detections:
+        """Detections for a frame, reusing the session's last result if the scene is unchanged"""
+        thumbnail = self.motion_gate.thumbnail(frame) if self.motion_gate.enabled else None
+        if thumbnail is not None:
+            with session.lock:
+                cached = self.motion_gate.lookup(session.motion_state, camera_key, model, thumbnail, frame.shape)
+            if cached is not None:
+                return cached
+        
+        detections = self._predict(model, frame)
+        if thumbnail is not None:
+            with session.lock:
+                self.motion_gate.store(session.motion_state, camera_key, model, thumbnail, detections, frame.shape)
+        return detections
+    
+    def get_inference_stats(self) -> Dict[str, Any]:
+        """Per-model batch size and latency statistics"""
+        stats = {key: scheduler.get_stats() for key, scheduler in self._schedulers.items()}
+        for key in self._schedulers:
+            model = getattr(self, key)
+            if model is not None:
+                stats[key]["backend"] = model.describe()
+        stats["motion_gate"] = self.motion_gate.get_stats()
+        if self._worker_pool is not None:
+            stats["worker_pool"] = self._worker_pool.get_stats()
+        return stats
     
     def iou(self, box1: List[float], box2: List[float]) -> float:
         """Calculate Intersection over Union (IoU) between two bounding boxes"""
-        x1, y1 = max(box1[0], box2[0]), max(box1[1], box2[1])
-        x2, y2 = min(box1[2], box2[2]), min(box1[3], box2[3])
-        inter_area = max(0, x2 - x1) * max(0, y2 - y1)
-        union = ((box1[2] - box1[0]) * (box1[3] - box1[1])) + ((box2[2] - box2[0]) * (box2[3] - box2[1])) - inter_area
-        return inter_area / union if union else 0
+        return float(pairwise_iou([box1], [box2])[0, 0])
     
     def detect_pairs(self, bboxes: np.ndarray, classes: List[str], target_class1: str, target_class2: str, iou_threshold: float = 0.1) -> List[Tuple[int, int]]:
         """Detect pairs of target classes based on IoU threshold"""
-        pairs = []
-        indices_class1 = [i for i, c in enumerate(classes) if c == target_class1]
-        indices_class2 = [i for i, c in enumerate(classes) if c == target_class2]
+        classes = np.asarray(classes, dtype=object)
+        return iou_pairs(
+            bboxes,
+            np.flatnonzero(classes == target_class1),
+            np.flatnonzero(classes == target_class2),
+            iou_threshold
+        )
+    
+    def _compile_rules(self, csv_path: str, rows: List[Dict[str, str]], model) -> TaskRuleTable:
+        table = TaskRuleTable.compile(csv_path, rows, model.names)
+        unresolved = table.unresolved_targets()
+        if unresolved:
+            print(f"⚠️ {csv_path}: targets not in model classes: {unresolved}")
+        return table
+    
+    def _get_rule_table(self, csv_path: str, model) -> Optional[TaskRuleTable]:
+        """Compiled task rules for a CSV, with targets resolved to the model's class ids"""
+        key = (csv_path, id(model))
+        table = self._rule_tables.get(key)
+        if table is None:
+            if not os.path.exists(csv_path):
+                return None
+            with self._rule_tables_lock:
+                table = self._rule_tables.get(key)
+                if table is None:
+                    table = self._compile_rules(csv_path, read_task_csv(csv_path), model)
+                    self._rule_tables = {**self._rule_tables, key: table}
+        return table
+    
+    def _on_task_csv_changed(self, csv_path: str) -> bool:
+        """Recompile a changed task CSV for every model using it and swap the tables in
         
-        for i in indices_class1:
-            for j in indices_class2:
-                if self.iou(bboxes[i], bboxes[j]) > iou_threshold:
-                    pairs.append((i, j))
-        return pairs
+        A CSV that fails to parse leaves the previous rules in effect.
+        """
+        try:
+            rows = read_task_csv(csv_path)
+            with self._rule_tables_lock:
+                models = {id(m): m for m in (self.model1, self.model2) if m is not None}
+                tables = {key: table for key, table in self._rule_tables.items() if key[0] != csv_path}
+                for key in self._rule_tables:
+                    if key[0] == csv_path and key[1] in models:
+                        tables[key] = self._compile_rules(csv_path, rows, models[key[1]])
+                self._rule_tables = tables
+        except Exception as e:
+            print(f"⚠️ Task CSV reload failed for {csv_path}, keeping previous rules: {e}")
+            return False
+        print(f"🔄 Task rules reloaded from {csv_path}")
+        return True
     
-    def run_yolo_with_csv(self, frame: np.ndarray, model, csv_path: str, detection_states: Dict) -> np.ndarray:
-        """Run YOLO detection with CSV task logic and timer tracking"""
-        if not os.path.exists(csv_path):
+    def reload_task_rules(self) -> Dict[str, Any]:
+        """Recompile both task CSVs now (models are left untouched)"""
+        reloaded = {}
+        for csv_path in (self.csv1_path, self.csv2_path):
+            reloaded[csv_path] = os.path.exists(csv_path) and self._on_task_csv_changed(csv_path)
+            self._csv_watcher.forget(csv_path)
+        return {"success": all(reloaded.values()), "reloaded": reloaded}
+    
+    def get_task_rule_stats(self) -> Dict[str, Any]:
+        """Compiled rule tables and CSV watcher state"""
+        tables = self._rule_tables
+        return {
+            "watcher": self._csv_watcher.get_stats(),
+            "tables": [
+                {"csv_path": csv_path, "tasks": len(table), "labels": table.labels}
+                for (csv_path, _), table in tables.items()
+            ],
+        }
+    
+    def _camera_csv(self, camera: int) -> str:
+        return self.csv1_path if camera == 1 else self.csv2_path
+    
+    def _camera_active(self, session: PuritySession, camera: int) -> bool:
+        """Whether a camera's model runs in the session's current phase"""
+        return not self.phase_aware or self.phase_cameras.get(session.phase) == camera
+    
+    def _advance_phase(self, session: PuritySession, csv_path: str):
+        """Move to the next phase once a task of the current phase's CSV completes"""
+        if not self.phase_aware:
+            return
+        camera = self.phase_cameras.get(session.phase)
+        if camera is None or self._camera_csv(camera) != csv_path:
+            return
+        completed_phase = session.phase
+        new_phase = session.advance_phase(completed_phase)
+        if new_phase:
+            print(f"➡️ {completed_phase} phase completed, moving to {new_phase} (session {session.session_id})")
+    
+    def _evaluate_frame(self, frame: np.ndarray, model, csv_path: str, session: PuritySession,
+                        scale: Tuple[float, float] = (1.0, 1.0)) -> Optional[Tuple[Detections, Dict[str, Any]]]:
+        """Detect, match task pairs and advance the session's timers, without drawing
+        
+        Returns the raw detections and a JSON-ready summary (boxes, classes,
+        confidences, pairs and timer state per task), or None if the CSV is missing.
+        Summary boxes are multiplied by ``scale`` to undo a reduced decode.
+        """
+        rules = self._get_rule_table(csv_path, model)
+        if rules is None:
             print(f"Warning: CSV file not found: {csv_path}")
-            return frame
+            return None
         
-        try:
-            if csv_path in self._csv_cache:
-                tasks = self._csv_cache[csv_path]
-            else:
-                tasks = pd.read_csv(csv_path)
-                self._csv_cache[csv_path] = tasks
-
-            results = model.predict(frame, imgsz=320, conf=0.25, verbose=False, half=False, device='cpu')
-            detections = results[0]
-            boxes = detections.boxes.xyxy.cpu().numpy()
-            class_ids = detections.boxes.cls.cpu().numpy().astype(int)
-            confidences = detections.boxes.conf.cpu().numpy()
-            class_names = model.model.names
-            class_labels = [class_names[i] for i in class_ids]
-            
-            # Debug: Show detection count
-            if len(boxes) > 0:
-                cv2.putText(frame, f"Detections: {len(boxes)}", (10, frame.shape[0] - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
-            
-            # Track which boxes are part of a pair
-            pair_indices = set()
-            active_labels = []
-            
-            for idx, row in tasks.iterrows():
-                t1, t2 = str(row['target1']), str(row['target2'])
-                label = row['label']
-                hold_seconds = float(row.get('hold_seconds', 5))
-                min_fluctuations = int(row.get('min_fluctuations', 3))
-                pairs = self.detect_pairs(boxes, class_labels, t1, t2, iou_threshold=0.05)
-                
-                if pairs:
-                    active_labels.append(label)
-                    for i, j in pairs:
-                        pair_indices.add(i)
-                        pair_indices.add(j)
+        detections = self._detect(model, frame, csv_path, session)
+        pairing_started = time.perf_counter()
+        boxes, class_ids, confidences = detections
+        class_names = model.names
+        rule_pairs = rules.match_pairs(boxes, class_ids, iou_threshold=0.05)
+        
+        tasks = []
+        completed_any = False
+        # Per-session state update (timers are shared across this station's frames)
+        with session.lock:
+            for idx, label, hold_seconds, min_fluctuations in rules.rules():
+                pairs = rule_pairs[idx]
                 
                 key = (csv_path, label)
-                state = detection_states.setdefault(key, {
+                state = session.detection_states.setdefault(key, {
                     "detected_time": None,
                     "last_detected": False,
                     "fluctuation_count": 0,
@@ -279,223 +542,341 @@ class PurityTestingService:
                 state["last_detected"] = detected_now
                 
                 if detected_now and state["detected_time"] is None:
-                    state["detected_time"] = time.time()
+                    state["detected_time"] = self.clock()
                 
+                elapsed = None
+                fluctuation_count = state["fluctuation_count"]
+                completed = False
                 if state["detected_time"]:
-                    elapsed = time.time() - state["detected_time"]
-                    cv2.putText(frame, f"{label}: {elapsed:.1f}s, fluc:{state['fluctuation_count']}",
-                                (10, 40 + idx * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+                    elapsed = self.clock() - state["detected_time"]
                     
                     if elapsed > hold_seconds:
                         if state["fluctuation_count"] >= min_fluctuations:
                             print(f"✅ {label} detected. Moving to next task.")
-                            self.detection_status["message"] = f"{label} detected ✅"
-                            self.detection_status["timestamp"] = datetime.now().isoformat()
-                            cv2.putText(frame, f"{label} DETECTED!", (50, 60 + idx * 40),
-                                        cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 3)
-                            # Reset for next round
-                            state["detected_time"] = None
-                            state["fluctuation_count"] = 0
-                            state["last_detected"] = False
-                        else:
-                            # Not enough fluctuations -> reset
-                            state["detected_time"] = None
-                            state["fluctuation_count"] = 0
-                            state["last_detected"] = False
-            
-            # Final Box Drawing (Move OUTSIDE task loop to avoid overdrawing)
-            h, w = frame.shape[:2]
-            for idx_box, box in enumerate(boxes):
-                # Ensure coordinates are within image boundaries
-                x1, y1, x2, y2 = map(int, box)
-                x1 = max(0, min(x1, w-1))
-                y1 = max(0, min(y1, h-1))
-                x2 = max(0, min(x2, w-1))
-                y2 = max(0, min(y2, h-1))
-                
-                # Check if this detection belongs to NO relevant class? 
-                # (Optional: Filter boxes not mentioned in CSV if needed)
-                
-                is_pair = idx_box in pair_indices
-                color = (0, 0, 255) if is_pair else (0, 255, 0) # Red if pair, Green if single
-                
-                # Draw the rectangle with thicker line
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
-                
-                # Draw class label with confidence
-                class_label = class_labels[idx_box]
-                conf_score = confidences[idx_box] if idx_box < len(confidences) else 0.0
-                label_text = f"{class_label} {conf_score:.2f}"
+                            session.detection_status["message"] = f"{label} detected ✅"
+                            session.detection_status["timestamp"] = datetime.now().isoformat()
+                            completed = True
+                        # Reset for next round (or not enough fluctuations)
+                        state["detected_time"] = None
+                        state["fluctuation_count"] = 0
+                        state["last_detected"] = False
                 
-                # Draw background for text
-                (text_w, text_h), _ = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
-                cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color, -1)
-                cv2.putText(frame, label_text, (x1, y1 - 5),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                if completed:
+                    completed_any = True
+                    PURITY_TASKS_COMPLETED.labels(label=label).inc()
                 
-                # If it's part of a pair, also show the task label (e.g. "Rubbing")
-                if is_pair and active_labels:
-                    cv2.putText(frame, " | ".join(active_labels), (x1, y2 + 20),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+                tasks.append({
+                    "label": label,
+                    "pairs": [list(pair) for pair in pairs],
+                    "active": detected_now,
+                    "elapsed": round(elapsed, 2) if elapsed is not None else None,
+                    "fluctuation_count": fluctuation_count,
+                    "hold_seconds": hold_seconds,
+                    "min_fluctuations": min_fluctuations,
+                    "completed": completed,
+                })
+            
+            if completed_any:
+                self._advance_phase(session, csv_path)
+        
+        h, w = frame.shape[:2]
+        scale_x, scale_y = scale
+        summary = {
+            "frame_size": [round(w * scale_x), round(h * scale_y)],
+            "boxes": np.round(boxes * np.array([scale_x, scale_y, scale_x, scale_y]), 1).tolist(),
+            "class_ids": class_ids.tolist(),
+            "class_names": [class_names[i] for i in class_ids],
+            "confidences": np.round(confidences.astype(np.float64), 4).tolist(),
+            "tasks": tasks,
+        }
+        self._stage_seconds["pairing"].observe(time.perf_counter() - pairing_started)
+        return detections, summary
+    
+    def _draw_analysis(self, frame: np.ndarray, detections: Detections, summary: Dict[str, Any]):
+        """Draw task timers and detection boxes from an evaluated frame"""
+        started = time.perf_counter()
+        boxes, _, confidences = detections
+        class_labels = summary["class_names"]
+        
+        # Debug: Show detection count
+        if len(boxes) > 0:
+            cv2.putText(frame, f"Detections: {len(boxes)}", (10, frame.shape[0] - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 2)
+        
+        # Track which boxes are part of a pair
+        pair_indices = set()
+        active_labels = []
+        
+        for idx, task in enumerate(summary["tasks"]):
+            if task["pairs"]:
+                active_labels.append(task["label"])
+                for i, j in task["pairs"]:
+                    pair_indices.add(i)
+                    pair_indices.add(j)
+            
+            if task["elapsed"] is not None:
+                cv2.putText(frame, f"{task['label']}: {task['elapsed']:.1f}s, fluc:{task['fluctuation_count']}",
+                            (10, 40 + idx * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+            if task["completed"]:
+                cv2.putText(frame, f"{task['label']} DETECTED!", (50, 60 + idx * 40),
+                            cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 3)
+        
+        # Final Box Drawing (Move OUTSIDE task loop to avoid overdrawing)
+        h, w = frame.shape[:2]
+        for idx_box, box in enumerate(boxes):
+            # Ensure coordinates are within image boundaries
+            x1, y1, x2, y2 = map(int, box)
+            x1 = max(0, min(x1, w-1))
+            y1 = max(0, min(y1, h-1))
+            x2 = max(0, min(x2, w-1))
+            y2 = max(0, min(y2, h-1))
+            
+            is_pair = idx_box in pair_indices
+            color = (0, 0, 255) if is_pair else (0, 255, 0) # Red if pair, Green if single
+            
+            # Draw the rectangle with thicker line
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
             
+            # Draw class label with confidence
+            class_label = class_labels[idx_box]
+            conf_score = confidences[idx_box] if idx_box < len(confidences) else 0.0
+            label_text = f"{class_label} {conf_score:.2f}"
+            
+            # Draw background for text
+            (text_w, text_h), _ = cv2.getTextSize(label_text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+            cv2.rectangle(frame, (x1, y1 - text_h - 10), (x1 + text_w, y1), color, -1)
+            cv2.putText(frame, label_text, (x1, y1 - 5),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            
+            # If it's part of a pair, also show the task label (e.g. "Rubbing")
+            if is_pair and active_labels:
+                cv2.putText(frame, " | ".join(active_labels), (x1, y2 + 20),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+        
+        self._stage_seconds["draw"].observe(time.perf_counter() - started)
+    
+    def _run_frame(self, frame: np.ndarray, model, csv_path: str, session: PuritySession,
+                   annotate: bool = True, scale: Tuple[float, float] = (1.0, 1.0)
+                   ) -> Tuple[np.ndarray, Optional[Dict[str, Any]]]:
+        """Evaluate a frame and optionally draw the result onto it"""
+        try:
+            evaluated = self._evaluate_frame(frame, model, csv_path, session, scale)
+            if evaluated is None:
+                return frame, None
+            detections, summary = evaluated
+            if annotate:
+                self._draw_analysis(frame, detections, summary)
+            return frame, summary
         except Exception as e:
             print(f"Error in YOLO processing: {e}")
-            cv2.putText(frame, f"Error: {str(e)[:50]}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-        
-        return frame
-    def run_yolo_analysis_on_frame(self, frame: np.ndarray) -> np.ndarray:
+            if annotate:
+                cv2.putText(frame, f"Error: {str(e)[:50]}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
+            return frame, {"error": str(e)}
+    
+    def run_yolo_with_csv(self, frame: np.ndarray, model, csv_path: str, session: Optional[PuritySession] = None) -> np.ndarray:
+        """Run YOLO detection with CSV task logic and timer tracking"""
+        if session is None:
+            session = self.sessions.get()
+        return self._run_frame(frame, model, csv_path, session)[0]
+    
+    def run_yolo_analysis_on_frame(self, frame: np.ndarray, session_id: Optional[str] = None) -> np.ndarray:
         """Run YOLO + CSV logic on a single frame and return annotated image"""
         if not self.is_available():
             cv2.putText(frame, "YOLO Not Available", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
             return frame
 
-        # Use model 1 (or make dynamic)
-        model = self.model1
-        csv_path = self.csv1_path
-
-        if model is None or not os.path.exists(csv_path):
-            cv2.putText(frame, "Model/CSV Missing", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            return frame
-
-        try:
-            if csv_path in self._csv_cache:
-                tasks = self._csv_cache[csv_path]
-            else:
-                tasks = pd.read_csv(csv_path)
-                self._csv_cache[csv_path] = tasks
-
-            results = model.predict(frame, imgsz=320, conf=0.3, verbose=False)
-            detections = results[0]
-            boxes = detections.boxes.xyxy.cpu().numpy()
-            class_ids = detections.boxes.cls.cpu().numpy().astype(int)
-            class_names = model.model.names
-            class_labels = [class_names[i] for i in class_ids]
-            
-            for idx, row in tasks.iterrows():
-                t1, t2 = str(row['target1']), str(row['target2'])
-                label = row['label']
-                pairs = self.detect_pairs(boxes, class_labels, t1, t2, iou_threshold=0.05)
-
-                key = (csv_path, label)
-                state = self.detection_states.setdefault(key, {
-                    "detected_time": None, "last_detected": False, "fluctuation_count": 0
-                })
-
-                detected_now = bool(pairs)
-                if detected_now and not state["last_detected"]:
-                    state["fluctuation_count"] += 1
-                state["last_detected"] = detected_now
-
-                if detected_now and state["detected_time"] is None:
-                    state["detected_time"] = time.time()
-
-                if state["detected_time"]:
-                    elapsed = time.time() - state["detected_time"]
-                    cv2.putText(frame, f"{label}: {elapsed:.1f}s fluc:{state['fluctuation_count']}",
-                                (10, 40 + idx * 30), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-
-                    hold_seconds = float(row.get('hold_seconds', 5))
-                    min_fluctuations = int(row.get('min_fluctuations', 3))
-                    if elapsed > hold_seconds and state["fluctuation_count"] >= min_fluctuations:
-                        self.detection_status["message"] = f"{label} detected"
-                        self.detection_status["timestamp"] = datetime.now().isoformat()
-                        cv2.putText(frame, f"{label} DETECTED!", (50, 60 + idx * 40),
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 255), 3)
-                        state["detected_time"] = None
-                        state["fluctuation_count"] = 0
-                        state["last_detected"] = False
-
-                # Draw boxes
-                for i, box in enumerate(boxes):
-                    x1, y1, x2, y2 = map(int, box)
-                    color = (0, 0, 255) if any(i in pair for pair in pairs) else (0, 255, 0)
-                    cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
-                    cv2.putText(frame, class_labels[i], (x1, y2 + 20),
-                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 2)
-
-        except Exception as e:
-            cv2.putText(frame, f"Error: {str(e)[:40]}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-        return frame
+        session = self.sessions.get(session_id)
+        with self.model_slot.lease() as models:
+            model = models["model1"]
+            if model is None or not os.path.exists(self.csv1_path):
+                cv2.putText(frame, "Model/CSV Missing", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                return frame
+            # Same scheduler, motion gate, timers and overlay as /analyze
+            return self._run_frame(frame, model, self.csv1_path, session)[0]
 
-    def analyze_frames(self, frame1_b64: str = None, frame2_b64: str = None) -> Dict[str, Any]:
-        """Analyze one or two frames sent as base64 from the frontend"""
-        results = {
+    def decode_image_bytes(self, data: bytes) -> Optional[np.ndarray]:
+        """Decode an encoded image (JPEG/PNG) straight from a bytes buffer"""
+        return decode_full(data)
+    
+    def _decode_for_output(self, data: bytes, output: str):
+        """Full decode for annotated output, DCT-reduced to the model input size otherwise"""
+        with self._stage_seconds["decode"].time():
+            if output == "detections" and self.reduced_decode:
+                return decode_frame(data, self.backend_options["imgsz"])
+            return decode_full(data)
+    
+    def _decode_data_url(self, frame_b64: str, output: str = "json"):
+        """Decode a base64 data URL sent by the frontend"""
+        return self._decode_for_output(base64.b64decode(frame_b64.split(",")[1]), output)
+    
+    def _analyze_single(self, frame: np.ndarray, model, csv_path: str, session: PuritySession,
+                        loading_text: str, monitor_text: str,
+                        annotate: bool = True) -> Tuple[Optional[np.ndarray], Optional[Dict[str, Any]]]:
+        """Run YOLO on one decoded frame, or mark it as a live feed if the model is missing
+        
+        Returns (annotated frame or None when annotate is off, structured detections).
+        """
+        scale = (1.0, 1.0)
+        if isinstance(frame, DecodedFrame):
+            frame, scale = frame.image, (frame.scale_x, frame.scale_y)
+        
+        if model:
+            frame, summary = self._run_frame(frame, model, csv_path, session, annotate, scale)
+            return (frame if annotate else None), summary
+        
+        if not annotate:
+            return None, None
+        
+        # Model not loaded - show live feed with status message
+        annotated = frame.copy()
+        cv2.putText(annotated, loading_text, (10, 30), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
+        cv2.putText(annotated, monitor_text, (10, 70), 
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
+        return annotated, None
+    
+    def _idle_frame(self, frame, camera: int, phase: str, annotate: bool) -> Tuple[Optional[np.ndarray], None]:
+        """A camera outside the current phase: no inference, only a phase banner"""
+        if not annotate:
+            return None, None
+        if isinstance(frame, DecodedFrame):
+            frame = frame.image
+        annotated = frame.copy()
+        cv2.putText(annotated, f"Cam {camera} | {phase.upper()}", (10, 30),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
+        return annotated, None
+    
+    def _count_frame(self, camera: int, model, detections: Optional[Dict[str, Any]]):
+        if model is None:
+            outcome = "no_model"
+        elif detections is None or "error" in detections:
+            outcome = "error"
+        else:
+            outcome = "analyzed"
+        PURITY_FRAMES.labels(camera=camera, outcome=outcome).inc()
+    
+    def _base_results(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Response skeleton shared by every analyze variant"""
+        return {
+            "session_id": self.sessions.normalize_id(session_id),
             "annotated_frame1": None,
             "annotated_frame2": None,
-            "detection_status": self.get_detection_status(),
+            "detections1": None,
+            "detections2": None,
+            "detection_status": self.get_detection_status(session_id),
             "model1_status": "ready" if self.model1 else "not_loaded",
             "model2_status": "ready" if self.model2 else "not_loaded"
         }
-
+    
+    def analyze_decoded_frames(self, frame1=None, frame2=None,
+                               output: str = "json", session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze already-decoded frames
+        
+        output:
+        - "json": annotated frames as base64 data URLs (original /analyze response)
+        - "jpeg": annotated frames as raw JPEG bytes
+        - "detections": no drawing or encoding, structured detections and status only
+        
+        Every mode also returns "detections1"/"detections2": boxes (xyxy in
+        frame pixels), class ids/names, confidences and, per task, the
+        matched pair indices and timer state, for client-side rendering.
+        
+        Frames are numpy images or DecodedFrame results of a reduced decode,
+        whose boxes are reported in original-frame coordinates.
+        
+        With phase-aware inference only the current phase's camera is
+        analyzed; the other frame is skipped (detections None).
+        """
+        started = time.perf_counter()
+        session = self.sessions.get(session_id)
+        self.model_slot.ensure_loaded()
+        results = self._base_results(session.session_id)
+        annotate = output != "detections"
+        
         try:
-            # Process Frame 1 (Top View / Rubbing)
-            if frame1_b64:
-                img1_bytes = base64.b64decode(frame1_b64.split(",")[1])
-                nparr1 = np.frombuffer(img1_bytes, np.uint8)
-                frame1 = cv2.imdecode(nparr1, cv2.IMREAD_COLOR)
-                
+            annotated = {}
+            phase = session.phase
+            # Both cameras use the same model set, even if a reload swaps it mid-request
+            with self.model_slot.lease() as models:
+                # Frame 1 (Top View / Rubbing)
                 if frame1 is not None:
-                    # print(f"[Frame1] Received frame size: {frame1.shape}")  # Comment out for performance
-                    if self.model1:
-                        # Run YOLO analysis
-                        # print(f"[Frame1] Running YOLO analysis with Model 1...")
-                        annotated1 = self.run_yolo_with_csv(frame1, self.model1, self.csv1_path, self.detection_states)
-                        # print(f"[Frame1] Analysis complete")
+                    if self._camera_active(session, 1):
+                        annotated["annotated_frame1"], results["detections1"] = self._analyze_single(
+                            frame1, models["model1"], self.csv1_path, session, "Model 1 Loading...", "LIVE MONITOR", annotate
+                        )
+                        self._count_frame(1, models["model1"], results["detections1"])
                     else:
-                        # Model not loaded - show live feed with status message
-                        annotated1 = frame1.copy()
-                        cv2.putText(annotated1, "Model 1 Loading...", (10, 30), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
-                        cv2.putText(annotated1, "LIVE MONITOR", (10, 70), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                    
-                    # Always encode and return the frame
-                    _, buf1 = cv2.imencode('.jpg', annotated1, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
-                    results["annotated_frame1"] = f"data:image/jpeg;base64,{base64.b64encode(buf1).decode()}"
-                    # print(f"[Frame1] Annotated frame encoded and ready")
-
-            # Process Frame 2 (Side View / Acid)
-            if frame2_b64:
-                img2_bytes = base64.b64decode(frame2_b64.split(",")[1])
-                nparr2 = np.frombuffer(img2_bytes, np.uint8)
-                frame2 = cv2.imdecode(nparr2, cv2.IMREAD_COLOR)
-                
+                        annotated["annotated_frame1"], results["detections1"] = self._idle_frame(frame1, 1, phase, annotate)
+                        PURITY_FRAMES.labels(camera=1, outcome="idle").inc()
+                # Frame 2 (Side View / Acid)
                 if frame2 is not None:
-                    # print(f"[Frame2] Received frame size: {frame2.shape}")
-                    if self.model2:
-                        # Run YOLO analysis
-                        # print(f"[Frame2] Running YOLO analysis with Model 2...")
-                        annotated2 = self.run_yolo_with_csv(frame2, self.model2, self.csv2_path, self.detection_states)
-                        # print(f"[Frame2] Analysis complete")
+                    if self._camera_active(session, 2):
+                        annotated["annotated_frame2"], results["detections2"] = self._analyze_single(
+                            frame2, models["model2"], self.csv2_path, session, "Model 2 Loading...", "SIDE MONITOR", annotate
+                        )
+                        self._count_frame(2, models["model2"], results["detections2"])
                     else:
-                        # Model not loaded - show live feed with status message
-                        annotated2 = frame2.copy()
-                        cv2.putText(annotated2, "Model 2 Loading...", (10, 30), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 255, 255), 2)
-                        cv2.putText(annotated2, "SIDE MONITOR", (10, 70), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
-                    
-                    # Always encode and return the frame
-                    _, buf2 = cv2.imencode('.jpg', annotated2, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
-                    results["annotated_frame2"] = f"data:image/jpeg;base64,{base64.b64encode(buf2).decode()}"
-                    # print(f"[Frame2] Annotated frame encoded and ready")
-
+                        annotated["annotated_frame2"], results["detections2"] = self._idle_frame(frame2, 2, phase, annotate)
+                        PURITY_FRAMES.labels(camera=2, outcome="idle").inc()
+            
+            if annotate:
+                for key, frame in annotated.items():
+                    if frame is None:
+                        continue
+                    with self._stage_seconds["encode"].time():
+                        _, buf = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), 75])
+                    if output == "jpeg":
+                        results[key] = buf.tobytes()
+                    else:
+                        results[key] = f"data:image/jpeg;base64,{base64.b64encode(buf).decode()}"
+            
             # Update detection status in results
-            results["detection_status"] = self.get_detection_status()
+            results["detection_status"] = self.get_detection_status(session.session_id)
             
             # Extract specific flags for frontend convenience
             msg = results["detection_status"]["message"].lower()
             results["rubbing_detected"] = "rub" in msg and "detected" in msg
             results["acid_detected"] = "acid" in msg and "detected" in msg
-
+        
         except Exception as e:
-            print(f"Error in analyze_frames: {e}")
+            print(f"Error in analyze_decoded_frames: {e}")
             import traceback
             traceback.print_exc()
             results["error"] = str(e)
-
+        
+        PURITY_ANALYZE_SECONDS.labels(output=output).observe(time.perf_counter() - started)
         return results
+    
+    def analyze_frame_bytes(self, frame1_bytes: Optional[bytes] = None, frame2_bytes: Optional[bytes] = None,
+                            output: str = "detections", session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze frames uploaded as raw encoded image bytes (no base64)"""
+        try:
+            frame1 = self._decode_for_output(frame1_bytes, output) if frame1_bytes else None
+            frame2 = self._decode_for_output(frame2_bytes, output) if frame2_bytes else None
+        except Exception as e:
+            print(f"Error decoding uploaded frames: {e}")
+            return {**self._base_results(session_id), "error": str(e)}
+        
+        # An upload that does not decode is a client error in every output mode
+        invalid = [camera for camera, data, frame in ((1, frame1_bytes, frame1), (2, frame2_bytes, frame2))
+                   if data and frame is None]
+        if invalid:
+            cameras = ", ".join(str(camera) for camera in invalid)
+            return {**self._base_results(session_id), "error": f"Invalid image (camera {cameras})", "invalid_image": True}
+        
+        return self.analyze_decoded_frames(frame1, frame2, output=output, session_id=session_id)
+    
+    def analyze_frames(self, frame1_b64: str = None, frame2_b64: str = None,
+                       session_id: Optional[str] = None, output: str = "json") -> Dict[str, Any]:
+        """Analyze one or two frames sent as base64 from the frontend"""
+        try:
+            frame1 = self._decode_data_url(frame1_b64, output) if frame1_b64 else None
+            frame2 = self._decode_data_url(frame2_b64, output) if frame2_b64 else None
+        except Exception as e:
+            print(f"Error in analyze_frames: {e}")
+            return {**self._base_results(session_id), "error": str(e)}
+        
+        return self.analyze_decoded_frames(frame1, frame2, output=output, session_id=session_id)
         
     def open_camera(self, camera_index: int = 0) -> Optional[cv2.VideoCapture]:
         """Open camera with error handling - tries multiple backends"""
@@ -521,11 +902,11 @@ class PurityTestingService:
                 raise Exception("Failed to capture frame")
             
             # Apply YOLO analysis
-            model = self.model1 if model_index == 1 else self.model2
             csv_path = self.csv1_path if model_index == 1 else self.csv2_path
-            
-            if model is not None:
-                frame = self.run_yolo_with_csv(frame, model, csv_path, self.detection_states)
+            with self.model_slot.lease() as models:
+                model = models["model1"] if model_index == 1 else models["model2"]
+                if model is not None:
+                    frame = self.run_yolo_with_csv(frame, model, csv_path)
             
             # Encode frame to base64
             ret, buffer = cv2.imencode('.jpg', frame)
@@ -627,22 +1008,39 @@ class PurityTestingService:
     #         return True
     #     return False
     
-    def get_detection_status(self) -> Dict[str, Any]:
-        """Get current detection status"""
-        status = self.detection_status.copy()
+    def get_detection_status(self, session_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get current detection status for a session (an unknown id is reported, not created)"""
+        session = self.sessions.peek(session_id)
+        if session is None:
+            status = {"message": "No detection yet", "timestamp": None, "session_found": False}
+        else:
+            status = session.get_status()
+        status["phase"] = session.phase if session is not None and self.phase_aware else None
         status["models_loaded"] = {
             "model1": self.model1 is not None,
             "model2": self.model2 is not None
         }
         return status
     
-    def reset_detection_status(self):
-        """Reset detection status"""
-        print("🔄 Resetting detection status...")
-        self.detection_status = {"message": "No detection yet", "timestamp": None}
-        self.detection_states.clear()
+    def reset_detection_status(self, session_id: Optional[str] = None):
+        """Reset detection status for a session"""
+        session = self.sessions.get(session_id)
+        print(f"🔄 Resetting detection status (session {session.session_id})...")
+        session.reset()
         print("✓ Detection status reset complete")
     
+    def create_session(self) -> str:
+        """Issue a new detection session for a testing station"""
+        return self.sessions.create().session_id
+    
+    def end_session(self, session_id: str) -> bool:
+        """Drop a station's detection state"""
+        return self.sessions.remove(session_id)
+    
+    def get_session_stats(self) -> Dict[str, Any]:
+        """Active sessions and eviction counters"""
+        return self.sessions.get_stats()
+    
     def get_available_cameras(self) -> List[int]:
         """Get list of available cameras (returns indices only)"""
         available_cameras = []
@@ -715,13 +1113,9 @@ class PurityTestingService:
             if os.path.exists(csv_path):
                 validation[csv_key]["exists"] = True
                 try:
-                    df = pd.read_csv(csv_path)
-                    required_columns = ['target1', 'target2', 'label']
-                    if all(col in df.columns for col in required_columns):
-                        validation[csv_key]["valid"] = True
-                        validation[csv_key]["tasks"] = len(df)
-                    else:
-                        validation[csv_key]["error"] = f"Missing required columns: {required_columns}"
+                    rows = read_task_csv(csv_path)
+                    validation[csv_key]["valid"] = True
+                    validation[csv_key]["tasks"] = len(rows)
                 except Exception as e:
                     validation[csv_key]["error"] = str(e)
         
@@ -729,25 +1123,22 @@ class PurityTestingService:
     
     def create_sample_csv_files(self):
         """Create sample CSV files for testing"""
-        sample_tasks1 = pd.DataFrame({
-            'target1': ['gold', 'sample', 'acid'],
-            'target2': ['acid', 'gold', 'test'],
-            'label': ['Gold-Acid Test', 'Sample Preparation', 'Acid Reaction'],
-            'hold_seconds': [5, 3, 7],
-            'min_fluctuations': [3, 2, 4]
-        })
-        
-        sample_tasks2 = pd.DataFrame({
-            'target1': ['electronic', 'probe', 'result'],
-            'target2': ['probe', 'sample', 'display'],
-            'label': ['Electronic Test', 'Probe Contact', 'Result Reading'],
-            'hold_seconds': [4, 6, 5],
-            'min_fluctuations': [2, 3, 3]
-        })
+        sample_tasks1 = [
+            {'target1': 'gold', 'target2': 'acid', 'label': 'Gold-Acid Test', 'hold_seconds': 5, 'min_fluctuations': 3},
+            {'target1': 'sample', 'target2': 'gold', 'label': 'Sample Preparation', 'hold_seconds': 3, 'min_fluctuations': 2},
+            {'target1': 'acid', 'target2': 'test', 'label': 'Acid Reaction', 'hold_seconds': 7, 'min_fluctuations': 4},
+        ]
+        
+        sample_tasks2 = [
+            {'target1': 'electronic', 'target2': 'probe', 'label': 'Electronic Test', 'hold_seconds': 4, 'min_fluctuations': 2},
+            {'target1': 'probe', 'target2': 'sample', 'label': 'Probe Contact', 'hold_seconds': 6, 'min_fluctuations': 3},
+            {'target1': 'result', 'target2': 'display', 'label': 'Result Reading', 'hold_seconds': 5, 'min_fluctuations': 3},
+        ]
         
         try:
-            sample_tasks1.to_csv(self.csv1_path, index=False)
-            sample_tasks2.to_csv(self.csv2_path, index=False)
+            write_task_csv(self.csv1_path, sample_tasks1)
+            write_task_csv(self.csv2_path, sample_tasks2)
+            self.reload_task_rules()
             return {"success": True, "message": "Sample CSV files created"}
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -768,6 +1159,14 @@ class PurityTestingService:
         
     #     print("✓ Purity testing service cleaned up")
     
+    def shutdown(self):
+        """Stop background inference workers"""
+        self._stop_pipelines()
+        self._csv_watcher.stop()
+        for scheduler in self._schedulers.values():
+            scheduler.stop()
+        self.model_slot.stop()
+    
     def __del__(self):
         """Cleanup when object is destroyed"""
         try:
@@ -883,13 +1282,21 @@ See CAMERA_TROUBLESHOOTING.md for more help.
                 print("Only one camera available, using it for both feeds")
                 self.camera2 = self.camera1
             
+            self.camera_hub.attach("camera1", self.camera1)
+            self.camera_hub.attach("camera2", self.camera2)
+            
             self.is_running = True
             self.current_task = "monitoring"
+            session_id = self.create_session()
+            if self.pipeline_enabled:
+                self._start_pipelines()
             
             print("✓ Purity testing service started successfully")
             return {
                 "success": True,
                 "message": "Purity testing started",
+                "session_id": session_id,
+                "pipeline_session_id": self.pipeline_session_id if self.pipelines else None,
                 "cameras": {
                     "camera1": camera1_index,
                     "camera2": camera2_index
@@ -898,6 +1305,8 @@ See CAMERA_TROUBLESHOOTING.md for more help.
             
         except Exception as e:
             print(f"Error starting purity testing: {e}")
+            self._stop_pipelines()
+            self.camera_hub.stop_all()
             if self.camera1:
                 self.camera1.release()
                 self.camera1 = None
@@ -909,6 +1318,10 @@ See CAMERA_TROUBLESHOOTING.md for more help.
     def stop(self):
         """Stop purity testing cameras"""
         try:
+            # Pipelines and capture threads must stop reading before the devices are released
+            self._stop_pipelines()
+            self.camera_hub.stop_all()
+            
             if self.camera1:
                 self.camera1.release()
                 self.camera1 = None
@@ -927,54 +1340,81 @@ See CAMERA_TROUBLESHOOTING.md for more help.
             print(f"Error stopping purity testing: {e}")
             return {"success": False, "error": str(e)}
     
-    def video_feed1(self):
-        """Video feed from camera 1 with YOLO analysis"""
-        from fastapi.responses import StreamingResponse
+    def _start_pipelines(self):
+        """Run the annotated capture -> inference -> encode pipeline for both feeds
         
-        def generate():
-            while self.camera1 and self.camera1.isOpened():
-                try:
-                    ret, frame = self.camera1.read()
-                    if not ret:
-                        time.sleep(0.01)
-                        continue
-                    
-                    # Encode frame as JPEG
-                    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-                    if ret:
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                    
-                    time.sleep(0.066)  # ~15 FPS for stability
-                    
-                except Exception as e:
-                    print(f"Error in video feed 1: {e}")
-                    time.sleep(0.1)
-        
-        return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
+        The pipeline gets a session of its own: sharing the client's would let
+        server-side frames and /analyze frames drive one set of timers.
+        """
+        self._stop_pipelines()
+        self.pipeline_session_id = session_id = self.create_session()
+        feeds = {"camera1": 1, "camera2": 2}
+        for feed, camera in feeds.items():
+            broadcaster = self.camera_hub.get(feed)
+            if broadcaster is None:
+                continue
+            pipeline = FeedPipeline(
+                feed, broadcaster,
+                evaluate=lambda frame, camera=camera: self._evaluate_pipeline_frame(frame, camera, session_id),
+                draw=self._draw_analysis,
+                jpeg_quality=self.camera_hub.jpeg_quality,
+                queue_size=self.pipeline_queue_size
+            )
+            pipeline.start()
+            self.pipelines[feed] = pipeline
     
-    def video_feed2(self):
-        """Video feed from camera 2 with YOLO analysis"""
-        from fastapi.responses import StreamingResponse
+    def _evaluate_pipeline_frame(self, frame: np.ndarray, camera: int, session_id: str):
+        """Inference stage of a feed pipeline (None while the model is not loaded or the camera is idle)"""
+        session = self.sessions.get(session_id)
+        if not self._camera_active(session, camera):
+            return None
+        with self.model_slot.lease() as models:
+            model = models[f"model{camera}"]
+            if model is None:
+                return None
+            return self._evaluate_frame(frame, model, self._camera_csv(camera), session)
+    
+    def _stop_pipelines(self):
+        pipelines = list(self.pipelines.values())
+        self.pipelines.clear()
+        for pipeline in pipelines:
+            pipeline.stop()
+        if self.pipeline_session_id is not None:
+            self.end_session(self.pipeline_session_id)
+            self.pipeline_session_id = None
+    
+    def _video_feed(self, feed: str, annotated: bool = True):
+        """MJPEG stream of a camera shared by all viewers
         
-        def generate():
-            while self.camera2 and self.camera2.isOpened():
-                try:
-                    ret, frame = self.camera2.read()
-                    if not ret:
-                        time.sleep(0.01)
-                        continue
-                    
-                    # Encode frame as JPEG
-                    ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-                    if ret:
-                        yield (b'--frame\r\n'
-                               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
-                    
-                    time.sleep(0.066)  # ~15 FPS for stability
-                    
-                except Exception as e:
-                    print(f"Error in video feed 2: {e}")
-                    time.sleep(0.1)
+        Annotated feeds come from the feed's pipeline at its real throughput;
+        raw feeds (or any feed when the pipeline is off) come from the hub.
+        """
+        from fastapi.responses import StreamingResponse
         
-        return StreamingResponse(generate(), media_type="multipart/x-mixed-replace; boundary=frame")
\ No newline at end of file
+        pipeline = self.pipelines.get(feed) if annotated else None
+        if pipeline is not None and pipeline.running:
+            stream = pipeline.output.stream()
+        else:
+            broadcaster = self.camera_hub.get(feed)
+            stream = broadcaster.stream() if broadcaster else iter(())
+        return StreamingResponse(stream, media_type="multipart/x-mixed-replace; boundary=frame")
+    
+    def video_feed1(self, annotated: bool = True):
+        """Video feed from camera 1"""
+        return self._video_feed("camera1", annotated)
+    
+    def video_feed2(self, annotated: bool = True):
+        """Video feed from camera 2"""
+        return self._video_feed("camera2", annotated)
+    
+    def get_feed_stats(self) -> Dict[str, Any]:
+        """Capture/encode rates and subscriber counts per camera feed"""
+        return self.camera_hub.get_stats()
+    
+    def get_pipeline_stats(self) -> Dict[str, Any]:
+        """Per-stage timing, queue drops and end-to-end latency of each feed pipeline"""
+        return {
+            "enabled": self.pipeline_enabled,
+            "session_id": self.pipeline_session_id if self.pipelines else None,
+            "feeds": {feed: pipeline.get_stats() for feed, pipeline in self.pipelines.items()},
+        }
@@ -0,0 +1,135 @@
+"""
+Task Rules for Gold Loan Appraisal System
+Compiles the purity task CSVs into array-backed rule tables
+"""
+
+import csv
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+from services.box_ops import iou_pairs
+
+REQUIRED_COLUMNS = ["target1", "target2", "label"]
+TASK_COLUMNS = REQUIRED_COLUMNS + ["hold_seconds", "min_fluctuations"]
+DEFAULT_HOLD_SECONDS = 5.0
+DEFAULT_MIN_FLUCTUATIONS = 3
+UNRESOLVED_CLASS = -1
+
+
+def read_task_csv(csv_path: str) -> List[Dict[str, str]]:
+    """Read a task CSV into a list of row dicts (BOM and legacy encodings tolerated)"""
+    last_error = None
+    for encoding in ("utf-8-sig", "utf-16", "latin1"):
+        try:
+            with open(csv_path, newline="", encoding=encoding) as f:
+                reader = csv.DictReader(f)
+                rows = [
+                    {(k or "").strip(): (v or "").strip() for k, v in row.items()}
+                    for row in reader
+                ]
+                columns = [c.strip() for c in (reader.fieldnames or [])]
+            missing = [c for c in REQUIRED_COLUMNS if c not in columns]
+            if missing:
+                raise ValueError(f"Missing required columns: {missing}")
+            return rows
+        except UnicodeError as e:
+            last_error = e
+            continue
+    raise ValueError(f"Failed to read {csv_path}: {last_error}")
+
+
+def write_task_csv(csv_path: str, rows: List[Dict[str, object]]):
+    """Write task rows with the standard column order"""
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=TASK_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: row.get(k, "") for k in TASK_COLUMNS})
+
+
+class TaskRuleTable:
+    """Task definitions compiled for one model
+
+    Target class names are resolved to the model's class ids once, at load
+    time, so matching a frame is integer comparisons over numpy arrays
+    instead of a DataFrame walk with string compares.
+    """
+
+    __slots__ = ("csv_path", "labels", "target1", "target2", "class1", "class2",
+                 "hold_seconds", "min_fluctuations", "_hold_list", "_min_fluc_list")
+
+    def __init__(self, csv_path: str, labels: List[str], target1: List[str], target2: List[str],
+                 class1: np.ndarray, class2: np.ndarray,
+                 hold_seconds: np.ndarray, min_fluctuations: np.ndarray):
+        self.csv_path = csv_path
+        self.labels = labels
+        self.target1 = target1
+        self.target2 = target2
+        self.class1 = class1
+        self.class2 = class2
+        self.hold_seconds = hold_seconds
+        self.min_fluctuations = min_fluctuations
+        # Scalar views for the per-rule state machine
+        self._hold_list = hold_seconds.tolist()
+        self._min_fluc_list = min_fluctuations.tolist()
+
+    @classmethod
+    def compile(cls, csv_path: str, rows: List[Dict[str, str]], class_names: Optional[Dict[int, str]]) -> "TaskRuleTable":
+        """Build a rule table from CSV rows and a model's {class_id: name} map"""
+        name_to_id = {str(name): int(class_id) for class_id, name in (class_names or {}).items()}
+
+        labels, target1, target2, class1, class2, hold, min_fluc = [], [], [], [], [], [], []
+        for row in rows:
+            t1, t2 = row.get("target1", ""), row.get("target2", "")
+            labels.append(row.get("label", ""))
+            target1.append(t1)
+            target2.append(t2)
+            class1.append(name_to_id.get(t1, UNRESOLVED_CLASS))
+            class2.append(name_to_id.get(t2, UNRESOLVED_CLASS))
+            hold.append(float(row.get("hold_seconds") or DEFAULT_HOLD_SECONDS))
+            min_fluc.append(int(float(row.get("min_fluctuations") or DEFAULT_MIN_FLUCTUATIONS)))
+
+        return cls(
+            csv_path, labels, target1, target2,
+            np.asarray(class1, dtype=np.int32), np.asarray(class2, dtype=np.int32),
+            np.asarray(hold, dtype=np.float64), np.asarray(min_fluc, dtype=np.int32),
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path: str, class_names: Optional[Dict[int, str]]) -> "TaskRuleTable":
+        return cls.compile(csv_path, read_task_csv(csv_path), class_names)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    def rules(self):
+        """Iterate (index, label, hold_seconds, min_fluctuations)"""
+        return zip(range(len(self.labels)), self.labels, self._hold_list, self._min_fluc_list)
+
+    def unresolved_targets(self) -> List[str]:
+        """Target names that do not exist in the model's classes"""
+        missing = [t for t, c in zip(self.target1, self.class1.tolist()) if c == UNRESOLVED_CLASS]
+        missing += [t for t, c in zip(self.target2, self.class2.tolist()) if c == UNRESOLVED_CLASS]
+        return sorted(set(missing))
+
+    def match_pairs(self, boxes: np.ndarray, class_ids: np.ndarray,
+                    iou_threshold: float = 0.05) -> List[List[Tuple[int, int]]]:
+        """Return the overlapping (target1, target2) detection pairs for every rule
+
+        Class membership for all rules is computed in one broadcast compare;
+        only rules whose two classes are both present get an IoU matrix.
+        """
+        pairs: List[List[Tuple[int, int]]] = [[] for _ in self.labels]
+        if len(class_ids) == 0 or not self.labels:
+            return pairs
+
+        class_ids = np.asarray(class_ids)
+        in_class1 = self.class1[:, None] == class_ids[None, :]
+        in_class2 = self.class2[:, None] == class_ids[None, :]
+        candidates = np.flatnonzero(in_class1.any(axis=1) & in_class2.any(axis=1))
+
+        for rule in candidates.tolist():
+            pairs[rule] = iou_pairs(
+                boxes, np.flatnonzero(in_class1[rule]), np.flatnonzero(in_class2[rule]), iou_threshold
+            )
+        return pairs
@@ -0,0 +1,175 @@
+"""
+Face ANN Index Benchmark
+Recall and latency of the IVF face index (services/ann_index.py) against exact search
+on synthetic 512-d embeddings at 10k, 100k and 1M gallery sizes
+
+Run from the backend directory:
+    python -m utils.benchmark_face_ann
+    python -m utils.benchmark_face_ann --sizes 10000 100000 --nprobe 8 16 32 64
+"""
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.ann_index import FAISS_AVAILABLE, FlatIndex, IVFIndex, FaissIVFIndex, default_nlist
+
+DIM = 512
+CHUNK = 65536
+
+
+def synthetic_chunk(number: int, size: int, centers: np.ndarray, spread: float, seed: int) -> np.ndarray:
+    """Deterministic chunk of normalized embeddings scattered around shared centers
+
+    Real face embeddings are not uniform on the sphere (age, ethnicity,
+    lighting and pose pull them into loose groups); the centers give the
+    data that structure, ``spread`` controls how loose it is.
+    """
+    rng = np.random.default_rng((seed, number))
+    vectors = centers[rng.integers(0, centers.shape[0], size)]
+    vectors = vectors + spread * rng.standard_normal((size, DIM), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32, copy=False)
+
+
+def chunks(total: int, centers: np.ndarray, spread: float, seed: int):
+    """(first row, vectors) for each chunk of a ``total``-row gallery"""
+    for number, start in enumerate(range(0, total, CHUNK)):
+        yield start, synthetic_chunk(number, min(CHUNK, total - start), centers, spread, seed)
+
+
+def make_queries(total: int, count: int, centers: np.ndarray, spread: float, seed: int, noise: float) -> np.ndarray:
+    """Noisy re-captures of enrolled faces (same person, new photo)"""
+    rng = np.random.default_rng((seed, 1 << 20))
+    rows = np.sort(rng.choice(total, count, replace=False))
+    queries = np.empty((count, DIM), np.float32)
+    for start, vectors in chunks(total, centers, spread, seed):
+        mask = (rows >= start) & (rows < start + vectors.shape[0])
+        queries[mask] = vectors[rows[mask] - start]
+    queries += noise * rng.standard_normal(queries.shape, dtype=np.float32) / np.sqrt(DIM)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return queries
+
+
+def exact_top_k(total: int, queries: np.ndarray, k: int, centers: np.ndarray, spread: float, seed: int) -> np.ndarray:
+    """Ground-truth top-k row numbers per query, streaming the gallery chunk by chunk"""
+    best_scores = np.full((queries.shape[0], k), -np.inf, np.float32)
+    best_rows = np.zeros((queries.shape[0], k), np.int64)
+    for start, vectors in chunks(total, centers, spread, seed):
+        scores = queries @ vectors.T
+        rows = np.broadcast_to(np.arange(start, start + vectors.shape[0]), scores.shape)
+        scores = np.concatenate([best_scores, scores], axis=1)
+        rows = np.concatenate([best_rows, rows], axis=1)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, top, axis=1)
+        best_rows = np.take_along_axis(rows, top, axis=1)
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1)
+
+
+def measure(search, queries: np.ndarray, truth: np.ndarray, k: int):
+    """(recall@1, recall@k, p50 ms, p95 ms) of ``search(query, k) -> [(score, id)]``"""
+    latencies, hits1, hitsk = [], 0, 0
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        found = search(query, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found_rows = [int(item_id) for _, item_id in found]
+        hits1 += bool(found_rows) and found_rows[0] == expected[0]
+        hitsk += len(set(found_rows) & set(expected.tolist()))
+    return (hits1 / len(queries), hitsk / truth.size,
+            float(np.percentile(latencies, 50)), float(np.percentile(latencies, 95)))
+
+
+def report(label: str, result, baseline_p50: float = None):
+    recall1, recallk, p50, p95 = result
+    speedup = f"  {baseline_p50 / p50:6.1f}x" if baseline_p50 else ""
+    print(f"  {label:<24} recall@1 {recall1:6.3f}   recall@10 {recallk:6.3f}   "
+          f"p50 {p50:8.3f} ms   p95 {p95:8.3f} ms{speedup}")
+
+
+def train_sample(total: int, nlist: int, centers: np.ndarray, spread: float, seed: int) -> np.ndarray:
+    size = min(total, 64 * nlist)
+    parts, have = [], 0
+    for _, vectors in chunks(total, centers, spread, seed):
+        parts.append(vectors[:size - have])
+        have += parts[-1].shape[0]
+        if have >= size:
+            break
+    return np.vstack(parts)
+
+
+def benchmark_size(total: int, args, centers: np.ndarray):
+    print(f"\n=== {total:,} embeddings x {DIM} dims ===")
+    nlist = args.nlist or default_nlist(total)
+    queries = make_queries(total, args.queries, centers, args.spread, args.seed, args.noise)
+
+    started = time.perf_counter()
+    truth = exact_top_k(total, queries, args.k, centers, args.spread, args.seed)
+    print(f"  ground truth (streamed exact search) in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    ivf = IVFIndex.train(train_sample(total, nlist, centers, args.spread, args.seed), nlist=nlist)
+    trained = time.perf_counter() - started
+    for start, vectors in chunks(total, centers, args.spread, args.seed):
+        ivf.add_batch([str(row) for row in range(start, start + vectors.shape[0])], vectors)
+    print(f"  ivf: nlist {nlist}, trained in {trained:.1f}s, filled in {time.perf_counter() - started - trained:.1f}s, "
+          f"{ivf.nbytes / 1e9:.2f} GB")
+
+    flat_bytes = total * DIM * 4
+    if flat_bytes <= args.max_flat_gb * 1e9:
+        flat = FlatIndex.build([str(row) for row in range(total)],
+                               np.vstack([vectors for _, vectors in chunks(total, centers, args.spread, args.seed)]))
+        exact = measure(flat.search, queries, truth, args.k)
+        report("exact (flat)", exact)
+        del flat
+    else:
+        # Not enough memory for a second copy: probing every list is exact too
+        exact = measure(lambda q, k: ivf.search(q, k, nprobe=nlist), queries, truth, args.k)
+        report("exact (all ivf lists)", exact)
+
+    for nprobe in args.nprobe:
+        if nprobe <= nlist:
+            report(f"ivf nprobe={nprobe}", measure(lambda q, k: ivf.search(q, k, nprobe=nprobe), queries, truth, args.k),
+                   exact[2])
+
+    if FAISS_AVAILABLE and not args.no_faiss:
+        del ivf
+        started = time.perf_counter()
+        index = FaissIVFIndex.train(train_sample(total, nlist, centers, args.spread, args.seed), nlist=nlist)
+        for start, vectors in chunks(total, centers, args.spread, args.seed):
+            index.add_batch([str(row) for row in range(start, start + vectors.shape[0])], vectors)
+        print(f"  faiss: built in {time.perf_counter() - started:.1f}s")
+        for nprobe in args.nprobe:
+            if nprobe <= nlist:
+                report(f"faiss nprobe={nprobe}",
+                       measure(lambda q, k: index.search(q, k, nprobe=nprobe), queries, truth, args.k), exact[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0, help="inverted lists (0 = sqrt(n))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[4, 16, 64, 128])
+    parser.add_argument("--centers", type=int, default=2000, help="latent groups in the synthetic data")
+    parser.add_argument("--spread", type=float, default=0.06, help="per-dimension noise around a group center")
+    parser.add_argument("--noise", type=float, default=0.4, help="query re-capture noise (L2 norm)")
+    parser.add_argument("--max-flat-gb", type=float, default=1.0, help="largest exact matrix to build in memory")
+    parser.add_argument("--no-faiss", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centers = rng.standard_normal((args.centers, DIM), dtype=np.float32) / np.sqrt(DIM)
+    print(f"Face ANN benchmark: {args.queries} queries, top-{args.k}, faiss {'installed' if FAISS_AVAILABLE else 'not installed'}")
+    for total in args.sizes:
+        benchmark_size(total, args, centers)
+
+
+if __name__ == "__main__":
+    main()
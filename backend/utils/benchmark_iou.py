@@ -0,0 +1,98 @@
+"""
+IoU / Pair Detection Microbenchmark
+Compares the original pure-Python double loop against the NumPy kernels in services/box_ops.py
+
+Run from the backend directory:
+    python -m utils.benchmark_iou
+"""
+import sys
+import os
+import timeit
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.box_ops import class_pairs, batch_class_pairs
+
+
+def legacy_iou(box1, box2):
+    """Scalar IoU as originally implemented in PurityTestingService.iou"""
+    x1, y1 = max(box1[0], box2[0]), max(box1[1], box2[1])
+    x2, y2 = min(box1[2], box2[2]), min(box1[3], box2[3])
+    inter_area = max(0, x2 - x1) * max(0, y2 - y1)
+    union = ((box1[2] - box1[0]) * (box1[3] - box1[1])) + ((box2[2] - box2[0]) * (box2[3] - box2[1])) - inter_area
+    return inter_area / union if union else 0
+
+
+def legacy_detect_pairs(bboxes, classes, target_class1, target_class2, iou_threshold=0.05):
+    """Double loop as originally implemented in PurityTestingService.detect_pairs"""
+    pairs = []
+    indices_class1 = [i for i, c in enumerate(classes) if c == target_class1]
+    indices_class2 = [i for i, c in enumerate(classes) if c == target_class2]
+    for i in indices_class1:
+        for j in indices_class2:
+            if legacy_iou(bboxes[i], bboxes[j]) > iou_threshold:
+                pairs.append((i, j))
+    return pairs
+
+
+def random_detections(rng, count, num_classes=4, size=640):
+    """Random xyxy boxes with clustered positions so that some pairs overlap"""
+    centers = rng.uniform(50, size - 50, size=(count, 2))
+    half = rng.uniform(10, 60, size=(count, 2))
+    boxes = np.concatenate([centers - half, centers + half], axis=1).astype(np.float32)
+    class_ids = rng.integers(0, num_classes, size=count)
+    return boxes, class_ids
+
+
+def time_call(fn, repeat=5):
+    """Best per-call time in microseconds"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def benchmark_single_frame(rng):
+    print("=" * 60)
+    print("Single frame: class 0 x class 1 pairs")
+    print("=" * 60)
+    print(f"{'detections':>10} {'legacy (us)':>14} {'numpy (us)':>14} {'speedup':>10}")
+
+    for count in (4, 16, 64, 256, 1024):
+        boxes, class_ids = random_detections(rng, count)
+        labels = [str(c) for c in class_ids]
+
+        expected = legacy_detect_pairs(boxes, labels, "0", "1")
+        actual = class_pairs(boxes, class_ids, 0, 1, 0.05)
+        assert expected == actual, f"Mismatch at {count} detections"
+
+        legacy = time_call(lambda: legacy_detect_pairs(boxes, labels, "0", "1"))
+        vectorized = time_call(lambda: class_pairs(boxes, class_ids, 0, 1, 0.05))
+        print(f"{count:>10} {legacy:>14.1f} {vectorized:>14.1f} {legacy / vectorized:>9.1f}x")
+
+
+def benchmark_batch(rng):
+    print("\n" + "=" * 60)
+    print("Batch of frames: per-frame loop vs one batched kernel")
+    print("=" * 60)
+    print(f"{'frames':>6} {'dets':>6} {'legacy (us)':>14} {'per-frame (us)':>15} {'batched (us)':>13}")
+
+    for frames, count in ((8, 16), (32, 16), (8, 64), (32, 64)):
+        batch = [random_detections(rng, count) for _ in range(frames)]
+        boxes_list = [b for b, _ in batch]
+        class_list = [c for _, c in batch]
+        labels_list = [[str(c) for c in cls] for cls in class_list]
+
+        expected = [legacy_detect_pairs(b, l, "0", "1") for b, l in zip(boxes_list, labels_list)]
+        assert expected == batch_class_pairs(boxes_list, class_list, 0, 1, 0.05), "Batch mismatch"
+
+        legacy = time_call(lambda: [legacy_detect_pairs(b, l, "0", "1") for b, l in zip(boxes_list, labels_list)])
+        per_frame = time_call(lambda: [class_pairs(b, c, 0, 1, 0.05) for b, c in zip(boxes_list, class_list)])
+        batched = time_call(lambda: batch_class_pairs(boxes_list, class_list, 0, 1, 0.05))
+        print(f"{frames:>6} {count:>6} {legacy:>14.1f} {per_frame:>15.1f} {batched:>13.1f}")
+
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(0)
+    benchmark_single_frame(rng)
+    benchmark_batch(rng)
@@ -0,0 +1,90 @@
+"""
+Recorded frame sources for offline purity tools
+Reads frames from video files, image directories or single images
+"""
+import os
+import cv2
+import numpy as np
+from typing import Iterator, List, Sequence
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+
+
+def iter_frames(path: str, stride: int = 1) -> Iterator[np.ndarray]:
+    """Yield BGR frames from a video file, a directory of images or one image"""
+    stride = max(1, stride)
+
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        for name in names[::stride]:
+            frame = cv2.imread(os.path.join(path, name), cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield frame
+        return
+
+    if path.lower().endswith(IMAGE_EXTENSIONS):
+        frame = cv2.imread(path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            yield frame
+        return
+
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f"Cannot open video: {path}")
+    try:
+        index = 0
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            if index % stride == 0:
+                yield frame
+            index += 1
+    finally:
+        cap.release()
+
+
+def load_frames(paths: Sequence[str], limit: int = 0, stride: int = 1) -> List[np.ndarray]:
+    """Collect frames from several sources, stopping after ``limit`` frames (0 = all)"""
+    frames = []
+    for path in paths:
+        for frame in iter_frames(path, stride):
+            frames.append(frame)
+            if limit and len(frames) >= limit:
+                return frames
+    return frames
+
+
+def iter_encoded_frames(path: str, stride: int = 1, jpeg_quality: int = 80) -> Iterator[bytes]:
+    """Yield frames as JPEG bytes, as a client would upload them
+
+    JPEG files are passed through untouched; video frames and other
+    image formats are encoded at ``jpeg_quality``.
+    """
+    stride = max(1, stride)
+    if os.path.isdir(path):
+        names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+        paths = [os.path.join(path, name) for name in names[::stride]]
+    elif path.lower().endswith(IMAGE_EXTENSIONS):
+        paths = [path]
+    else:
+        paths = None
+
+    if paths is None:
+        for frame in iter_frames(path, stride):
+            ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if ret:
+                yield buffer.tobytes()
+        return
+
+    for image_path in paths:
+        if image_path.lower().endswith(JPEG_EXTENSIONS):
+            with open(image_path, "rb") as f:
+                yield f.read()
+            continue
+        frame = cv2.imread(image_path, cv2.IMREAD_COLOR)
+        if frame is not None:
+            ret, buffer = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            if ret:
+                yield buffer.tobytes()
@@ -0,0 +1,49 @@
+"""
+Face Embedding Migration
+Converts appraisers.face_encoding (comma-separated TEXT) to face_embedding (raw float32 BYTEA)
+
+Runs online in small batches; the app keeps serving and reads both formats meanwhile.
+Safe to interrupt and re-run.
+
+Run from the backend directory:
+    python -m utils.migrate_face_embeddings
+    python -m utils.migrate_face_embeddings --batch-size 1000 --keep-text
+"""
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.database import Database
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert text face encodings to binary float32 embeddings")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per transaction")
+    parser.add_argument("--model-version", default=os.getenv("FACE_MODEL_VERSION", "buffalo_l"),
+                        help="tag for converted rows that have none")
+    parser.add_argument("--keep-text", action="store_true", help="leave face_encoding in place (for rollback)")
+    parser.add_argument("--dry-run", action="store_true", help="only count the rows left to convert")
+    args = parser.parse_args()
+
+    db = Database()
+    pending = db.count_text_face_encodings()
+    print(f"📋 {pending} appraisers still stored as text")
+    if args.dry_run or not pending:
+        return
+
+    started = time.perf_counter()
+    stats = db.migrate_face_encodings(model_version=args.model_version, batch_size=args.batch_size,
+                                      keep_text=args.keep_text)
+    elapsed = time.perf_counter() - started
+    print(f"✓ Converted {stats['converted']} rows in {stats['batches']} batches ({elapsed:.1f}s)")
+    if stats["converted"]:
+        print(f"   {stats['bytes_before'] / 1024:.0f} KB of text -> {stats['bytes_after'] / 1024:.0f} KB binary")
+    if stats["failed"]:
+        print(f"⚠️ {stats['failed']} rows could not be parsed and were left as text")
+
+
+if __name__ == "__main__":
+    main()
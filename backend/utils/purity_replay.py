@@ -0,0 +1,341 @@
+"""
+Purity Replay Harness
+Feeds recorded videos or JPEG sequences through the purity service on a virtual
+clock, so hold times and fluctuation counts depend only on the frames, and reports
+per-stage latency (decode, predict, pairing, draw, encode) and completed tasks
+
+Run from the backend directory:
+    python -m utils.purity_replay --camera1 recordings/rubbing.mp4 --camera2 recordings/acid.mp4
+    python -m utils.purity_replay --camera1 frames/top/ --camera2 frames/side/ --json after.json --baseline before.json
+
+Models and service settings come from the usual PURITY_* environment variables.
+Frames are read and JPEG-encoded up front, so disk I/O is not measured.
+"""
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+import subprocess
+import cv2
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.frame_decode import DecodedFrame
+from utils.frame_sources import iter_encoded_frames
+
+STAGES = ("decode", "predict", "pairing", "draw", "encode")
+
+
+class VirtualClock:
+    """Clock the replay advances by one frame interval per step"""
+
+    def __init__(self, start: float = 1_000_000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+def latency_summary(samples: Sequence[float]) -> Dict[str, Any]:
+    if not samples:
+        return {"count": 0}
+    samples = np.asarray(samples) * 1000.0
+    return {
+        "count": int(samples.size),
+        "mean_ms": round(float(samples.mean()), 3),
+        "p50_ms": round(float(np.percentile(samples, 50)), 3),
+        "p95_ms": round(float(np.percentile(samples, 95)), 3),
+        "p99_ms": round(float(np.percentile(samples, 99)), 3),
+        "max_ms": round(float(samples.max()), 3),
+    }
+
+
+def load_encoded(paths: Optional[Sequence[str]], limit: int = 0, stride: int = 1,
+                 jpeg_quality: int = 80) -> List[bytes]:
+    """JPEG bytes for one camera from several sources, stopping after ``limit`` frames"""
+    frames = []
+    for path in paths or ():
+        for data in iter_encoded_frames(path, stride, jpeg_quality):
+            frames.append(data)
+            if limit and len(frames) >= limit:
+                return frames
+    return frames
+
+
+class PurityReplay:
+    """Drives a PurityTestingService frame by frame on a virtual clock
+
+    The service's hold-timer clock and motion gate clock are replaced for
+    the lifetime of the harness (use it as a context manager), and
+    ``_detect`` is wrapped so model time can be split from pairing time.
+    Each step mirrors one analyze request: decode, then for cameras active
+    in the session's phase evaluate, draw and encode.
+    """
+
+    def __init__(self, service, fps: float = 15.0, annotate: bool = True, jpeg_quality: int = 75):
+        self.service = service
+        self.fps = fps
+        self.annotate = annotate
+        self.jpeg_quality = jpeg_quality
+        self.clock = VirtualClock()
+
+        self._saved_clocks = (service.clock, service.motion_gate.clock)
+        service.clock = self.clock
+        service.motion_gate.clock = self.clock
+
+        self._predict_seconds = 0.0
+        detect = service._detect
+
+        def timed_detect(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return detect(*args, **kwargs)
+            finally:
+                self._predict_seconds += time.perf_counter() - start
+
+        service._detect = timed_detect
+
+    def close(self):
+        self.service.clock, self.service.motion_gate.clock = self._saved_clocks
+        self.service.__dict__.pop("_detect", None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _models(self):
+        return {1: (self.service.model1, self.service.csv1_path), 2: (self.service.model2, self.service.csv2_path)}
+
+    def warmup(self, frames: Dict[int, List[bytes]], iterations: int = 3):
+        """Run each camera's model on its first frame without touching any session"""
+        for camera, (model, _) in self._models().items():
+            if model is None or not frames.get(camera):
+                continue
+            decoded = self._decode(frames[camera][0])
+            image = decoded.image if isinstance(decoded, DecodedFrame) else decoded
+            for _ in range(iterations):
+                self.service._predict(model, image)
+
+    def _decode(self, data: bytes):
+        return self.service._decode_for_output(data, "json" if self.annotate else "detections")
+
+    def run(self, camera1: Sequence[bytes], camera2: Sequence[bytes] = ()) -> Dict[str, Any]:
+        """Replay both cameras in lockstep and return the report"""
+        service = self.service
+        session = service.sessions.get(service.create_session())
+        models = self._models()
+        feeds = {1: list(camera1), 2: list(camera2)}
+        steps = max(len(feeds[1]), len(feeds[2]))
+
+        timings = {stage: [] for stage in STAGES}
+        frame_latency = []
+        cameras = {camera: {"frames": 0, "analyzed": 0, "idle": 0, "errors": 0} for camera in feeds}
+        completions = []
+        phases = []
+
+        origin = self.clock()
+        started = time.perf_counter()
+        for step in range(steps):
+            for camera, frames in feeds.items():
+                if step >= len(frames):
+                    continue
+                counts = cameras[camera]
+                counts["frames"] += 1
+                model, csv_path = models[camera]
+
+                t0 = time.perf_counter()
+                decoded = self._decode(frames[step])
+                t1 = time.perf_counter()
+                timings["decode"].append(t1 - t0)
+                if decoded is None:
+                    counts["errors"] += 1
+                    continue
+                image, scale = decoded, (1.0, 1.0)
+                if isinstance(decoded, DecodedFrame):
+                    image, scale = decoded.image, (decoded.scale_x, decoded.scale_y)
+
+                if model is None or not service._camera_active(session, camera):
+                    counts["idle"] += 1
+                    frame_latency.append(t1 - t0)
+                    continue
+
+                self._predict_seconds = 0.0
+                evaluated = service._evaluate_frame(image, model, csv_path, session, scale)
+                t2 = time.perf_counter()
+                if evaluated is None:
+                    raise SystemExit(f"Task CSV not found: {csv_path}")
+                timings["predict"].append(self._predict_seconds)
+                timings["pairing"].append(t2 - t1 - self._predict_seconds)
+                counts["analyzed"] += 1
+
+                detections, summary = evaluated
+                for task in summary["tasks"]:
+                    if task["completed"]:
+                        completions.append({
+                            "step": step,
+                            "time": round(self.clock() - origin, 3),
+                            "camera": camera,
+                            "label": task["label"],
+                        })
+
+                t3 = t2
+                if self.annotate:
+                    service._draw_analysis(image, detections, summary)
+                    t3 = time.perf_counter()
+                    timings["draw"].append(t3 - t2)
+                    cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+                    t4 = time.perf_counter()
+                    timings["encode"].append(t4 - t3)
+                    t3 = t4
+                frame_latency.append(t3 - t0)
+
+            if service.phase_aware and (not phases or phases[-1]["phase"] != session.phase):
+                phases.append({"step": step, "phase": session.phase})
+            self.clock.advance(1.0 / self.fps)
+        wall = time.perf_counter() - started
+
+        processed = sum(c["frames"] for c in cameras.values())
+        report = {
+            "steps": steps,
+            "fps_simulated": self.fps,
+            "annotate": self.annotate,
+            "wall_seconds": round(wall, 3),
+            "throughput_fps": round(processed / wall, 2) if wall else None,
+            "step_fps": round(steps / wall, 2) if wall else None,
+            "stages": {stage: latency_summary(samples) for stage, samples in timings.items()},
+            "frame_latency": latency_summary(frame_latency),
+            "cameras": {str(camera): counts for camera, counts in cameras.items()},
+            "completions": completions,
+            "phases": phases,
+            "final_status": service.get_detection_status(session.session_id),
+            "motion_gate": service.motion_gate.get_stats(),
+        }
+        service.end_session(session.session_id)
+        return report
+
+
+def environment(service) -> Dict[str, Any]:
+    """What a run depends on, so reports from different versions can be compared"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "backend": service.backend_name,
+        "backend_options": service.backend_options,
+        "worker_processes": service.worker_processes,
+        "phase_aware": service.phase_aware,
+        "reduced_decode": service.reduced_decode,
+        "models": {
+            key: model.describe() if model is not None else None
+            for key, model in (("model1", service.model1), ("model2", service.model2))
+        },
+    }
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"{report['steps']} steps at {report['fps_simulated']} fps (simulated), "
+          f"{report['wall_seconds']}s wall, {report['throughput_fps']} frames/s")
+    print("=" * 60)
+    print(f"{'stage':<10} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9}  (ms)")
+    for stage, lat in list(report["stages"].items()) + [("frame", report["frame_latency"])]:
+        if not lat["count"]:
+            continue
+        print(f"{stage:<10} {lat['count']:>7} {lat['mean_ms']:>9} {lat['p50_ms']:>9} {lat['p95_ms']:>9} {lat['p99_ms']:>9}")
+    print("\nCameras")
+    for camera, counts in report["cameras"].items():
+        print(f"  camera{camera}: {counts}")
+    print("\nCompleted tasks")
+    for item in report["completions"] or [{"label": "(none)", "step": "-", "time": "-", "camera": "-"}]:
+        print(f"  step {item['step']:>5}  t={item['time']:>8}s  camera{item['camera']}  {item['label']}")
+    print(f"\nFinal status: {report['final_status']['message']}")
+
+
+def print_comparison(report, baseline):
+    print("\n" + "=" * 60)
+    print(f"Against baseline ({baseline.get('environment', {}).get('commit')})")
+    print("=" * 60)
+    for stage in list(STAGES) + ["frame"]:
+        new = report["frame_latency"] if stage == "frame" else report["stages"].get(stage, {})
+        old = baseline["frame_latency"] if stage == "frame" else baseline["stages"].get(stage, {})
+        if not new.get("count") or not old.get("count"):
+            continue
+        change = (new["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0.0
+        print(f"  {stage:<10} p50 {old['p50_ms']:>9} -> {new['p50_ms']:>9} ms ({change:+.1f}%)   "
+              f"p95 {old['p95_ms']:>9} -> {new['p95_ms']:>9} ms")
+    same = [(c["step"], c["camera"], c["label"]) for c in report["completions"]] == \
+           [(c["step"], c["camera"], c["label"]) for c in baseline["completions"]]
+    print(f"  completed tasks: {'identical' if same else 'DIFFERENT'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--camera1", nargs="+", help="top-view (rubbing) videos, image folders or images")
+    parser.add_argument("--camera2", nargs="+", help="side-view (acid) videos, image folders or images")
+    parser.add_argument("--fps", type=float, default=15.0, help="simulated camera rate driving the virtual clock")
+    parser.add_argument("--limit", type=int, default=0, help="maximum frames per camera (0 = all)")
+    parser.add_argument("--stride", type=int, default=1, help="use every Nth frame")
+    parser.add_argument("--jpeg-quality", type=int, default=80, help="quality for frames that need encoding")
+    parser.add_argument("--output", choices=["json", "detections"], default="json",
+                        help="json draws and encodes annotated frames; detections skips both")
+    parser.add_argument("--backend", help="inference backend (overrides PURITY_INFERENCE_BACKEND)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    args = parser.parse_args()
+
+    if not args.camera1 and not args.camera2:
+        parser.error("give --camera1 and/or --camera2")
+    if args.backend:
+        os.environ["PURITY_INFERENCE_BACKEND"] = args.backend
+
+    from services.purity_testing_service import PurityTestingService
+
+    frames = {
+        1: load_encoded(args.camera1, args.limit, args.stride, args.jpeg_quality),
+        2: load_encoded(args.camera2, args.limit, args.stride, args.jpeg_quality),
+    }
+    print(f"Loaded {len(frames[1])} camera1 frames, {len(frames[2])} camera2 frames")
+
+    service = PurityTestingService()
+    if (frames[1] and service.model1 is None) or (frames[2] and service.model2 is None):
+        raise SystemExit("Purity models are not loaded (check ml_models/ and PURITY_INFERENCE_BACKEND)")
+
+    try:
+        with PurityReplay(service, fps=args.fps, annotate=args.output == "json") as replay:
+            replay.warmup(frames, args.warmup)
+            report = replay.run(frames[1], frames[2])
+        report["environment"] = environment(service)
+    finally:
+        service.shutdown()
+
+    print_report(report)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print_comparison(report, json.load(f))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+"""
+Purity Model INT8 Quantization
+Builds static INT8 ONNX variants of the purity YOLO models from recorded frames
+and compares them against FP32 (detections, task pair outcomes and latency)
+
+Run from the backend directory:
+    python -m utils.quantize_purity_models quantize --model model1 --calib recordings/rubbing/
+    python -m utils.quantize_purity_models compare --model model1 --clips recordings/rubbing.mp4 --json report.json
+
+The service picks the INT8 file up automatically with PURITY_ONNX_PRECISION=auto
+(the default) when PURITY_INFERENCE_BACKEND is onnx or openvino.
+"""
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.box_ops import pairwise_iou
+from services.inference_backends import (
+    DEFAULT_IMGSZ, create_backend, export_onnx, preprocess, quantized_onnx_path
+)
+from services.task_rules import TaskRuleTable
+from utils.frame_sources import load_frames
+
+# Same pairing as PurityTestingService
+MODELS = {
+    "model1": ("ml_models/best_rub2_2.pt", "data/task_sequence.csv"),
+    "model2": ("ml_models/best_rub2_1.pt", "data/task_sequence_main.csv"),
+}
+MATCH_IOU = 0.5
+PAIR_IOU = 0.05
+
+
+# ============================================================================
+# Quantization
+# ============================================================================
+
+class FrameCalibrationReader:
+    """onnxruntime CalibrationDataReader over preprocessed recorded frames"""
+
+    def __init__(self, input_name: str, frames, imgsz: int):
+        self._inputs = iter([{input_name: preprocess([f], imgsz)} for f in frames])
+
+    def get_next(self):
+        return next(self._inputs, None)
+
+
+def head_nodes_to_exclude(model) -> list:
+    """Non-conv nodes of the detection head (DFL, concat, sigmoid, box decode)
+
+    Box decoding is sensitive to activation quantization, so it stays in
+    FP32 while the backbone and head convolutions run in INT8.
+    """
+    indices = [int(m.group(1)) for node in model.graph.node
+               for m in [re.match(r"/model\.(\d+)/", node.name)] if m]
+    if not indices:
+        return []
+    head = f"/model.{max(indices)}/"
+    return [node.name for node in model.graph.node if node.name.startswith(head) and node.op_type != "Conv"]
+
+
+def quantize(args):
+    import onnx
+    import onnxruntime as ort
+    from onnxruntime.quantization import CalibrationMethod, QuantFormat, QuantType, quantize_static
+
+    weights_path, _ = MODELS[args.model]
+    fp32_path = export_onnx(weights_path, args.imgsz)
+    int8_path = quantized_onnx_path(weights_path, args.imgsz)
+
+    frames = load_frames(args.calib, limit=args.limit, stride=args.stride)
+    if not frames:
+        raise SystemExit("No calibration frames found")
+    print(f"Calibrating {args.model} on {len(frames)} frames ({args.method})")
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+    fp32_model = onnx.load(fp32_path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = fp32_path
+        try:
+            from onnxruntime.quantization import quant_pre_process
+            source = os.path.join(tmp, "preprocessed.onnx")
+            quant_pre_process(fp32_path, source, skip_symbolic_shape=True)
+        except Exception as e:
+            print(f"⚠️ Skipping quantization pre-processing: {e}")
+            source = fp32_path
+
+        quantized_tmp = os.path.join(tmp, "quantized.onnx")
+        quantize_static(
+            source, quantized_tmp,
+            FrameCalibrationReader(input_name, frames, args.imgsz),
+            quant_format=QuantFormat.QDQ,
+            per_channel=True,
+            weight_type=QuantType.QInt8,
+            activation_type=QuantType.QUInt8,
+            calibrate_method=CalibrationMethod.Percentile if args.method == "percentile" else CalibrationMethod.MinMax,
+            nodes_to_exclude=head_nodes_to_exclude(fp32_model) if args.exclude_head else [],
+        )
+
+        # Keep the class names and export metadata the backends read
+        quantized = onnx.load(quantized_tmp)
+        existing = {p.key for p in quantized.metadata_props}
+        for prop in fp32_model.metadata_props:
+            if prop.key not in existing:
+                quantized.metadata_props.add(key=prop.key, value=prop.value)
+        onnx.save(quantized, quantized_tmp)
+        os.replace(quantized_tmp, int8_path)
+
+    print(f"✓ INT8 model written: {int8_path}")
+    print(f"  Size: {os.path.getsize(fp32_path) / 1e6:.1f} MB (fp32) -> {os.path.getsize(int8_path) / 1e6:.1f} MB (int8)")
+
+
+# ============================================================================
+# Comparison
+# ============================================================================
+
+def match_detections(ref, cand, iou_threshold: float = MATCH_IOU):
+    """Greedy same-class matching; returns (matched, missed, extra, mean IoU, mean |dconf|)"""
+    matched, ious, conf_diffs = 0, [], []
+    used = np.zeros(len(cand), dtype=bool)
+    order = np.argsort(-ref.confidences)
+    iou = pairwise_iou(ref.boxes, cand.boxes) if len(ref) and len(cand) else None
+
+    for i in order.tolist():
+        if iou is None:
+            break
+        candidates = np.flatnonzero((cand.class_ids == ref.class_ids[i]) & ~used & (iou[i] >= iou_threshold))
+        if candidates.size == 0:
+            continue
+        j = candidates[np.argmax(iou[i, candidates])]
+        used[j] = True
+        matched += 1
+        ious.append(iou[i, j])
+        conf_diffs.append(abs(float(ref.confidences[i]) - float(cand.confidences[j])))
+
+    return (matched, len(ref) - matched, len(cand) - matched,
+            float(np.mean(ious)) if ious else None, float(np.mean(conf_diffs)) if conf_diffs else None)
+
+
+def latency_summary(samples):
+    samples = np.asarray(samples) * 1000.0
+    return {
+        "mean_ms": round(float(samples.mean()), 2),
+        "p50_ms": round(float(np.percentile(samples, 50)), 2),
+        "p95_ms": round(float(np.percentile(samples, 95)), 2),
+        "max_ms": round(float(samples.max()), 2),
+    }
+
+
+def timed_predict(backend, frame):
+    start = time.perf_counter()
+    detections = backend.predict_batch([frame])[0]
+    return detections, time.perf_counter() - start
+
+
+def compare(args):
+    weights_path, csv_path = MODELS[args.model]
+    options = {"imgsz": args.imgsz, "intra_op_threads": args.threads}
+    reference = create_backend(args.reference, weights_path, precision="fp32", **options)
+    candidate = create_backend(args.candidate, weights_path, precision="int8", **options)
+    rules = TaskRuleTable.from_csv(args.csv or csv_path, reference.names)
+
+    frames = load_frames(args.clips, limit=args.limit, stride=args.stride)
+    if not frames:
+        raise SystemExit("No frames found")
+    print(f"Comparing {reference.name} fp32 vs {candidate.name} {candidate.describe()['precision']} on {len(frames)} frames")
+
+    for _ in range(args.warmup):
+        reference.predict_batch([frames[0]])
+        candidate.predict_batch([frames[0]])
+
+    totals = {"reference": 0, "candidate": 0, "matched": 0, "missed": 0, "extra": 0}
+    ious, conf_diffs, ref_times, cand_times = [], [], [], []
+    labels = {label: {"reference_frames": 0, "candidate_frames": 0, "agreeing_frames": 0} for label in rules.labels}
+    exact_frames = 0
+
+    for frame in frames:
+        ref, ref_t = timed_predict(reference, frame)
+        cand, cand_t = timed_predict(candidate, frame)
+        ref_times.append(ref_t)
+        cand_times.append(cand_t)
+
+        matched, missed, extra, mean_iou, conf_diff = match_detections(ref, cand)
+        totals["reference"] += len(ref)
+        totals["candidate"] += len(cand)
+        totals["matched"] += matched
+        totals["missed"] += missed
+        totals["extra"] += extra
+        if mean_iou is not None:
+            ious.append(mean_iou)
+            conf_diffs.append(conf_diff)
+        exact_frames += missed == 0 and extra == 0
+
+        ref_pairs = rules.match_pairs(ref.boxes, ref.class_ids, PAIR_IOU)
+        cand_pairs = rules.match_pairs(cand.boxes, cand.class_ids, PAIR_IOU)
+        for idx, label, _, _ in rules.rules():
+            ref_on, cand_on = bool(ref_pairs[idx]), bool(cand_pairs[idx])
+            labels[label]["reference_frames"] += ref_on
+            labels[label]["candidate_frames"] += cand_on
+            labels[label]["agreeing_frames"] += ref_on == cand_on
+
+    report = {
+        "model": args.model,
+        "frames": len(frames),
+        "reference": reference.describe(),
+        "candidate": candidate.describe(),
+        "detections": {
+            **totals,
+            "recall_vs_reference": round(totals["matched"] / totals["reference"], 4) if totals["reference"] else None,
+            "precision_vs_reference": round(totals["matched"] / totals["candidate"], 4) if totals["candidate"] else None,
+            "mean_matched_iou": round(float(np.mean(ious)), 4) if ious else None,
+            "mean_confidence_delta": round(float(np.mean(conf_diffs)), 4) if conf_diffs else None,
+            "identical_frames": exact_frames,
+        },
+        "task_labels": {
+            label: {**counts, "agreement": round(counts["agreeing_frames"] / len(frames), 4)}
+            for label, counts in labels.items()
+        },
+        "latency": {
+            "reference": latency_summary(ref_times),
+            "candidate": latency_summary(cand_times),
+            "speedup_p50": round(float(np.median(ref_times) / np.median(cand_times)), 2),
+        },
+    }
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+def print_report(report):
+    print("=" * 60)
+    print(f"{report['model']}: {report['frames']} frames")
+    print("=" * 60)
+    d = report["detections"]
+    print(f"Detections  reference={d['reference']} candidate={d['candidate']} "
+          f"matched={d['matched']} missed={d['missed']} extra={d['extra']}")
+    print(f"            recall={d['recall_vs_reference']} precision={d['precision_vs_reference']} "
+          f"iou={d['mean_matched_iou']} dconf={d['mean_confidence_delta']} identical_frames={d['identical_frames']}")
+    print("\nTask pairs (frames with an active pair)")
+    for label, counts in report["task_labels"].items():
+        print(f"  {label:<24} ref={counts['reference_frames']:<6} cand={counts['candidate_frames']:<6} "
+              f"agreement={counts['agreement']:.1%}")
+    print("\nLatency per frame")
+    for key in ("reference", "candidate"):
+        lat = report["latency"][key]
+        print(f"  {key:<10} mean={lat['mean_ms']}ms p50={lat['p50_ms']}ms p95={lat['p95_ms']}ms max={lat['max_ms']}ms")
+    print(f"  speedup (p50): {report['latency']['speedup_p50']}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--model", choices=sorted(MODELS), required=True)
+    common.add_argument("--imgsz", type=int, default=int(os.getenv("PURITY_IMGSZ", DEFAULT_IMGSZ)))
+    common.add_argument("--limit", type=int, default=0, help="maximum frames to use (0 = all)")
+    common.add_argument("--stride", type=int, default=1, help="use every Nth frame")
+
+    q = sub.add_parser("quantize", parents=[common], help="build the static INT8 model")
+    q.add_argument("--calib", nargs="+", required=True, help="calibration videos, image folders or images")
+    q.add_argument("--method", choices=["minmax", "percentile"], default="minmax")
+    q.add_argument("--no-exclude-head", dest="exclude_head", action="store_false",
+                   help="also quantize the detection head's box decoding")
+    q.set_defaults(func=quantize)
+
+    c = sub.add_parser("compare", parents=[common], help="compare INT8 against FP32")
+    c.add_argument("--clips", nargs="+", required=True, help="recorded videos, image folders or images")
+    c.add_argument("--csv", help="task CSV (defaults to the model's CSV)")
+    c.add_argument("--reference", default="onnx", help="FP32 backend: onnx, openvino or torch")
+    c.add_argument("--candidate", default="onnx", help="INT8 backend: onnx or openvino")
+    c.add_argument("--threads", type=int, default=int(os.getenv("PURITY_INTRA_OP_THREADS", "0")))
+    c.add_argument("--warmup", type=int, default=3)
+    c.add_argument("--json", help="write the report to this file")
+    c.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()